@@ -45,9 +45,11 @@ from app.routers.rest.repository import (
     rest_features,
     rest_scenarios,
 )
+from app.utils.conditional_get import DataVersionMiddleware
 from app.utils.log_management import log_message
 from app.utils.openapi_tags import DESCRIPTION
 from app.utils.pgdb import pool
+from app.utils.process_pool import shutdown_process_pool
 
 logger = getLogger(__name__)
 
@@ -66,6 +68,7 @@ async def lifespan(app: FastAPI) -> None:
     postgre_register()
     yield
     pool.close()
+    shutdown_process_pool()
 
 
 app = FastAPI(
@@ -80,6 +83,7 @@ app = FastAPI(
 )
 
 
+app.add_middleware(DataVersionMiddleware)
 app.add_middleware(
     SessionMiddleware,
     secret_key=config["SESSION_KEY"],
@@ -6,7 +6,7 @@ from typing import List, Optional, Tuple
 from psycopg.rows import dict_row, tuple_row
 
 from app.database.postgre.pg_versions import version_internal_id
-from app.database.redis.rs_file_management import rs_invalidate_file
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.database.utils.transitions import bug_authorized_transition, version_transition
 from app.schema.bugs_schema import BugTicket, BugTicketFull, CampaignTicketScenario, UpdateBugTicket
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
@@ -217,8 +217,7 @@ async def db_update_bugs(
         if isinstance(version_id, ApplicationError):
             return version_id
         values.append(version_id)
-        # SPEC: Invalidate all files of the future version
-        rs_invalidate_file(f"file:{project_name}:{bug_ticket.version}:*")
+        rs_bump_data_version(project_name, bug_ticket.version)
         # ToDo: update statuses from past version to current version
 
     values.append(internal_id)
@@ -245,8 +244,7 @@ async def db_update_bugs(
             bug_ticket.unlink_scenario,
             int(internal_id),
         )
-    # SPEC invalidate all files of the current version
-    rs_invalidate_file(f"file:{project_name}:{current_bug.version}:*")
+    rs_bump_data_version(project_name, current_bug.version)
     return await db_get_bug(
         project_name,
         internal_id,
@@ -400,5 +398,5 @@ async def insert_bug(
         bug_ticket.related_to,
         row[0],
     )
-    rs_invalidate_file(f"file:{project_name}:{bug_ticket.version}:*")
+    rs_bump_data_version(project_name, bug_ticket.version)
     return RegisterVersionResponse(inserted_id=row[0], message=None if status_link else "Linking fail")
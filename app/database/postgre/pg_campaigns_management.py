@@ -1,11 +1,11 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
-import copy
 from logging import getLogger
 from typing import List, Tuple
 
 from psycopg.rows import dict_row, tuple_row
 
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.schema.campaign.campaign_response_schema import CampaignLight
 from app.schema.campaign_followup_schema import CampaignIdStatus
 from app.schema.campaign_schema import CampaignPatch
@@ -43,7 +43,8 @@ async def create_campaign(
         ).fetchone()
 
         connection.commit()
-        return CampaignLight(**conn)
+    rs_bump_data_version(project_name, version)
+    return CampaignLight(**conn)
 
 
 async def retrieve_campaign(
@@ -130,6 +131,19 @@ async def retrieve_campaign_id(
         )
 
 
+async def retrieve_campaign_occurrence(
+    campaign_id: int,
+) -> int | None:
+    """get campaign occurrence from its internal id"""
+    with pool.connection() as connection:
+        connection.row_factory = tuple_row
+        row = connection.execute(
+            "select occurrence from campaigns where id = %s;",
+            (campaign_id,),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+
 async def is_campaign_exist(
     project_name: str,
     version: str,
@@ -224,6 +238,7 @@ async def update_campaign_occurrence(
             rows.statusmessage,
         )
         connection.commit()
+    rs_bump_data_version(project_name, version)
 
     return (
         PGResult(
@@ -237,19 +252,6 @@ async def update_campaign_occurrence(
     )
 
 
-def merge_failing_scenario(
-    general_result: list,
-    already_linked: list,
-) -> None:
-    for scenario in already_linked:
-        tmp = copy.deepcopy(scenario)
-        tmp["selection"] = ""
-        if tmp in general_result:
-            general_result[general_result.index(tmp)] = scenario
-        else:
-            general_result.append(scenario)
-
-
 def campaign_failing_scenarios(
     project_name: str,
     version: str,
@@ -259,71 +261,47 @@ def campaign_failing_scenarios(
     If bug_internal_id is set then add as 'selected' already scenarios attached to the bug
     TODO add this mechanism /!\\ WARNING on future link (version might differ)
     """
-    query = (
+    # Scenarios linked to the bug are selected, failing or not: the failing scenarios of the version are filtered
+    # before their union with the linked ones, which they do not repeat
+    columns = (
         "select scenarios.name,"
         " scenarios.scenario_id as scenario_id,"
         " ct.ticket_reference,"
         " campaigns.occurrence,"
         " campaigns.version,"
         " cts.scenario_id as scenario_tech_id,"
-        " '' as selection"
-        " from campaign_ticket_scenarios as cts"
+    )
+    joins = (
         " join campaign_tickets as ct on cts.campaign_ticket_id = ct.id"
         " join campaigns on campaigns.id = ct.campaign_id"
         " join scenarios on scenarios.id = cts.scenario_id"
-        " where campaigns.project_id = %s"
-        " and campaigns.version = %s"
-        " and cts.status = %s;"
+    )
+    query = (
+        "with linked as (select distinct scenario_id, ticket_reference from bugs_issues where bug_id = %(bug_id)s) "
+        f"{columns} '' as selection"
+        f" from campaign_ticket_scenarios as cts {joins}"
+        " where campaigns.project_id = %(project_name)s"
+        " and campaigns.version = %(version)s"
+        " and cts.status = %(status)s"
+        " and not exists (select 1 from linked"
+        " where linked.scenario_id = cts.scenario_id and linked.ticket_reference = ct.ticket_reference)"
+        " union all "
+        f"{columns} 'selected' as selection"
+        " from linked"
+        " join campaign_ticket_scenarios as cts on cts.scenario_id = linked.scenario_id"
+        f" {joins}"
+        " where ct.ticket_reference = linked.ticket_reference"
+        " order by occurrence, ticket_reference, scenario_id;"
     )
 
     with pool.connection() as connection:
         connection.row_factory = dict_row
-        rows = connection.execute(
+        return connection.execute(
             query,
-            (
-                project_name,
-                version,
-                ScenarioStatusEnum.waiting_fix,
-            ),
-        )
-        result = rows.fetchall()
-        if bug_internal_id is not None:
-            query_linked = (
-                "select scenarios.name,"
-                " scenarios.scenario_id as scenario_id,"
-                " ct.ticket_reference,"
-                " campaigns.occurrence,"
-                " campaigns.version,"
-                " cts.scenario_id as scenario_tech_id,"
-                " 'selected' as selection"
-                " from campaign_ticket_scenarios as cts"
-                " join campaign_tickets as ct on cts.campaign_ticket_id = ct.id"
-                " join campaigns on campaigns.id = ct.campaign_id"
-                " join scenarios on scenarios.id = cts.scenario_id"
-                " where cts.scenario_id = %(scenario_id)s"
-                " and ct.ticket_reference = %(ticket_reference)s;"
-            )
-            query_bug = "select scenario_id, ticket_reference from bugs_issues where bug_id = %s;"
-            rows = connection.execute(
-                query_bug,
-                (bug_internal_id,),
-            )
-            issues_linked = list(rows.fetchall())
-            accumulator = []
-            if issues_linked:
-                with connection.cursor(row_factory=dict_row) as cursor:
-                    cursor.executemany(
-                        query_linked,
-                        issues_linked,
-                        returning=True,
-                    )
-                    while True:
-                        accumulator.extend(cursor.fetchall())
-                        if not cursor.nextset():
-                            break
-
-            merge_failing_scenario(
-                result,
-                accumulator,
-            )
-        return result
+            {
+                "bug_id": bug_internal_id,
+                "project_name": project_name,
+                "version": version,
+                "status": ScenarioStatusEnum.waiting_fix.value,
+            },
+        ).fetchall()
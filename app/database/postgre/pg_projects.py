@@ -6,6 +6,7 @@ from psycopg import DatabaseError, IntegrityError
 from psycopg.rows import dict_row, tuple_row
 
 from app.app_exception import DuplicateProject, ProjectNameInvalid
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
 from app.schema.project_enum import DashCollection
 from app.schema.project_schema import Project, RegisterVersion, RegisterVersionResponse, TicketProject
@@ -108,6 +109,7 @@ async def create_project_version(
             result = RegisterVersionResponse(
                 inserted_id=row["id"],
             )
+        rs_bump_data_version(project_name, project.version)
     except IntegrityError as ie:
         result = ApplicationError(
             error=ApplicationErrorCode.duplicate_element,
@@ -1,73 +1,66 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
+import uuid
 from csv import DictReader
 from datetime import datetime
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
-from psycopg.rows import dict_row, tuple_row
+from psycopg.rows import tuple_row
 
 from app.app_exception import DuplicateTestResults
-from app.database.redis.rs_test_result import mg_insert_test_result_done
-from app.database.utils.output_strategy import OutputStrategy
+from app.conf import postgre_string
+from app.database.postgre.pg_campaigns_management import retrieve_campaign_occurrence
+from app.database.redis.rs_test_result import (
+    mg_insert_test_result_done,
+    mg_update_test_result_progress,
+)
+from app.database.utils.chart_dataset import (
+    DATASET_COLUMNS,
+    append_run_to_datasets,
+    downsample_dataset,
+    gather_dataset,
+)
+from app.database.utils.output_strategy import BatchOutputStrategy, OutputStrategy
+from app.database.utils.result_partition import (
+    EPIC_RESULT_COLUMNS,
+    FEATURE_RESULT_COLUMNS,
+    PARTITIONS_IN_FLIGHT,
+    SCENARIO_RESULT_COLUMNS,
+    ScenarioIds,
+    compact_result,
+    compute_partition,
+    copy_partition,
+    merge_partitions,
+    partition_chunks,
+    partition_rollups,
+    record_partition,
+)
 from app.database.utils.what_strategy import WhatStrategy
 from app.schema.respository.scenario_schema import ScenarioExecution
 from app.utils.pgdb import pool
+from app.utils.process_pool import process_pool_executor
+from app.utils.project_alias import provide
 
 
-def retrieve_tuple_data(
-    result_date: datetime,
+def retrieve_result_scope(
     project_name: str,
     version: str,
-    campaign_id: int,
-    rows: DictReader | List[dict],
-    is_partial: bool,
-    result: List[
-        Tuple[
-            datetime,
-            str,
-            str,
-            int,
-            int,
-            int,
-            int,
-            str,
-            bool,
-        ],
-    ],
-) -> None:
-    """:return list of tuple (date, str, str, int, int, int, int, str, bool)"""
+) -> Tuple[int, int]:
+    """:return project and version ids referenced by the stored results"""
     with pool.connection() as connection:
-        connection.row_factory = dict_row
-        for row in rows:
-            if db_row := connection.execute(
-                "select ep.id as epic_id, ft.id as feature_id,"
-                " sc.id as scenario_internal_id from scenarios as sc "
-                "inner join features as ft on sc.feature_id = ft.id "
-                "inner join epics as ep on ep.id = ft.epic_id "
-                "where ep.name = %s "
-                "and ft.name = %s "
-                "and sc.scenario_id = %s "
-                "and ep.project_id = %s;",
-                (
-                    row.get("epic", row.get("epic_id", None)),
-                    row.get("feature_name", row.get("feature_id", None)),
-                    row["scenario_id"],
-                    project_name,
-                ),
-            ).fetchone():
-                result.append(
-                    (
-                        result_date,
-                        project_name,
-                        version,
-                        campaign_id,
-                        db_row["epic_id"],
-                        db_row["feature_id"],
-                        db_row["scenario_internal_id"],
-                        row["status"],
-                        is_partial,
-                    ),
-                )
+        connection.row_factory = tuple_row
+        return connection.execute(
+            "select pjt.id, ve.id"
+            " from versions as ve"
+            " join projects as pjt on pjt.id = ve.project_id"
+            " where pjt.alias = %s"
+            " and ve.version = %s;",
+            (
+                provide(project_name),
+                version,
+            ),
+        ).fetchone()
 
 
 def check_result_uniqueness(
@@ -81,9 +74,9 @@ def check_result_uniqueness(
     with pool.connection() as connection:
         connection.row_factory = tuple_row
         if result := connection.execute(  # noqa: F841
-            "select 0 from test_scenario_results where project_id = %s and version = %s and run_date = %s;",
+            "select 0 from test_scenario_results where project_alias = %s and version = %s and run_date = %s;",
             (
-                project_name,
+                provide(project_name),
                 version,
                 result_date,
             ),
@@ -94,93 +87,169 @@ def check_result_uniqueness(
             )
 
 
-def set_status(
-    current_status: str,
-    new_result: str,
-) -> str:
-    """For container elements, set the status based on the worse status.
-    i.e. container element is failed if one of its element is failed
-    """
-    if new_result == "failed" or current_status == "failed":
-        return "failed"
-    if new_result == "skipped" and current_status == "skipped":
-        return "skipped"
-    return "passed"
-
-
-def __compute_epic_result(
-    epic_list: list,
-    current_epic: int,
-    current_epic_status: str,
-    result_epic: int,
-    result_status: str,
+async def insert_result(
     result_date: datetime,
     project_name: str,
     version: str,
     campaign_id: int,
     is_partial: bool,
-) -> Tuple[int, str]:
-    if current_epic != result_epic:
-        epic_list.append(
+    mg_result_uuid: str,
+    rows: DictReader | Iterable[dict] | List[ScenarioExecution],
+) -> None:
+    """
+    Insert campaign-occurrence results at the specific date.
+    The rows are read by chunks, see partition_chunks, whose repository ids are resolved at once, and their scenario
+    results are copied as the chunks are computed so that the run, possibly merged from several reports, is never
+    held. The feature and epic results are rolled up by element, see merge_partitions, in any row order.
+    Args:
+        result_date: datetime, the results are observed
+        project_name: str, the project to add results
+        version: str, the project's version to add results
+        campaign_id: int, the campaign internal id
+        is_partial: bool, mark if the results are for specific tests (True) or whole test repository (False)
+        mg_result_uuid: str, uuid of the task for reporting results
+        rows: test results to compute
+
+    Returns: None
+
+    """
+    project_ref, version_ref = retrieve_result_scope(project_name, version)
+    recorded, parsed, written = [], 0, 0
+    with pool.connection() as connection:
+        with connection.cursor().copy(f"COPY scenario_results ({SCENARIO_RESULT_COLUMNS}) from stdin") as copy:
+            for chunk in partition_chunks(rows):
+                computed = compute_partition(
+                    result_date,
+                    project_name,
+                    version,
+                    campaign_id,
+                    is_partial,
+                    chunk,
+                    retrieve_scenario_ids(project_name, {result[:3] for result in chunk}),
+                )
+                copy_partition(copy, computed[0], project_ref, version_ref)
+                recorded.append(partition_rollups(*computed))
+                parsed, written = parsed + len(chunk), written + len(computed[0])
+                mg_update_test_result_progress(mg_result_uuid, parsed=parsed, resolved=written, written=written)
+        if not written:
+            return mg_insert_test_result_done(
+                key_uuid=mg_result_uuid,
+                message="No result to record",
+            )
+        features, epics, element_names = merge_partitions(recorded)
+        with connection.cursor().copy(f"COPY feature_results ({FEATURE_RESULT_COLUMNS}) from stdin") as copy:
+            for feature in features:
+                copy.write_row(compact_result(feature, project_ref, version_ref))
+        with connection.cursor().copy(f"COPY epic_results ({EPIC_RESULT_COLUMNS}) from stdin") as copy:
+            for epic in epics:
+                copy.write_row(compact_result(epic, project_ref, version_ref))
+    # Runs are append only: extend the cached datasets with this run instead of dropping them
+    append_run_to_datasets(
+        project_name,
+        version,
+        await retrieve_campaign_occurrence(campaign_id),
+        is_partial,
+        result_date,
+        {
+            "scenarios": [scenario for partition in recorded for scenario in partition[0]],
+            "features": [(feature[5], feature[6], element_names["features"][feature[5]]) for feature in features],
+            "epics": [(epic[4], epic[5], element_names["epics"][epic[4]]) for epic in epics],
+        },
+    )
+    mg_insert_test_result_done(
+        mg_result_uuid,
+    )
+
+
+def retrieve_scenario_ids(
+    project_name: str,
+    keys: Iterable[Tuple[str, str, str]],
+) -> Dict[Tuple[str, str, str], ScenarioIds]:
+    """Resolve in one query the (epic name, feature name, scenario id) keys of results
+    :return ids and names of the known scenarios, not deleted, by key"""
+    epics, features, scenarios = zip(*keys) if keys else ((), (), ())
+    with pool.connection() as connection:
+        connection.row_factory = tuple_row
+        rows = connection.execute(
+            "select ep.name, ft.name, sc.scenario_id, ep.id, ft.id, sc.id"
+            " from unnest(%s::text[], %s::text[], %s::text[]) as res(epic, feature, scenario)"
+            " inner join epics as ep on ep.name = res.epic and ep.project_id = %s"
+            " inner join features as ft on ft.epic_id = ep.id and ft.name = res.feature"
+            " inner join scenarios as sc on sc.feature_id = ft.id and sc.scenario_id = res.scenario"
+            " and sc.is_deleted = false;",
             (
-                result_date,
+                list(epics),
+                list(features),
+                list(scenarios),
                 project_name,
-                version,
-                campaign_id,
-                current_epic,
-                current_epic_status,
-                is_partial,
             ),
-        )
-    return result_epic, set_status(
-        current_epic_status,
-        result_status,
-    )
+        ).fetchall()
+    return {(row[0], row[1], row[2]): (row[3], row[4], row[5], row[0], row[1]) for row in rows}
 
 
-def __compute_feature_result(
-    feature_list: list,
-    current_feature: int,
-    current_feature_status: str,
-    result_feature: int,
-    result_status: str,
+async def _record_partitions(
+    staging: str,
+    project_ref: int,
+    version_ref: int,
     result_date: datetime,
     project_name: str,
     version: str,
     campaign_id: int,
-    current_epic: int,
     is_partial: bool,
-) -> Tuple[int, str]:
-    if current_feature != result_feature:
-        feature_list.append(
-            (
+    mg_result_uuid: str,
+    rows: DictReader | Iterable[dict],
+    partition_by: str,
+) -> List[Tuple[List[tuple], List[tuple], List[tuple], dict]]:
+    """Dispatch the partition chunks to the process pool as they are read, at most PARTITIONS_IN_FLIGHT of them
+    being held, see record_partition
+    :return the recorded partitions"""
+    loop = asyncio.get_running_loop()
+    pending, recorded, parsed = set(), [], 0
+    for chunk in partition_chunks(rows, partition_by):
+        parsed += len(chunk)
+        scenario_ids = retrieve_scenario_ids(project_name, {result[:3] for result in chunk})
+        if len(pending) >= PARTITIONS_IN_FLIGHT:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            recorded.extend(task.result() for task in done)
+        pending.add(
+            loop.run_in_executor(
+                process_pool_executor(),
+                record_partition,
+                postgre_string,
+                staging,
+                project_ref,
+                version_ref,
                 result_date,
                 project_name,
                 version,
                 campaign_id,
-                current_epic,
-                current_feature,
-                current_feature_status,
                 is_partial,
-            ),
+                chunk,
+                scenario_ids,
+            )
         )
-    return result_feature, set_status(
-        current_feature_status,
-        result_status,
-    )
+        mg_update_test_result_progress(mg_result_uuid, parsed=parsed)
+    recorded.extend(await asyncio.gather(*pending))
+    return recorded
 
 
-async def insert_result(
+async def insert_result_partitioned(
     result_date: datetime,
     project_name: str,
     version: str,
     campaign_id: int,
     is_partial: bool,
     mg_result_uuid: str,
-    rows: DictReader | List[dict] | List[ScenarioExecution],
+    rows: DictReader | Iterable[dict],
+    partition_by: str = "epic",
 ) -> None:
     """
-    Insert campaign-occurrence results at the specific date
+    Insert campaign-occurrence results at the specific date, the run being split by epic or feature.
+    The rows are read by chunks, see partition_chunks, whose repository ids are resolved at once, then the process
+    pool workers compute the chunks and copy them with their own connections into a staging table. The run is moved
+    to the result tables in a single transaction so that it is visible once complete.
+    The partitions are worth it for very large runs on a host with several cores only, insert_result being the
+    default ingest.
     Args:
         result_date: datetime, the results are observed
         project_name: str, the project to add results
@@ -189,111 +258,66 @@ async def insert_result(
         is_partial: bool, mark if the results are for specific tests (True) or whole test repository (False)
         mg_result_uuid: str, uuid of the task for reporting results
         rows: test results to compute
+        partition_by: str, epic or feature
 
     Returns: None
 
     """
-    results = []
-    retrieve_tuple_data(
-        result_date,
+    staging = f"ingest_{uuid.uuid4().hex}"
+    try:
+        project_ref, version_ref = retrieve_result_scope(project_name, version)
+        with pool.connection() as connection:
+            connection.execute(
+                f"create unlogged table {staging} as select {SCENARIO_RESULT_COLUMNS}"
+                " from scenario_results with no data;"
+            )
+        recorded = await _record_partitions(
+            staging,
+            project_ref,
+            version_ref,
+            result_date,
+            project_name,
+            version,
+            campaign_id,
+            is_partial,
+            mg_result_uuid,
+            rows,
+            partition_by,
+        )
+        scenarios = [scenario for partition in recorded for scenario in partition[0]]
+        mg_update_test_result_progress(mg_result_uuid, resolved=len(scenarios), written=len(scenarios))
+        if not scenarios:
+            return mg_insert_test_result_done(
+                key_uuid=mg_result_uuid,
+                message="No result to record",
+            )
+        features, epics, element_names = merge_partitions(recorded)
+        with pool.connection() as connection:
+            connection.execute(
+                f"insert into scenario_results ({SCENARIO_RESULT_COLUMNS})"
+                f" select {SCENARIO_RESULT_COLUMNS} from {staging};"
+            )
+            with connection.cursor().copy(f"COPY feature_results ({FEATURE_RESULT_COLUMNS}) from stdin") as copy:
+                for feature in features:
+                    copy.write_row(compact_result(feature, project_ref, version_ref))
+            with connection.cursor().copy(f"COPY epic_results ({EPIC_RESULT_COLUMNS}) from stdin") as copy:
+                for epic in epics:
+                    copy.write_row(compact_result(epic, project_ref, version_ref))
+    finally:
+        with pool.connection() as connection:
+            connection.execute(f"drop table if exists {staging};")
+    append_run_to_datasets(
         project_name,
         version,
-        campaign_id,
-        rows,
+        await retrieve_campaign_occurrence(campaign_id),
         is_partial,
-        results,
+        result_date,
+        {
+            "scenarios": scenarios,
+            "features": [(feature[5], feature[6], element_names["features"][feature[5]]) for feature in features],
+            "epics": [(epic[4], epic[5], element_names["epics"][epic[4]]) for epic in epics],
+        },
     )
-    if not results:
-        return mg_insert_test_result_done(
-            key_uuid=mg_result_uuid,
-            message="No result to record",
-        )
-    with pool.connection() as connection:
-        with connection.cursor().copy(
-            "COPY test_scenario_results (run_date, project_id, version,"
-            " campaign_id, epic_id, feature_id, scenario_id,"
-            " status, is_partial) from stdin"
-        ) as copy:
-            FEATURE_ID_POS: int = 5
-            EPIC_ID_POS: int = 4
-            RESULT_STATUS_POS: int = 7
-
-            current_epic = results[0][EPIC_ID_POS]
-            current_epic_status = results[0][RESULT_STATUS_POS]
-            current_feature = results[0][FEATURE_ID_POS]
-            current_feature_status = results[0][RESULT_STATUS_POS]
-            epics = []
-            features = []
-            for result in results:
-                copy.write_row(result)
-
-                # Epic management
-                current_epic, current_epic_status = __compute_epic_result(
-                    epics,
-                    current_epic,
-                    current_epic_status,
-                    result[EPIC_ID_POS],
-                    result[RESULT_STATUS_POS],
-                    result_date,
-                    project_name,
-                    version,
-                    campaign_id,
-                    is_partial,
-                )
-
-                # Feature management
-                current_feature, current_feature_status = __compute_feature_result(
-                    features,
-                    current_feature,
-                    current_feature_status,
-                    result[FEATURE_ID_POS],
-                    result[RESULT_STATUS_POS],
-                    result_date,
-                    project_name,
-                    version,
-                    campaign_id,
-                    current_epic,
-                    is_partial,
-                )
-
-            # Last results
-            features.append(
-                (
-                    result_date,
-                    project_name,
-                    version,
-                    campaign_id,
-                    current_epic,
-                    current_feature,
-                    current_feature_status,
-                    is_partial,
-                ),
-            )
-            epics.append(
-                (
-                    result_date,
-                    project_name,
-                    version,
-                    campaign_id,
-                    current_epic,
-                    current_epic_status,
-                    is_partial,
-                ),
-            )
-        with connection.cursor().copy(
-            "COPY test_feature_results (run_date, project_id, version,"
-            " campaign_id, epic_id, feature_id,"
-            " status, is_partial) from stdin"
-        ) as copy:
-            for feature in features:
-                copy.write_row(feature)
-        with connection.cursor().copy(
-            "COPY test_epic_results (run_date, project_id, version,"
-            " campaign_id, epic_id,"
-            " status, is_partial) from stdin"
-        ) as copy:
-            for epic in epics:
-                copy.write_row(epic)
     mg_insert_test_result_done(
         mg_result_uuid,
     )
@@ -329,12 +353,33 @@ class TestResults:
         project_name: str,
         version: str,
         campaign_occurrence: str,
+        resolution: str = "run",
+        top: int = None,
     ) -> str | dict:
-        table_rows = await self.__what.gather(
+        downsampled = resolution != "run" or top is not None
+        if issubclass(self.__output, BatchOutputStrategy) and not downsampled:
+            # Raw export: written from the database cursor without building the dataset
+            return await self.__output.render_batches(
+                DATASET_COLUMNS[self.__what.rendering],
+                await self.__what.stream(
+                    project_name,
+                    version,
+                    campaign_occurrence,
+                ),
+            )
+        dataset = await gather_dataset(
+            self.__what,
             project_name,
             version,
             campaign_occurrence,
         )
+        if downsampled:
+            dataset = downsample_dataset(
+                self.__what.rendering,
+                dataset,
+                resolution,
+                top,
+            )
         return await self.__output.render(
-            table_rows=table_rows,
+            dataset=dataset,
         )
@@ -6,6 +6,7 @@ from psycopg import IntegrityError
 from psycopg.rows import dict_row, tuple_row
 
 from app.database.postgre.pg_versions import refresh_version_stats, update_status_for_ticket_in_version
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
 from app.schema.project_schema import RegisterVersionResponse
 from app.schema.ticket_schema import Ticket, ToBeTicket, UpdatedTicket
@@ -37,6 +38,7 @@ async def add_ticket(
                 ),
             ).fetchone()
         await refresh_version_stats(project_name, project_version)
+        rs_bump_data_version(project_name, project_version)
         return RegisterVersionResponse(inserted_id=row[0])
     except IntegrityError as ie:
         return ApplicationError(
@@ -184,10 +186,13 @@ async def move_tickets(
             ).fetchone()
             _ticket_id.append(ticket_id[0])
             connection.commit()
-    return await _update_ticket_version(
+    result = await _update_ticket_version(
         _ticket_id,
         target_version_id,
     )
+    rs_bump_data_version(project_name, version)
+    rs_bump_data_version(project_name, target_version)
+    return result
 
 
 async def _update_ticket_version(
@@ -265,6 +270,7 @@ async def update_ticket(
                 error=ApplicationErrorCode.ticket_not_found,
                 message=f"Ticket {ticket_reference} does not exist in project {project_name} version {project_version}",
             )
+        rs_bump_data_version(project_name, project_version)
         if updated_ticket.version is None:
             return RegisterVersionResponse(
                 inserted_id=row["id"],
@@ -7,6 +7,7 @@ from psycopg.rows import dict_row, tuple_row
 
 from app.app_exception import StatusTransitionForbidden, UnknownStatusException
 from app.database.postgre.pg_projects import get_projects
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.database.utils.transitions import version_transition
 from app.schema.bugs_schema import Bugs, UpdateVersion
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
@@ -234,6 +235,7 @@ async def update_version_data(
                 query,
                 data,
             )
+        rs_bump_data_version(project_name, version)
 
     return await get_version(
         project_name,
@@ -383,6 +383,139 @@ POSTGRE_UPDATES = [
         add constraint chk_scenarios_isdeleted_not_null check (is_deleted IS NOT NULL); """,
         "description": "Add constraint to is_deleted to be not null",
     },
+    {
+        "request": """create table if not exists scenario_results (
+        run_date timestamp not null,
+        id serial primary key,
+        project_id int not null references projects(id),
+        version_id int not null references versions(id),
+        campaign_id int not null references campaigns(id),
+        epic_id int not null references epics(id),
+        feature_id int not null references features(id),
+        scenario_id int not null references scenarios(id),
+        status smallint not null check (status between 0 and 2),
+        is_partial boolean not null default false);
+        insert into scenario_results (run_date, id, project_id, version_id, campaign_id, epic_id, feature_id,
+        scenario_id, status, is_partial)
+        select tsr.run_date, tsr.id, pjt.id, ve.id, tsr.campaign_id, tsr.epic_id, tsr.feature_id, tsr.scenario_id,
+        case lower(trim(tsr.status)) when 'passed' then 1 when 'failed' then 2 else 0 end,
+        coalesce(tsr.is_partial, false)
+        from test_scenario_results as tsr
+        join projects as pjt on pjt.name = lower(tsr.project_id) or pjt.alias = lower(tsr.project_id)
+        join versions as ve on ve.project_id = pjt.id and ve.version = tsr.version;
+        select setval('scenario_results_id_seq', coalesce((select max(id) from scenario_results), 0) + 1, false);
+        do $$ begin
+        if exists (select 1 from test_scenario_results as tsr
+        where not exists (select 1 from scenario_results as sr where sr.id = tsr.id)) then
+        create table unmigrated_scenario_results as
+        select tsr.* from test_scenario_results as tsr
+        where not exists (select 1 from scenario_results as sr where sr.id = tsr.id);
+        raise warning 'test_scenario_results rows without project or version are kept in unmigrated_scenario_results';
+        end if;
+        end $$;
+        drop table test_scenario_results;
+        create index scenario_results_scope_idx on scenario_results (project_id, version_id, run_date);
+        create index scenario_results_campaign_idx on scenario_results (campaign_id, run_date);
+        create view test_scenario_results as
+        select sr.id, sr.run_date, pjt.name as project_id, pjt.alias as project_alias, ve.version,
+        sr.campaign_id, sr.epic_id, sr.feature_id, sr.scenario_id,
+        ((array['skipped', 'passed', 'failed'])[sr.status + 1])::varchar(50) as status,
+        sr.status as status_code, sr.is_partial
+        from scenario_results as sr
+        join projects as pjt on pjt.id = sr.project_id
+        join versions as ve on ve.id = sr.version_id;""",
+        "description": "Store scenario results with status code and project, version ids."
+        " View test_scenario_results keeps the former columns",
+    },
+    {
+        "request": """create table if not exists feature_results (
+        run_date timestamp not null,
+        id serial primary key,
+        project_id int not null references projects(id),
+        version_id int not null references versions(id),
+        campaign_id int not null references campaigns(id),
+        epic_id int not null references epics(id),
+        feature_id int not null references features(id),
+        status smallint not null check (status between 0 and 2),
+        is_partial boolean not null default false);
+        insert into feature_results (run_date, id, project_id, version_id, campaign_id, epic_id, feature_id,
+        status, is_partial)
+        select tfr.run_date, tfr.id, pjt.id, ve.id, tfr.campaign_id, tfr.epic_id, tfr.feature_id,
+        case lower(trim(tfr.status)) when 'passed' then 1 when 'failed' then 2 else 0 end,
+        coalesce(tfr.is_partial, false)
+        from test_feature_results as tfr
+        join projects as pjt on pjt.name = lower(tfr.project_id) or pjt.alias = lower(tfr.project_id)
+        join versions as ve on ve.project_id = pjt.id and ve.version = tfr.version;
+        select setval('feature_results_id_seq', coalesce((select max(id) from feature_results), 0) + 1, false);
+        do $$ begin
+        if exists (select 1 from test_feature_results as tfr
+        where not exists (select 1 from feature_results as fr where fr.id = tfr.id)) then
+        create table unmigrated_feature_results as
+        select tfr.* from test_feature_results as tfr
+        where not exists (select 1 from feature_results as fr where fr.id = tfr.id);
+        raise warning 'test_feature_results rows without project or version are kept in unmigrated_feature_results';
+        end if;
+        end $$;
+        drop table test_feature_results;
+        create index feature_results_scope_idx on feature_results (project_id, version_id, run_date);
+        create index feature_results_campaign_idx on feature_results (campaign_id, run_date);
+        create view test_feature_results as
+        select fr.id, fr.run_date, pjt.name as project_id, pjt.alias as project_alias, ve.version,
+        fr.campaign_id, fr.epic_id, fr.feature_id,
+        ((array['skipped', 'passed', 'failed'])[fr.status + 1])::varchar(50) as status,
+        fr.status as status_code, fr.is_partial
+        from feature_results as fr
+        join projects as pjt on pjt.id = fr.project_id
+        join versions as ve on ve.id = fr.version_id;""",
+        "description": "Store feature results with status code and project, version ids."
+        " View test_feature_results keeps the former columns",
+    },
+    {
+        "request": """create table if not exists epic_results (
+        run_date timestamp not null,
+        id serial primary key,
+        project_id int not null references projects(id),
+        version_id int not null references versions(id),
+        campaign_id int not null references campaigns(id),
+        epic_id int not null references epics(id),
+        status smallint not null check (status between 0 and 2),
+        is_partial boolean not null default false);
+        insert into epic_results (run_date, id, project_id, version_id, campaign_id, epic_id, status, is_partial)
+        select ter.run_date, ter.id, pjt.id, ve.id, ter.campaign_id, ter.epic_id,
+        case lower(trim(ter.status)) when 'passed' then 1 when 'failed' then 2 else 0 end,
+        coalesce(ter.is_partial, false)
+        from test_epic_results as ter
+        join projects as pjt on pjt.name = lower(ter.project_id) or pjt.alias = lower(ter.project_id)
+        join versions as ve on ve.project_id = pjt.id and ve.version = ter.version;
+        select setval('epic_results_id_seq', coalesce((select max(id) from epic_results), 0) + 1, false);
+        do $$ begin
+        if exists (select 1 from test_epic_results as ter
+        where not exists (select 1 from epic_results as er where er.id = ter.id)) then
+        create table unmigrated_epic_results as
+        select ter.* from test_epic_results as ter
+        where not exists (select 1 from epic_results as er where er.id = ter.id);
+        raise warning 'test_epic_results rows without project or version are kept in unmigrated_epic_results';
+        end if;
+        end $$;
+        drop table test_epic_results;
+        create index epic_results_scope_idx on epic_results (project_id, version_id, run_date);
+        create index epic_results_campaign_idx on epic_results (campaign_id, run_date);
+        create view test_epic_results as
+        select er.id, er.run_date, pjt.name as project_id, pjt.alias as project_alias, ve.version,
+        er.campaign_id, er.epic_id,
+        ((array['skipped', 'passed', 'failed'])[er.status + 1])::varchar(50) as status,
+        er.status as status_code, er.is_partial
+        from epic_results as er
+        join projects as pjt on pjt.id = er.project_id
+        join versions as ve on ve.id = er.version_id;""",
+        "description": "Store epic results with status code and project, version ids."
+        " View test_epic_results keeps the former columns",
+    },
+    {
+        "request": """create index if not exists scenario_results_history_idx
+        on scenario_results (project_id, scenario_id, run_date) include (version_id, status, is_partial);""",
+        "description": "Index the scenario results by scenario history for the flaky analytics",
+    },
     # Alter table users to use the first scope in the array to a json
     # alter table users
     #   alter column scopes type json using to_json('{"*":"' || scopes[1] ||'"}')
@@ -2,6 +2,7 @@
 # -*- Author: E.Aivayan -*-
 import psycopg
 from psycopg import Connection
+from psycopg.errors import Diagnostic
 
 from app.conf import config, postgre_setting_string, postgre_string
 from app.database.postgre.postgre_updates import POSTGRE_UPDATES
@@ -24,10 +25,17 @@ def init_postgres() -> None:
             conn.commit()
 
 
+def log_warning(diagnostic: Diagnostic) -> None:
+    # Updates report the data they cannot migrate as warnings
+    if diagnostic.severity_nonlocalized == "WARNING":
+        log_error(diagnostic.message_primary)
+
+
 def update_postgres() -> None:
     connexion = psycopg.connect(
         postgre_string,
     )
+    connexion.add_notice_handler(log_warning)
     create_schema(
         connexion,
     )
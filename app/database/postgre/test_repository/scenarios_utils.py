@@ -1,9 +1,10 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
-from typing import List
+from typing import List, Tuple
 
-from psycopg.rows import dict_row
+from psycopg.rows import dict_row, tuple_row
 
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
 from app.schema.respository.scenario_schema import BaseScenario, Scenario, Scenarios
 from app.utils.pgdb import pool
@@ -75,6 +76,54 @@ async def db_get_scenarios(
         return Scenarios(scenarios=[Scenario(**cur) for cur in cursor])
 
 
+async def db_get_scenarios_tech_ids(
+    project_name: str,
+    scenario_keys: List[Tuple[str, str, str | None, str | int]],
+    remove_deleted: bool = True,
+) -> Tuple[List[int], set[str | int]]:
+    """
+    Resolve scenarios of several features at once
+    Args:
+        project_name: str
+        scenario_keys: list of (epic name, feature name, feature filename or None for any, scenario id)
+        remove_deleted: bool, deleted scenarios are not found
+
+    Returns: the scenarios technical ids, the scenario ids not found
+
+    """
+    if not scenario_keys:
+        return [], set()
+    epics, features, filenames, scenario_ids = zip(*scenario_keys)
+    deleted_condition = " and sc.is_deleted = false" if remove_deleted else ""
+    with pool.connection() as connection:
+        connection.row_factory = tuple_row
+        rows = connection.execute(
+            "select wanted.position, sc.id"
+            " from unnest(%s::text[], %s::text[], %s::text[], %s::text[])"
+            " with ordinality as wanted(epic, feature, filename, scenario_id, position)"
+            " left join (scenarios as sc"
+            " join features as ft on ft.id = sc.feature_id"
+            " join epics as epc on epc.id = ft.epic_id)"
+            " on sc.project_id = %s"
+            " and epc.name = wanted.epic"
+            " and ft.name = wanted.feature"
+            " and (wanted.filename is null or ft.filename = wanted.filename)"
+            f" and sc.scenario_id = wanted.scenario_id{deleted_condition}"
+            " order by wanted.position, sc.id;",
+            (
+                list(epics),
+                list(features),
+                list(filenames),
+                [str(scenario_id) for scenario_id in scenario_ids],
+                project_name.casefold(),
+            ),
+        ).fetchall()
+    # Ordinality starts at 1, a scenario asked twice is attached once
+    tech_ids = list(dict.fromkeys(tech_id for _, tech_id in rows if tech_id is not None))
+    not_found = {scenario_ids[position - 1] for position, tech_id in rows if tech_id is None}
+    return tech_ids, not_found
+
+
 async def db_get_scenarios_id(
     project_name: str,
     epic_name: str,
@@ -245,6 +294,7 @@ async def db_update_scenario(
         connection.commit()
 
         if cursor is not None:
+            rs_bump_data_version(project_name)
             return None
         else:
             return ApplicationError(
@@ -1,21 +1,29 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 import asyncio
-from collections import Counter
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 
 from psycopg.rows import dict_row, tuple_row
 
 from app.app_exception import CampaignNotFound, ScenarioNotFound
 from app.database.postgre.pg_campaigns_management import is_campaign_exist, retrieve_campaign_id
 from app.database.postgre.pg_tickets import get_ticket, get_tickets_by_reference
+from app.database.postgre.test_repository.scenarios_utils import db_get_scenarios_tech_ids
+from app.database.redis.rs_campaign_status import (
+    rs_publish_campaign_status,
+    rs_record_campaign_status_count,
+    rs_retrieve_campaign_status_count,
+)
+from app.database.redis.rs_data_version import rs_bump_data_version, rs_retrieve_data_version
 from app.database.redis.rs_file_management import rs_invalidate_file
 from app.database.utils.ticket_management import add_ticket_to_campaign
 from app.database.utils.transitions import ticket_authorized_transition, version_transition
+from app.database.utils.what_strategy import STREAM_BATCH_SIZE
 from app.schema.base_schema import CreateUpdateModel
-from app.schema.campaign.campaign_response_schema import CampaignFull
+from app.schema.campaign.campaign_response_schema import CampaignDiff, CampaignFull
 from app.schema.campaign_schema import (
     CampaignPatch,
+    ScenarioStatusUpdate,
     TicketScenario,
     TicketScenarioCampaign,
 )
@@ -24,9 +32,12 @@ from app.schema.postgres_enums import ScenarioStatusEnum
 from app.schema.respository.feature_schema import Feature
 from app.schema.respository.scenario_schema import ScenarioExecution
 from app.schema.status_enum import TicketType
-from app.utils.pgdb import pool
+from app.utils.pgdb import fetch_batches, pool
 from app.utils.project_alias import provide
 
+# 3 parameters by scenario status update
+STATUS_UPDATES_CHUNK = 5_000
+
 
 async def fill_campaign(
     project_name: str,
@@ -147,15 +158,15 @@ async def db_put_campaign_ticket_scenarios(
     if isinstance(campaign_ticket_id, ApplicationError):
         return campaign_ticket_id
 
-    # Call sub function
-    scenarios_id = []
-    not_found_scenario_ids = set()
-    # Get scenario_internal_id ids
-    for feature in scenarios:
-        feature.project_name = project_name
-        await feature.gather_scenarios_from_ids()
-        scenarios_id.extend(feature.scenario_tech_ids())
-        not_found_scenario_ids.update(feature.deleted_scenarios())
+    # Get scenario_internal_id ids of every feature in one query
+    scenarios_id, not_found_scenario_ids = await db_get_scenarios_tech_ids(
+        project_name,
+        [
+            (feature.epic_name, feature.name, feature.filename, scenario_id)
+            for feature in scenarios
+            for scenario_id in feature.scenario_ids
+        ],
+    )
 
     if scenarios_id:  # Guard clause
         with pool.connection() as connection:
@@ -173,6 +184,7 @@ async def db_put_campaign_ticket_scenarios(
                 ),
             )
         rs_invalidate_file(f"file:{provide(project_name)}:{version}:{occurrence}:*")
+        rs_bump_data_version(project_name, version)
     message = f"Attached {len(scenarios_id)} scenario to ticket."
     if not_found_scenario_ids:
         message = f"One or more scenario cannot be found.\n {message}"
@@ -441,44 +453,268 @@ async def db_get_campaign_ticket_scenarios(
         )
 
 
-async def db_get_campaign_ticket_scenarios_status_count(
+async def db_get_campaign_tickets_with_scenarios(
     project_name: str,
     version: str,
     occurrence: str,
-    reference: str,
-) -> dict:
-    if not await is_campaign_exist(
+) -> List[TicketScenario] | ApplicationError:
+    """Retrieve every ticket of a campaign with its scenarios in a single query, tickets without scenario included"""
+    campaign_id = await retrieve_campaign_id(
         project_name,
         version,
         occurrence,
-    ):
-        raise CampaignNotFound(
-            f"Campaign occurrence {occurrence} for project {project_name} in version {version} not found"
+    )
+    if isinstance(campaign_id, ApplicationError):
+        return campaign_id
+    tickets = {}
+    with pool.connection() as connection:
+        connection.row_factory = dict_row
+        result = connection.execute(
+            "select ct.ticket_reference as reference,"
+            " tk.description as summary,"
+            " tk.status as ticket_status,"
+            " sc.scenario_id as scenario_id,"
+            " sc.name as name,"
+            " sc.steps as steps,"
+            " cts.status as status,"
+            " ft.name as feature_name,"
+            " sc.id as scenario_tech_id,"
+            " ep.name as epic"
+            " from campaign_tickets as ct"
+            " join tickets as tk on ct.ticket_id = tk.id"
+            " left join campaign_ticket_scenarios as cts"
+            " on ct.id = cts.campaign_ticket_id"
+            " left join scenarios as sc on sc.id = cts.scenario_id"
+            " left join features as ft on sc.feature_id = ft.id"
+            " left join epics as ep on ft.epic_id = ep.id"
+            " where ct.campaign_id = %s"
+            " order by ct.ticket_reference, cts.id;",
+            (campaign_id.campaign_id,),
         )
-    campaign_id = await retrieve_campaign_id(
+        for row in result:
+            reference = row.pop("reference")
+            if reference not in tickets:
+                tickets[reference] = TicketScenario(
+                    reference=reference,
+                    summary=row.pop("summary"),
+                    status=row.pop("ticket_status"),
+                )
+            if row["scenario_tech_id"] is not None:
+                tickets[reference].scenarios.append(ScenarioExecution(**row))
+    return list(tickets.values())
+
+
+async def db_get_campaign_status_count(
+    project_name: str,
+    version: str,
+    occurrence: str,
+) -> Dict[str, Dict[str, int]] | ApplicationError:
+    """
+    Count the campaign scenarios by ticket and status, counts being cached until the next write of the version
+    Args:
+        project_name: str
+        version: str
+        occurrence: str
+
+    Returns: scenario status to count by ticket reference, tickets without scenario being left out
+    """
+    data_version, _ = rs_retrieve_data_version(project_name, version)
+    status_count = rs_retrieve_campaign_status_count(project_name, version, occurrence, data_version)
+    if status_count is not None:
+        return status_count
+    campaign = await retrieve_campaign_id(
         project_name,
         version,
         occurrence,
     )
+    if isinstance(campaign, ApplicationError):
+        return campaign
+    status_count = {}
     with pool.connection() as connection:
         connection.row_factory = tuple_row
-        result = connection.execute(
-            "select cts.status"
+        rows = connection.execute(
+            "select ct.ticket_reference, cts.status, count(cts.id)"
             " from campaign_tickets as ct"
             " join campaign_ticket_scenarios as cts"
             " on ct.id = cts.campaign_ticket_id"
-            " join scenarios as sc on sc.id = cts.scenario_id"
-            " join features as ft on sc.feature_id = ft.id"
-            " join epics as ep on ft.epic_id = ep.id"
             " where ct.campaign_id = %s"
-            " and ct.ticket_reference = %s;",
-            (
-                campaign_id.campaign_id,
-                reference,
-            ),
+            " group by ct.ticket_reference, cts.status"
+            " order by ct.ticket_reference, cts.status;",
+            (campaign.campaign_id,),
+        )
+        for reference, status, count in rows:
+            status_count.setdefault(reference, {})[status] = count
+    rs_record_campaign_status_count(project_name, version, occurrence, data_version, status_count)
+    return status_count
+
+
+async def db_get_campaign_ticket_scenarios_status_count(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    reference: str,
+) -> dict:
+    status_count = await db_get_campaign_status_count(
+        project_name,
+        version,
+        occurrence,
+    )
+    if isinstance(status_count, ApplicationError):
+        raise CampaignNotFound(
+            f"Campaign occurrence {occurrence} for project {project_name} in version {version} not found"
+        )
+    return status_count.get(reference, {})
+
+
+# Columns of the campaign occurrence diff rows
+CAMPAIGN_DIFF_COLUMNS = (
+    "ticket_reference",
+    "scenario_internal_id",
+    "scenario_id",
+    "feature_name",
+    "epic",
+    "status",
+    "other_status",
+    "change",
+)
+
+
+def campaign_diff_query(
+    campaign_id: int,
+    other_campaign_id: int,
+    include_unchanged: bool = False,
+    limit: int = None,
+    skip: int = 0,
+) -> Tuple[str, dict]:
+    """
+    Provide the query comparing the tickets and ticket scenarios of two campaigns in a single full outer join.
+    Each ticket has a row without scenario so that added or removed tickets show even without scenarios.
+    Args:
+        campaign_id: int, internal id of the first campaign
+        other_campaign_id: int, internal id of the campaign compared to the first
+        include_unchanged: bool, keep the rows identical in both campaigns
+        limit: int, number of rows of the page, None for all the rows
+        skip: int, number of rows before the page
+
+    Returns: the query and its parameters. A page query, limit being provided, adds the total count of rows and
+    always returns a row, without difference when skip is past the last one.
+    """
+    page = (
+        "select changes.ticket_reference, changes.scenario_internal_id, sc.scenario_id, ft.name as feature_name,"
+        " ep.name as epic, changes.status, changes.other_status, changes.change"
+        " from changes"
+        " left join scenarios as sc on sc.id = changes.scenario_internal_id"
+        " left join features as ft on ft.id = sc.feature_id"
+        " left join epics as ep on ep.id = ft.epic_id"
+        " order by changes.ticket_reference, changes.scenario_internal_id nulls first"
+        " limit %(limit)s offset %(skip)s"
+    )
+    if limit is not None:
+        # Counted apart from the page so that the total is kept past the last page
+        page = (
+            "select page.*, total.total"
+            " from (select count(*) as total from changes) as total"
+            f" left join lateral ({page}) as page on true"
+            " order by page.ticket_reference, page.scenario_internal_id nulls first"
         )
-        temp = [res[0] for res in result.fetchall()]
-        return dict(Counter(temp))
+    return (
+        "with sides as ("
+        " select ct.campaign_id, ct.ticket_reference, cts.scenario_id, cts.status"
+        " from campaign_tickets as ct"
+        " cross join lateral ("
+        " select null::int as scenario_id, null::text as status"
+        " union all"
+        " select scenario_id, status from campaign_ticket_scenarios where campaign_ticket_id = ct.id"
+        " ) as cts"
+        " where ct.campaign_id in (%(campaign_id)s, %(other_campaign_id)s)"
+        "), diff as ("
+        " select coalesce(sa.ticket_reference, sb.ticket_reference) as ticket_reference,"
+        " coalesce(sa.scenario_id, sb.scenario_id) as scenario_internal_id,"
+        " sa.status as status,"
+        " sb.status as other_status,"
+        " case when sa.ticket_reference is null then 'added'"
+        " when sb.ticket_reference is null then 'removed'"
+        " when sa.status is distinct from sb.status then 'changed'"
+        " else 'unchanged' end as change"
+        " from (select * from sides where campaign_id = %(campaign_id)s) as sa"
+        " full outer join (select * from sides where campaign_id = %(other_campaign_id)s) as sb"
+        " on sa.ticket_reference = sb.ticket_reference"
+        " and coalesce(sa.scenario_id, 0) = coalesce(sb.scenario_id, 0)"
+        "), changes as ("
+        " select * from diff where %(include_unchanged)s or diff.change <> 'unchanged'"
+        ")"
+        f" {page};",
+        {
+            "campaign_id": campaign_id,
+            "other_campaign_id": other_campaign_id,
+            "include_unchanged": include_unchanged,
+            "limit": limit,
+            "skip": skip,
+        },
+    )
+
+
+async def _diff_campaign_ids(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    other_occurrence: str,
+) -> Tuple[int, int] | ApplicationError:
+    campaign = await retrieve_campaign_id(project_name, version, occurrence)
+    if isinstance(campaign, ApplicationError):
+        return campaign
+    other_campaign = await retrieve_campaign_id(project_name, version, other_occurrence)
+    if isinstance(other_campaign, ApplicationError):
+        return other_campaign
+    return campaign.campaign_id, other_campaign.campaign_id
+
+
+async def db_get_campaign_diff(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    other_occurrence: str,
+    include_unchanged: bool = False,
+    limit: int = 100,
+    skip: int = 0,
+) -> Tuple[List[CampaignDiff], int] | ApplicationError:
+    """
+    Compare the tickets and ticket scenarios of two occurrences of a version campaign, see campaign_diff_query
+    Args:
+        project_name: str
+        version: str
+        occurrence: str
+        other_occurrence: str, the occurrence compared to the first one
+        include_unchanged: bool, keep the rows identical in both occurrences
+        limit: int
+        skip: int
+
+    Returns: the page of differences ordered by ticket reference then scenario and the total count of differences
+    """
+    campaign_ids = await _diff_campaign_ids(project_name, version, occurrence, other_occurrence)
+    if isinstance(campaign_ids, ApplicationError):
+        return campaign_ids
+    query, parameters = campaign_diff_query(*campaign_ids, include_unchanged, limit, skip)
+    with pool.connection() as connection:
+        connection.row_factory = dict_row
+        rows = connection.execute(query, parameters).fetchall()
+    return [CampaignDiff(**row) for row in rows if row["ticket_reference"] is not None], rows[0]["total"]
+
+
+async def db_stream_campaign_diff(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    other_occurrence: str,
+    include_unchanged: bool = False,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[List[Tuple]] | ApplicationError:
+    """All the differences of two campaign occurrences, see db_get_campaign_diff, by batches of CAMPAIGN_DIFF_COLUMNS
+    rows from a server side cursor. The connection is held until the returned iterator is exhausted or closed."""
+    campaign_ids = await _diff_campaign_ids(project_name, version, occurrence, other_occurrence)
+    if isinstance(campaign_ids, ApplicationError):
+        return campaign_ids
+    return fetch_batches(*campaign_diff_query(*campaign_ids, include_unchanged), batch_size)
 
 
 async def db_get_campaign_ticket_scenario(
@@ -556,6 +792,31 @@ async def db_delete_campaign_ticket_scenario(
             ),
         )
         rs_invalidate_file(f"file:{provide(project_name)}:{version}:{occurrence}:*")
+    rs_bump_data_version(project_name, version)
+
+
+async def _publish_campaign_status(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    scenarios: List[Tuple[str, int, str]],
+) -> None:
+    """Push the updated scenarios (ticket reference, scenario internal id, status) to the campaign board
+    subscribers with the new status count of their tickets, counted once for all the subscribers"""
+    status_count = await db_get_campaign_status_count(
+        project_name,
+        version,
+        occurrence,
+    )
+    if isinstance(status_count, ApplicationError):
+        return
+    rs_publish_campaign_status(
+        project_name,
+        version,
+        occurrence,
+        scenarios,
+        {reference: status_count.get(reference, {}) for reference, _, _ in scenarios},
+    )
 
 
 async def db_set_campaign_ticket_scenario_status(
@@ -592,6 +853,14 @@ async def db_set_campaign_ticket_scenario_status(
                 scenario_internal_id,
             ),
         ).fetchone()
+    if result:
+        rs_bump_data_version(project_name, version, "status")
+        await _publish_campaign_status(
+            project_name,
+            version,
+            occurrence,
+            [(reference, int(scenario_internal_id), result["status"])],
+        )
     return (
         result
         if result
@@ -602,6 +871,79 @@ async def db_set_campaign_ticket_scenario_status(
     )
 
 
+async def db_set_campaign_ticket_scenario_statuses(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    updates: List[ScenarioStatusUpdate],
+) -> CreateUpdateModel | ApplicationError:
+    """
+    Update the status of many scenarios linked to the campaign tickets in one transaction,
+     by statements of STATUS_UPDATES_CHUNK scenarios
+    Args:
+        project_name: str
+        version: str
+        occurrence: str
+        updates: the ticket reference, scenario internal id and new status of each scenario.
+         A scenario updated twice keeps its last status.
+
+    Returns: CreateUpdateModel, the updates not matching a campaign ticket scenario in raw_data
+    """
+    campaign = await retrieve_campaign_id(
+        project_name,
+        version,
+        occurrence,
+    )
+    if isinstance(campaign, ApplicationError):
+        return campaign
+    statuses = {(update.ticket_reference, update.scenario_internal_id): update.status.value for update in updates}
+    updated = set()
+    if statuses:
+        updates_values = list(statuses.items())
+        rows = []
+        with pool.connection() as connection:
+            connection.row_factory = tuple_row
+            # Same transaction, each statement staying under the 65535 parameters of the protocol
+            for start in range(0, len(updates_values), STATUS_UPDATES_CHUNK):
+                chunk = updates_values[start : start + STATUS_UPDATES_CHUNK]
+                rows.extend(
+                    connection.execute(
+                        "update campaign_ticket_scenarios as cts"
+                        " set status = upd.status"
+                        " from (values"
+                        f" {', '.join(['(%s::text, %s::int, %s::text)'] * len(chunk))}"
+                        " ) as upd (ticket_reference, scenario_id, status)"
+                        " join campaign_tickets as ct on ct.ticket_reference = upd.ticket_reference"
+                        " where ct.campaign_id = %s"
+                        " and cts.campaign_ticket_id = ct.id"
+                        " and cts.scenario_id = upd.scenario_id"
+                        " returning ct.ticket_reference, cts.scenario_id, cts.status;",
+                        (
+                            *(value for key, status in chunk for value in (*key, status)),
+                            campaign.campaign_id,
+                        ),
+                    ).fetchall()
+                )
+        updated = {(reference, scenario_id) for reference, scenario_id, _ in rows}
+    if updated:
+        rs_invalidate_file(f"file:{provide(project_name)}:{version}:{occurrence}:*")
+        rs_bump_data_version(project_name, version, "status")
+        await _publish_campaign_status(project_name, version, occurrence, rows)
+    not_updated = [
+        {"ticket_reference": reference, "scenario_internal_id": scenario_id}
+        for reference, scenario_id in statuses
+        if (reference, scenario_id) not in updated
+    ]
+    message = f"Updated {len(updated)} scenario status."
+    if not_updated:
+        message = f"One or more scenario is not linked to the campaign tickets.\n {message}"
+    return CreateUpdateModel(
+        resource_id=campaign.campaign_id,
+        message=message,
+        raw_data={"not_updated": not_updated},
+    )
+
+
 def db_is_scenario_internal_id_exist(
     project_name: str,
     scenario_internal_id: int,
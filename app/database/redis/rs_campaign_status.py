@@ -0,0 +1,82 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import json
+from typing import Dict, List, Tuple
+
+from redis.client import PubSub
+
+from app.utils.project_alias import provide
+from app.utils.redis import redis_connection
+
+# Seconds a campaign status count is kept, counts of former data versions being left to expire
+CAMPAIGN_STATUS_COUNT_TTL = 24 * 3600
+
+
+def _status_count_key(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    data_version: str,
+) -> str:
+    return f"campaign_status_count:{provide(project_name)}:{version}:{occurrence}:{data_version}"
+
+
+def rs_record_campaign_status_count(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    data_version: str,
+    status_count: Dict[str, Dict[str, int]],
+) -> None:
+    # SPEC: record an entry campaign_status_count:project_alias:version:occurrence:data_version-status_count
+    # SPEC: a write of the version changes its data version, the entry is then not read anymore
+    redis_connection().set(
+        _status_count_key(project_name, version, occurrence, data_version),
+        json.dumps(status_count),
+        ex=CAMPAIGN_STATUS_COUNT_TTL,
+    )
+
+
+def rs_retrieve_campaign_status_count(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    data_version: str,
+) -> Dict[str, Dict[str, int]] | None:
+    # SPEC: return the scenario status count by ticket reference or None if not cached for the data version
+    status_count = redis_connection().get(_status_count_key(project_name, version, occurrence, data_version))
+    return json.loads(status_count) if status_count is not None else None
+
+
+def campaign_status_channel(
+    project_name: str,
+    version: str,
+    occurrence: str,
+) -> str:
+    return f"campaign_status:{provide(project_name)}:{version}:{occurrence}"
+
+
+def rs_publish_campaign_status(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    scenarios: List[Tuple[str, int, str]],
+    status_count: Dict[str, Dict[str, int]],
+) -> None:
+    # SPEC: publish on campaign_status:project_alias:version:occurrence the updated scenarios
+    # SPEC: (ticket reference, scenario internal id, status) and the status count of their tickets
+    redis_connection().publish(
+        campaign_status_channel(project_name, version, occurrence),
+        json.dumps({"scenarios": scenarios, "status_count": status_count}),
+    )
+
+
+def rs_subscribe_campaign_status(
+    project_name: str,
+    version: str,
+    occurrence: str,
+) -> PubSub:
+    # SPEC: the caller reads the published updates with get_message and closes the subscription
+    subscription = redis_connection().pubsub(ignore_subscribe_messages=True)
+    subscription.subscribe(campaign_status_channel(project_name, version, occurrence))
+    return subscription
@@ -0,0 +1,122 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from redis.client import Pipeline
+
+from app.utils.redis import redis_connection
+
+# Datasets of the previous result versions are no longer read and expire
+DATASET_TTL = 24 * 3600
+
+
+def _decode_chunk(raw_chunk: bytes) -> dict:
+    chunk = json.loads(raw_chunk)
+    chunk["run_date"] = [datetime.fromisoformat(run_date) for run_date in chunk["run_date"]]
+    if "last_failure" in chunk:
+        chunk["last_failure"] = [
+            datetime.fromisoformat(last_failure) if last_failure is not None else None
+            for last_failure in chunk["last_failure"]
+        ]
+    return chunk
+
+
+def _appendable(
+    last_chunk: bytes | None,
+    chunk: dict,
+) -> bool:
+    """A run can be appended to a cached dataset if it comes after the cached runs"""
+    if last_chunk is None:
+        return False
+    last_run_dates = _decode_chunk(last_chunk)["run_date"]
+    if not last_run_dates:
+        return True
+    last_run_date = last_run_dates[-1]
+    new_run_date = chunk["run_date"][0]
+    return last_run_date.tzinfo is None and new_run_date.tzinfo is None and new_run_date > last_run_date
+
+
+def rs_record_dataset(
+    dataset_key: str,
+    dataset: dict,
+) -> bool:
+    """
+    Cache a gathered dataset unless the key is already cached
+    Args:
+        dataset_key: str, dataset:project_alias:version:occurrence:category:rendering:result_version key
+        dataset: dict, columnar data
+
+    Returns: bool, False if the dataset was already cached
+    """
+
+    # SPEC: a dataset is stored as a list of columnar chunks, the first one holding the whole history
+    # SPEC: the key holds the result version the dataset has been gathered at, a snapshot gathered while a run
+    #  was recorded is left under the previous result version and expires
+    def record(pipeline: Pipeline) -> bool:
+        if pipeline.exists(dataset_key):
+            return False
+        pipeline.multi()
+        pipeline.rpush(dataset_key, json.dumps(jsonable_encoder(dataset)))
+        pipeline.expire(dataset_key, DATASET_TTL)
+        return True
+
+    return redis_connection().transaction(record, dataset_key, value_from_callable=True)
+
+
+def rs_append_dataset(
+    previous_key: str,
+    dataset_key: str,
+    chunk: dict,
+) -> bool:
+    """
+    Append the columnar chunk of a new run to the dataset cached at the previous result version
+    and move it to the result version of the run.
+    Args:
+        previous_key: str, key of the dataset at the result version before the run
+        dataset_key: str, key of the dataset at the result version of the run
+        chunk: dict, columnar data of the run
+
+    Returns: bool, False if the dataset is not cached or has been dropped because the run
+     does not come after the cached ones. A dataset gathered again at the result version of the run is kept.
+    """
+
+    def append(pipeline: Pipeline) -> bool:
+        appendable = _appendable(pipeline.lindex(previous_key, -1), chunk)
+        pipeline.multi()
+        if appendable:
+            pipeline.rpush(previous_key, json.dumps(jsonable_encoder(chunk)))
+            pipeline.renamenx(previous_key, dataset_key)
+            pipeline.expire(dataset_key, DATASET_TTL)
+        pipeline.delete(previous_key)
+        return appendable
+
+    return redis_connection().transaction(append, previous_key, value_from_callable=True)
+
+
+def rs_retrieve_dataset(
+    dataset_key: str,
+) -> dict | None:
+    # SPEC: return the merged dataset or None if not cached
+    connection = redis_connection()
+    raw_chunks = connection.lrange(dataset_key, 0, -1)
+    if not raw_chunks:
+        return None
+    dataset = _decode_chunk(raw_chunks[0])
+    for raw_chunk in raw_chunks[1:]:
+        for column, values in _decode_chunk(raw_chunk).items():
+            dataset[column].extend(values)
+    return dataset
+
+
+def rs_dataset_exists(
+    dataset_key: str,
+) -> bool:
+    return bool(redis_connection().exists(dataset_key))
+
+
+def rs_invalidate_dataset(
+    dataset_key: str,
+) -> None:
+    redis_connection().delete(dataset_key)
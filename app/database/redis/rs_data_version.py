@@ -0,0 +1,158 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from app.utils.project_alias import provide
+from app.utils.redis import redis_connection
+
+
+def rs_bump_data_version(
+    project_name: str,
+    version: str = None,
+    deliverable_input: str | None = "content",
+) -> Tuple[str, str | None]:
+    """
+    Record a write on the project data.
+    Writes without version (i.e. test repository) are shared by every version of the project.
+    Args:
+        project_name: str
+        version: str, the version the written data belongs to if any
+        deliverable_input: str, the campaign deliverable input changed by a write of the version:
+         content, status for the campaign scenario statuses, None if the deliverables do not show the written data
+
+    Returns: the data versions of the project and of the version, None without version, right after the write
+    """
+    # SPEC: data_version:project_alias holds counter and modified for any write of the project
+    #  shared and shared_modified for the writes without version
+    # SPEC: data_version:project_alias:version holds counter and modified for the writes of the version
+    #  content and status for the writes changing the campaign deliverables
+    project_key = f"data_version:{provide(project_name)}"
+    modified = datetime.now(timezone.utc).timestamp()
+    connection = redis_connection()
+    pipeline = connection.pipeline()
+    pipeline.hincrby(project_key, "counter", 1)
+    pipeline.hset(project_key, "modified", modified)
+    if version is None:
+        pipeline.hincrby(project_key, "shared", 1)
+        pipeline.hset(project_key, "shared_modified", modified)
+    else:
+        pipeline.hget(project_key, "shared")
+        pipeline.hincrby(f"{project_key}:{version}", "counter", 1)
+        pipeline.hset(f"{project_key}:{version}", "modified", modified)
+        if deliverable_input is not None:
+            pipeline.hincrby(f"{project_key}:{version}", deliverable_input, 1)
+    # The transaction makes the returned versions the ones of this write
+    counter, _, shared, *version_counter = pipeline.execute()
+    if version is None:
+        return str(counter), None
+    return str(counter), f"{int(shared or 0)}.{version_counter[0]}"
+
+
+def rs_retrieve_data_version(
+    project_name: str,
+    version: str = None,
+) -> Tuple[str, datetime | None]:
+    """
+    Provide the data version of a project or of one of its versions
+    Args:
+        project_name: str
+        version: str, None for the whole project
+
+    Returns: the data version, changing on every write of the scope, and the last write date if any
+    """
+    project_key = f"data_version:{provide(project_name)}"
+    connection = redis_connection()
+    if version is None:
+        counter, modified = connection.hmget(project_key, "counter", "modified")
+        dates = [modified]
+        data_version = int(counter or 0)
+    else:
+        pipeline = connection.pipeline()
+        pipeline.hmget(project_key, "shared", "shared_modified")
+        pipeline.hmget(f"{project_key}:{version}", "counter", "modified")
+        (shared, shared_modified), (counter, modified) = pipeline.execute()
+        dates = [shared_modified, modified]
+        data_version = f"{int(shared or 0)}.{int(counter or 0)}"
+    dates = [float(date) for date in dates if date is not None]
+    return str(data_version), datetime.fromtimestamp(max(dates), timezone.utc) if dates else None
+
+
+def _result_counter(
+    project_key: str,
+    version: str | None,
+    campaign_occurrence: str | None,
+) -> Tuple[str, str]:
+    # SPEC: results holds the recorded runs of the project in data_version:project_alias,
+    #  of the version in data_version:project_alias:version and results:occurrence of its campaigns
+    if version is None:
+        return project_key, "results"
+    if campaign_occurrence is None:
+        return f"{project_key}:{version}", "results"
+    return f"{project_key}:{version}", f"results:{campaign_occurrence}"
+
+
+def rs_bump_result_version(
+    project_name: str,
+    scopes: List[Tuple[str | None, str | None]],
+) -> List[str]:
+    """
+    Record a run of test results in the scopes it belongs to
+    Args:
+        project_name: str
+        scopes: list of (version, occurrence) scopes, None for the project or the version scope
+
+    Returns: the result versions of the scopes right after the run
+    """
+    project_key = f"data_version:{provide(project_name)}"
+    pipeline = redis_connection().pipeline()
+    pipeline.hget(project_key, "shared")
+    for version, campaign_occurrence in scopes:
+        pipeline.hincrby(*_result_counter(project_key, version, campaign_occurrence), 1)
+    shared, *counters = pipeline.execute()
+    return [f"{int(shared or 0)}.{counter}" for counter in counters]
+
+
+def rs_retrieve_result_version(
+    project_name: str,
+    version: str = None,
+    campaign_occurrence: str = None,
+) -> str:
+    """
+    Provide the result version of a project, version or campaign scope
+    Args:
+        project_name: str
+        version: str, None for the project scope
+        campaign_occurrence: str, None for the project and version scopes
+
+    Returns: the result version, changing on every run recorded in the scope and every test repository write
+    """
+    project_key = f"data_version:{provide(project_name)}"
+    pipeline = redis_connection().pipeline()
+    pipeline.hget(project_key, "shared")
+    pipeline.hget(*_result_counter(project_key, version, campaign_occurrence))
+    shared, counter = pipeline.execute()
+    return f"{int(shared or 0)}.{int(counter or 0)}"
+
+
+def rs_retrieve_deliverable_version(
+    project_name: str,
+    version: str,
+    with_status: bool = False,
+) -> str:
+    """
+    Provide the version of the campaign deliverable inputs: the test repository and the version content
+    Args:
+        project_name: str
+        version: str
+        with_status: bool, the deliverable shows the campaign scenario statuses too
+
+    Returns: the deliverable version, changing on every write of the deliverable inputs
+    """
+    project_key = f"data_version:{provide(project_name)}"
+    pipeline = redis_connection().pipeline()
+    pipeline.hget(project_key, "shared")
+    pipeline.hmget(f"{project_key}:{version}", "content", "status")
+    shared, (content, status) = pipeline.execute()
+    deliverable_version = f"{int(shared or 0)}.{int(content or 0)}"
+    return f"{deliverable_version}.{int(status or 0)}" if with_status else deliverable_version
@@ -0,0 +1,153 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import json
+import uuid
+from datetime import datetime
+from os import remove
+from pathlib import Path
+from typing import Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.conf import BASE_DIR
+from app.database.redis.rs_test_result import progress_channel
+from app.schema.error_code import ApplicationError
+from app.schema.redis_schema import RdDeliverable
+from app.utils.project_alias import provide
+from app.utils.redis import redis_connection
+
+# Seconds identical requests join a running generation, the entry of a crashed generation being left to expire
+DELIVERABLE_JOB_TTL = 600
+# Seconds a deliverable generation status is kept
+DELIVERABLE_STATUS_TTL = 24 * 3600
+
+
+def _record_deliverable(
+    status_key: str,
+    data: RdDeliverable,
+) -> None:
+    # SPEC: store the generation state and push it to the subscribers of its progress channel
+    payload = json.dumps(jsonable_encoder(data))
+    pipeline = redis_connection().pipeline()
+    pipeline.set(status_key, payload, ex=DELIVERABLE_STATUS_TTL)
+    pipeline.publish(progress_channel(status_key), payload)
+    pipeline.execute()
+
+
+def rs_register_deliverable_job(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    deliverable_type: str,
+    file_key: str,
+    deliverable_version: str,
+) -> Tuple[str, bool]:
+    """
+    Register a deliverable generation, an identical generation running being joined
+    Args:
+        project_name: str
+        version: str
+        occurrence: str
+        deliverable_type: str
+        file_key: str, the key the deliverable file is recorded under
+        deliverable_version: str, the version of the deliverable inputs, see rs_retrieve_deliverable_version
+
+    Returns: str, project_alias:version:occurrence:uuid:deliverable key, and True if the caller must generate it
+    """
+    connection = redis_connection()
+    job_key = f"deliverable_job:{file_key}:{deliverable_version}"
+    while True:
+        status_key = f"{provide(project_name)}:{version}:{occurrence}:{uuid.uuid4()}:deliverable"
+        if connection.set(job_key, status_key, nx=True, ex=DELIVERABLE_JOB_TTL):
+            _record_deliverable(
+                status_key,
+                RdDeliverable(
+                    version=version,
+                    occurrence=occurrence,
+                    deliverable_type=deliverable_type,
+                    status="generating",
+                ),
+            )
+            return status_key, True
+        running = connection.get(job_key)
+        # The running generation might end in between, then register again
+        if running is not None:
+            return running.decode(), False
+
+
+def rs_deliverable_done(
+    status_key: str,
+    file_key: str,
+    deliverable_version: str,
+    result: str | ApplicationError,
+) -> None:
+    """
+    Record the generation outcome and let the next identical requests generate again
+    Args:
+        status_key: str, project_alias:version:occurrence:uuid:deliverable key
+        file_key: str, the key the deliverable file is recorded under
+        deliverable_version: str, the version of the deliverable inputs
+        result: the generated filename or the generation error
+    """
+    connection = redis_connection()
+    data = connection.get(status_key)
+    if data is not None:
+        dict_data = RdDeliverable(**json.loads(data))
+        dict_data.status = "done"
+        dict_data.updated = datetime.now()
+        if isinstance(result, ApplicationError):
+            dict_data.error = result.error.value
+            dict_data.message = result.message
+        else:
+            dict_data.filename = result
+        _record_deliverable(status_key, dict_data)
+    connection.delete(f"deliverable_job:{file_key}:{deliverable_version}")
+
+
+def rs_deliverable_job_running(
+    status_key: str,
+    file_key: str,
+    deliverable_version: str,
+) -> bool:
+    # SPEC: True while the generation of status_key holds the job entry, a crashed generation losing it on expiry
+    running = redis_connection().get(f"deliverable_job:{file_key}:{deliverable_version}")
+    return running is not None and running.decode() == status_key
+
+
+def rs_retrieve_deliverable(
+    status_key: str,
+) -> RdDeliverable | None:
+    # SPEC: return the generation state or None if unknown or expired
+    data = redis_connection().get(status_key)
+    return RdDeliverable(**json.loads(data)) if data is not None else None
+
+
+def rs_record_deliverable_file(
+    file_key: str,
+    deliverable_version: str,
+    filename: str,
+) -> None:
+    # SPEC: record an entry file_key-version, filename in redis, the file formerly recorded being removed
+    # SPEC: file_key should match deliverable:project_alias:version:occurrence(:ticket_reference):type
+    connection = redis_connection()
+    former = connection.hget(file_key, "filename")
+    connection.hset(file_key, mapping={"version": deliverable_version, "filename": filename})
+    if former is not None and former.decode() != filename:
+        former_path = Path(f"{BASE_DIR}/static/{former.decode()}")
+        if former_path.exists():
+            remove(former_path)
+
+
+def rs_retrieve_deliverable_file(
+    file_key: str,
+    deliverable_version: str,
+) -> str | None:
+    # SPEC: return the filename recorded for the deliverable version
+    # SPEC: None if the deliverable inputs changed since or the real file does not exist anymore
+    version, filename = redis_connection().hmget(file_key, "version", "filename")
+    if filename is None or version.decode() != deliverable_version:
+        return None
+    if not Path(f"{BASE_DIR}/static/{filename.decode()}").exists():
+        redis_connection().delete(file_key)
+        return None
+    return filename.decode()
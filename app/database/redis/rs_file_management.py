@@ -1,7 +1,9 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import json
 from os import remove
 from pathlib import Path
+from typing import List
 
 from app.conf import BASE_DIR
 from app.utils.log_management import log_message
@@ -54,3 +56,32 @@ def rs_retrieve_file(
         else:
             rs_invalidate_file(file_key)
     return None
+
+
+# Renders kept in the hit ranking of a scope
+MAX_TRACKED_RENDERS = 50
+
+
+def rs_record_render_hit(
+    scope_key: str,
+    render: dict,
+) -> None:
+    # SPEC: scope_key should match render_hits:project_alias:version:occurrence
+    # SPEC: render holds the render parameters, its score is its number of requests
+    connection = redis_connection()
+    pipeline = connection.pipeline()
+    pipeline.zincrby(scope_key, 1, json.dumps(render, sort_keys=True))
+    pipeline.zcard(scope_key)
+    _, tracked = pipeline.execute()
+    # Forget the least requested renders, leaving room for new ones to gather hits
+    if tracked > 2 * MAX_TRACKED_RENDERS:
+        connection.zremrangebyrank(scope_key, 0, -MAX_TRACKED_RENDERS - 1)
+
+
+def rs_retrieve_hot_renders(
+    scope_key: str,
+    count: int,
+) -> List[dict]:
+    # SPEC: return the count most requested render parameters of the scope, most requested first
+    connection = redis_connection()
+    return [json.loads(render) for render in connection.zrevrange(scope_key, 0, count - 1)]
@@ -1,7 +1,10 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
 import json
 import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator
 
 from fastapi.encoders import jsonable_encoder
 
@@ -9,6 +12,36 @@ from app.schema.redis_schema import RdTestResult
 from app.utils.project_alias import provide
 from app.utils.redis import redis_connection
 
+# Seconds without update before the event stream sends a keepalive comment
+KEEPALIVE_TIMEOUT = 15
+# Seconds between two reads of the progress subscription of an event stream
+EVENTS_POLL = 0.5
+# Seconds without update after which a result processing is considered lost, e.g. its worker died
+PROCESSING_STALLED_TIMEOUT = 600
+# Seconds an upload is recognized as a retry of the same upload
+RESULT_UPLOAD_TTL = 24 * 3600
+# Upload reservation value until its processing is registered
+RESULT_UPLOAD_PENDING = "pending"
+
+
+def progress_channel(
+    key_uuid: str,
+) -> str:
+    """Pub/sub channel where the updates of the result processing key_uuid are published"""
+    return f"progress:{key_uuid}"
+
+
+def _record_test_result(
+    key_uuid: str,
+    data: RdTestResult,
+) -> None:
+    # SPEC: store the processing state and push it to the subscribers of its progress channel
+    payload = json.dumps(jsonable_encoder(data))
+    pipeline = redis_connection().pipeline()
+    pipeline.set(key_uuid, payload)
+    pipeline.publish(progress_channel(key_uuid), payload)
+    pipeline.execute()
+
 
 def mg_insert_test_result(
     project_name: str,
@@ -58,9 +91,100 @@ def mg_insert_test_result_done(
     data = connection.get(key_uuid)
     dict_data = RdTestResult(**json.loads(data))
     dict_data.status = "done"
+    dict_data.updated = datetime.now()
     if message is not None:
         dict_data.message = f"{dict_data.message}; {message}"
-    connection.set(key_uuid, json.dumps(jsonable_encoder(dict_data)))
+    _record_test_result(key_uuid, dict_data)
+
+
+def mg_update_test_result_progress(
+    key_uuid: str,
+    parsed: int = None,
+    resolved: int = None,
+    written: int = None,
+) -> None:
+    """
+    Update the progress counters of the result processing and publish them
+    Args:
+        key_uuid: str, project_alias:version:campaign_id:uuid:result key
+        parsed: int, rows read from the result file so far
+        resolved: int, rows matched to a repository scenario so far
+        written: int, rows recorded in the database so far
+    """
+    connection = redis_connection()
+    data = connection.get(key_uuid)
+    if data is None:
+        return
+    dict_data = RdTestResult(**json.loads(data))
+    if parsed is not None:
+        dict_data.parsed = parsed
+    if resolved is not None:
+        dict_data.resolved = resolved
+    if written is not None:
+        dict_data.written = written
+    dict_data.unresolved = dict_data.parsed - dict_data.resolved
+    dict_data.updated = datetime.now()
+    elapsed = (dict_data.updated - dict_data.created).total_seconds()
+    dict_data.throughput = round(dict_data.parsed / elapsed, 1) if elapsed > 0 else 0.0
+    _record_test_result(key_uuid, dict_data)
+
+
+def _result_upload_key(
+    project_name: str,
+    version: str,
+    content_hash: str,
+) -> str:
+    return f"result_upload:{provide(project_name)}:{version}:{content_hash}"
+
+
+def rs_reserve_result_upload(
+    project_name: str,
+    version: str,
+    content_hash: str,
+) -> str | None:
+    """
+    Reserve a result upload in a single step, concurrent identical uploads reserving it once
+    Args:
+        project_name: str
+        version: str
+        content_hash: str, sha-256 of the upload content and parameters
+
+    Returns: None if the upload is new and reserved, else the status key of the same upload received before,
+     RESULT_UPLOAD_PENDING while its processing is being registered
+    """
+    connection = redis_connection()
+    key = _result_upload_key(project_name, version, content_hash)
+    while True:
+        if connection.set(key, RESULT_UPLOAD_PENDING, nx=True, ex=RESULT_UPLOAD_TTL):
+            return None
+        status_key = connection.get(key)
+        # The former upload might be forgotten in between, then reserve again
+        if status_key is not None:
+            return status_key.decode()
+
+
+def rs_record_result_upload(
+    project_name: str,
+    version: str,
+    content_hash: str,
+    status_key: str,
+) -> None:
+    # SPEC: record the status key of a reserved upload, see rs_reserve_result_upload, keeping its expiry
+    redis_connection().set(
+        _result_upload_key(project_name, version, content_hash),
+        status_key,
+        xx=True,
+        keepttl=True,
+    )
+
+
+def rs_forget_result_upload(
+    project_name: str,
+    version: str,
+    content_hash: str,
+) -> None:
+    # SPEC: remove the upload reservation so that the upload, not or wrongly processed, can be posted again
+    redis_connection().delete(_result_upload_key(project_name, version, content_hash))
 
 
 def test_result_status(
@@ -69,3 +193,58 @@ def test_result_status(
     connection = redis_connection()
     result = connection.get(key_uuid)
     return json.loads(result) if result is not None else {}
+
+
+def _processing_lost(
+    payload: bytes | None,
+) -> bool:
+    """The state of the processing expired or has not been updated for PROCESSING_STALLED_TIMEOUT"""
+    if payload is None:
+        return True
+    state = RdTestResult(**json.loads(payload))
+    return state.status != "done" and datetime.now() - state.updated > timedelta(seconds=PROCESSING_STALLED_TIMEOUT)
+
+
+async def test_result_events(
+    key_uuid: str,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events of the result processing: its current state then each update until it is done.
+    The subscription is polled without blocking so that a stream does not hold a thread.
+    The stream ends with an error event once the processing is lost, see _processing_lost.
+    Args:
+        key_uuid: str, project_alias:version:campaign_id:uuid:result key
+
+    Returns: AsyncIterator of text/event-stream messages
+    """
+    connection = redis_connection()
+    pubsub = connection.pubsub(ignore_subscribe_messages=True)
+    # Subscribe before reading the state so that no update is lost in between
+    pubsub.subscribe(progress_channel(key_uuid))
+    try:
+        payload = connection.get(key_uuid)
+        if payload is None:
+            yield "event: error\ndata: {}\n\n"
+            return
+        idle = 0.0
+        while True:
+            if payload is not None:
+                idle = 0.0
+                payload = payload.decode()
+                status = json.loads(payload)["status"]
+                yield f"event: {status}\ndata: {payload}\n\n"
+                if status == "done":
+                    return
+            elif idle >= KEEPALIVE_TIMEOUT:
+                idle = 0.0
+                if _processing_lost(connection.get(key_uuid)):
+                    yield "event: error\ndata: {}\n\n"
+                    return
+                yield ": keepalive\n\n"
+            message = pubsub.get_message(timeout=0)
+            payload = message["data"] if message is not None else None
+            if payload is None:
+                await asyncio.sleep(EVENTS_POLL)
+                idle += EVENTS_POLL
+    finally:
+        pubsub.close()
@@ -0,0 +1,346 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Type
+
+from psycopg.rows import tuple_row
+
+from app.database.redis.rs_chart_dataset import (
+    rs_append_dataset,
+    rs_dataset_exists,
+    rs_invalidate_dataset,
+    rs_record_dataset,
+    rs_retrieve_dataset,
+)
+from app.database.redis.rs_data_version import (
+    rs_bump_data_version,
+    rs_bump_result_version,
+    rs_retrieve_result_version,
+)
+from app.database.redis.rs_file_management import rs_invalidate_file
+from app.database.utils.status_matrix import StatusMatrix
+from app.database.utils.what_strategy import REGISTERED_STRATEGY, WhatStrategy
+from app.utils.pgdb import pool
+from app.utils.project_alias import provide
+
+# Columns of a dataset in the order of the gathered table rows
+DATASET_COLUMNS = {
+    "stacked": ("run_date", "passed", "skipped", "failed"),
+    "map": ("run_date", "element_id", "element_status", "element_name"),
+    "table": (
+        "run_date",
+        "element_id",
+        "element_name",
+        "runs",
+        "flips",
+        "flip_rate",
+        "last_failure",
+        "failure_streak",
+        "current_streak",
+    ),
+}
+
+
+# Element id of the row collapsing the elements out of the most volatile ones
+COLLAPSED_ELEMENT_ID = -1
+
+
+def dataset_key(
+    project_name: str,
+    version: str,
+    campaign_occurrence: str,
+    category: str,
+    rendering: str,
+    result_version: str,
+) -> str:
+    return f"dataset:{provide(project_name)}:{version}:{campaign_occurrence}:{category}:{rendering}:{result_version}"
+
+
+def previous_result_version(
+    result_version: str,
+) -> str:
+    """Result version of the scope before the run that gave result_version"""
+    shared, counter = result_version.split(".")
+    return f"{shared}.{int(counter) - 1}"
+
+
+def rows_to_dataset(
+    rendering: str,
+    table_rows: List[Tuple],
+) -> dict:
+    """Turn gathered rows into a columnar dataset"""
+    columns = DATASET_COLUMNS[rendering]
+    if not table_rows:
+        return {column: [] for column in columns}
+    return {column: list(values) for column, values in zip(columns, zip(*table_rows))}
+
+
+def dataset_to_rows(
+    rendering: str,
+    dataset: dict,
+) -> List[Tuple]:
+    """Turn a columnar dataset back into gathered rows"""
+    return list(zip(*(dataset[column] for column in DATASET_COLUMNS[rendering])))
+
+
+async def gather_dataset(
+    what: Type[WhatStrategy],
+    project_name: str,
+    version: str = None,
+    campaign_occurrence: str = None,
+) -> dict:
+    """Retrieve the cached dataset or gather it from the database and cache it"""
+    # The result version is read before gathering: a run recorded meanwhile moves the scope to a newer one
+    key = dataset_key(
+        project_name,
+        version,
+        campaign_occurrence,
+        what.category,
+        what.rendering,
+        rs_retrieve_result_version(project_name, version, campaign_occurrence),
+    )
+    dataset = rs_retrieve_dataset(key)
+    if dataset is None:
+        dataset = rows_to_dataset(
+            what.rendering,
+            await what.gather(
+                project_name,
+                version,
+                campaign_occurrence,
+            ),
+        )
+        rs_record_dataset(key, dataset)
+    return dataset
+
+
+async def warm_dataset(
+    what: Type[WhatStrategy],
+    project_name: str,
+    version: str = None,
+    campaign_occurrence: str = None,
+) -> None:
+    """Gather and cache the dataset unless it is cached, i.e. the last run has been appended to it"""
+    key = dataset_key(
+        project_name,
+        version,
+        campaign_occurrence,
+        what.category,
+        what.rendering,
+        rs_retrieve_result_version(project_name, version, campaign_occurrence),
+    )
+    if not rs_dataset_exists(key):
+        rs_record_dataset(
+            key,
+            rows_to_dataset(what.rendering, await what.gather(project_name, version, campaign_occurrence)),
+        )
+
+
+async def gather_datasets(
+    whats: List[Type[WhatStrategy]],
+    project_name: str,
+    version: str = None,
+    campaign_occurrence: str = None,
+) -> Dict[Tuple[str, str], dict]:
+    """
+    Retrieve several datasets of the same scope at once.
+    The campaign is resolved once and the datasets not cached are gathered in a single pipelined batch.
+    Args:
+        whats: the strategies to gather
+        project_name: str
+        version: str
+        campaign_occurrence: str
+
+    Returns: (category, rendering) to dataset
+    """
+    datasets = {}
+    missing = []
+    result_version = rs_retrieve_result_version(project_name, version, campaign_occurrence)
+    for what in whats:
+        dataset = rs_retrieve_dataset(
+            dataset_key(project_name, version, campaign_occurrence, what.category, what.rendering, result_version),
+        )
+        if dataset is None:
+            missing.append(what)
+        else:
+            datasets[(what.category, what.rendering)] = dataset
+    if not missing:
+        return datasets
+    campaign_id = await WhatStrategy.campaign_scope(project_name, version, campaign_occurrence)
+    with pool.connection() as connection:
+        connection.row_factory = tuple_row
+        with connection.pipeline():
+            cursors = [connection.execute(*what.query(project_name, version, campaign_id)) for what in missing]
+        for what, cursor in zip(missing, cursors):
+            dataset = rows_to_dataset(what.rendering, cursor.fetchall())
+            rs_record_dataset(
+                dataset_key(project_name, version, campaign_occurrence, what.category, what.rendering, result_version),
+                dataset,
+            )
+            datasets[(what.category, what.rendering)] = dataset
+    return datasets
+
+
+def run_rows(
+    rendering: str,
+    run_date: datetime,
+    elements: List[Tuple[int, str, str]],
+) -> List[Tuple]:
+    """
+    Compute the rows a single run adds to a dataset
+    Args:
+        rendering: str, stacked or map
+        run_date: datetime, the run date
+        elements: list of (element_id, status, element_name) of the run
+
+    Returns: list of rows as the strategy would have gathered them
+    """
+    if not elements:
+        return []
+    if rendering == "stacked":
+        statuses = Counter(status for _, status, _ in elements)
+        return [(run_date, statuses["passed"], statuses["skipped"], statuses["failed"])]
+    return [(run_date, *element) for element in sorted(elements, key=lambda element: element[0])]
+
+
+def run_scopes(
+    version: str,
+    campaign_occurrence: int | str,
+    is_partial: bool,
+) -> List[Tuple[str | None, str | None]]:
+    """(version, occurrence) scopes a run belongs to: its campaign and, for complete runs, its version and project"""
+    scopes = [(version, str(campaign_occurrence))]
+    if not is_partial:
+        scopes.extend([(None, None), (version, None)])
+    return scopes
+
+
+def append_run_to_datasets(
+    project_name: str,
+    version: str,
+    campaign_occurrence: int | str,
+    is_partial: bool,
+    run_date: datetime,
+    elements: Dict[str, List[Tuple[int, str, str]]],
+) -> None:
+    """
+    Bump the data and result versions, move the cached datasets to the result version of their scope with the newly
+    recorded run and invalidate the rendered files.
+    Datasets not cached yet and datasets a run cannot be appended to are left to be gathered on the next request.
+    Args:
+        project_name: str
+        version: str
+        campaign_occurrence: the occurrence of the campaign the run belongs to
+        is_partial: bool, mark if the results are for specific tests (True) or whole test repository (False)
+        run_date: datetime, the run date
+        elements: category to list of (element_id, status, element_name) of the run
+    """
+    # Test results are not part of the campaign deliverables
+    rs_bump_data_version(project_name, version, None)
+    # Datasets only depend on the runs of their scope and the test repository, not on the other writes
+    scopes = run_scopes(version, campaign_occurrence, is_partial)
+    for (scope_version, scope_occurrence), result_version in zip(scopes, rs_bump_result_version(project_name, scopes)):
+        for category, strategies in REGISTERED_STRATEGY.items():
+            for what in strategies.values():
+                if not what.include_run(scope_version, scope_occurrence, is_partial):
+                    continue
+                previous_key = dataset_key(
+                    project_name,
+                    scope_version,
+                    scope_occurrence,
+                    category,
+                    what.rendering,
+                    previous_result_version(result_version),
+                )
+                rows = run_rows(what.rendering, run_date, elements.get(category, []))
+                if not what.incremental or not rows:
+                    rs_invalidate_dataset(previous_key)
+                    continue
+                rs_append_dataset(
+                    previous_key,
+                    dataset_key(
+                        project_name,
+                        scope_version,
+                        scope_occurrence,
+                        category,
+                        what.rendering,
+                        result_version,
+                    ),
+                    rows_to_dataset(what.rendering, rows),
+                )
+        rs_invalidate_file(f"file:{provide(project_name)}:{scope_version}:{scope_occurrence}:*")
+
+
+def bucket_date(
+    run_date: datetime,
+    resolution: str,
+) -> datetime:
+    """Date of the day or week (starting on monday) the run belongs to"""
+    match resolution:
+        case "day":
+            return run_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        case "week":
+            day = run_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            return day - timedelta(days=day.weekday())
+        case _:
+            return run_date
+
+
+def _downsample_stacked(
+    dataset: dict,
+    resolution: str,
+) -> dict:
+    """Keep the last run of each bucket"""
+    buckets = {}
+    for row in dataset_to_rows("stacked", dataset):
+        buckets[bucket_date(row[0], resolution)] = row[1:]
+    return rows_to_dataset(
+        "stacked",
+        [(bucket, *counts) for bucket, counts in buckets.items()],
+    )
+
+
+def _downsample_map(
+    dataset: dict,
+    resolution: str,
+    top: int = None,
+) -> dict:
+    """Merge the runs of each bucket to the worse status.
+    If top is set, keep the top most volatile elements and collapse the others into a single row."""
+    matrix = StatusMatrix.from_dataset(dataset).bucket(resolution)
+    if top is not None:
+        matrix = matrix.top(top, COLLAPSED_ELEMENT_ID)
+    return matrix.to_dataset()
+
+
+def _downsample_table(
+    dataset: dict,
+    top: int = None,
+) -> dict:
+    """Keep the top first rows, a table being already ordered and not having runs to merge"""
+    if top is None:
+        return dataset
+    return {column: values[:top] for column, values in dataset.items()}
+
+
+def downsample_dataset(
+    rendering: str,
+    dataset: dict,
+    resolution: str = "run",
+    top: int = None,
+) -> dict:
+    """
+    Reduce a dataset for large renderings
+    Args:
+        rendering: str, stacked, map or table
+        dataset: dict, the columnar dataset
+        resolution: str, run, day or week, tables are not merged by date
+        top: int, for map, number of the most volatile elements to keep, for table, number of rows to keep
+
+    Returns: the downsampled dataset
+    """
+    if rendering == "stacked":
+        return _downsample_stacked(dataset, resolution)
+    if rendering == "table":
+        return _downsample_table(dataset, top)
+    return _downsample_map(dataset, resolution, top)
@@ -1,36 +1,54 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 import abc
+import asyncio
 import csv
+import io
+import json
 import uuid
 from abc import ABC
 from datetime import datetime
 from math import pi
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Sequence, Tuple, Type
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from bokeh import resources
 from bokeh.io import output_file, save
-from bokeh.models import CategoricalColorMapper, ColumnDataSource
+from bokeh.models import (
+    ColumnDataSource,
+    CustomJSHover,
+    DataTable,
+    DateFormatter,
+    FixedTicker,
+    HoverTool,
+    LinearColorMapper,
+    NumberFormatter,
+    TableColumn,
+)
 from bokeh.plotting import figure
 
 from app.conf import BASE_DIR
+from app.database.utils.status_matrix import STATUS_COLORS, STATUS_LABELS, StatusMatrix
 
 
 class OutputStrategy(ABC):
     @staticmethod
     @abc.abstractmethod
     async def render(
-        table_rows: List[Tuple],
+        dataset: dict,
     ) -> str | dict:
+        """Render a columnar dataset, see app.database.utils.chart_dataset"""
         pass
 
 
 class StakedHtml(OutputStrategy):
     @staticmethod
     async def render(
-        table_rows: List[Tuple],
+        dataset: dict,
     ) -> str:
-        _json = await StakedJson().render(table_rows)
+        _json = await StakedJson().render(dataset)
         max_y = max(
             _json["passed"][index] + _json["skipped"][index] + _json["failed"][index]
             for index in range(len(_json["run_date"]))
@@ -74,7 +92,7 @@ class StakedHtml(OutputStrategy):
 class StakedCsv(OutputStrategy):
     @staticmethod
     async def render(
-        table_rows: List[Tuple],
+        dataset: dict,
     ) -> str:
         # TODO add triggered background task to remove old files [Register here]
         filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.csv"
@@ -95,58 +113,42 @@ class StakedCsv(OutputStrategy):
                     "skipped",
                 ),
             )
-            _csv.writerows(table_rows)
+            _csv.writerows(
+                zip(
+                    dataset["run_date"],
+                    dataset["passed"],
+                    dataset["failed"],
+                    dataset["skipped"],
+                ),
+            )
         return filename.name
 
 
 class StakedJson(OutputStrategy):
     @staticmethod
     async def render(
-        table_rows: List[Tuple],
+        dataset: dict,
     ) -> dict:
-        result = {
-            "run_date": [],
-            "passed": [],
-            "failed": [],
-            "skipped": [],
+        return {
+            "run_date": dataset["run_date"],
+            "passed": dataset["passed"],
+            "failed": dataset["failed"],
+            "skipped": dataset["skipped"],
         }
-        for row in table_rows:
-            result["run_date"].append(row[0])
-            result["passed"].append(row[1])
-            result["skipped"].append(row[2])
-            result["failed"].append(row[3])
-        return result
 
 
 class MapHtml(OutputStrategy):
     @staticmethod
-    async def render(table_rows: List[Tuple]) -> str:
-        _json = await MapJson().render(table_rows)
+    async def render(dataset: dict) -> str:
+        matrix = StatusMatrix.from_dataset(dataset)
+        rows, columns = matrix.cells()
+        # Elements are displayed by name
+        name_order = np.argsort(matrix.element_names.astype(str), kind="stable")
+        name_rank = np.empty_like(name_order)
+        name_rank[name_order] = np.arange(len(name_order))
+        element_names = matrix.element_names[name_order].tolist()
+        dates = matrix.date_labels().tolist()
 
-        mapper = CategoricalColorMapper(
-            palette=[
-                "red",
-                "green",
-                "gray",
-            ],
-            factors=[
-                "failed",
-                "passed",
-                "skipped",
-            ],
-        )
-        item: datetime  # noqa: F842
-        _dates_range = [
-            item.strftime("%Y-%m-%dT%H:%M:%S")
-            for item in sorted(
-                set(
-                    _json["run_date"],
-                ),
-            )
-        ]
-        _dates = [item.strftime("%Y-%m-%dT%H:%M:%S") for item in _json["run_date"]]
-        _json["run_date"] = _dates
-        _elements_names = sorted(list(set(_json["element_name"])))
         filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.html"
         output_file(
             filename=filename,
@@ -155,18 +157,28 @@ class MapHtml(OutputStrategy):
         TOOLS = "hover,save,pan,box_zoom,reset,wheel_zoom"
         p = figure(
             title="Test map result",
-            x_range=_dates_range,
-            y_range=_elements_names,
+            x_range=(-0.5, len(dates) - 0.5),
+            y_range=(-0.5, len(element_names) - 0.5),
             x_axis_location="above",
             sizing_mode="stretch_both",
             tools=TOOLS,
             toolbar_location="below",
-            tooltips=[
-                ("Test: ", "@element_name"),
-                ("Result_date", "@run_date"),
-                ("Status", "@element_status"),
-            ],
         )
+        # Cells are plotted on integer coordinates, labels are only sent once
+        p.select_one(HoverTool).tooltips = [
+            ("Test: ", "@element_name{custom}"),
+            ("Result_date", "@run_date{custom}"),
+            ("Status", "@element_status{custom}"),
+        ]
+        p.select_one(HoverTool).formatters = {
+            "@element_name": CustomJSHover(args={"labels": element_names}, code="return labels[value]"),
+            "@run_date": CustomJSHover(args={"labels": dates}, code="return labels[value]"),
+            "@element_status": CustomJSHover(args={"labels": STATUS_LABELS.tolist()}, code="return labels[value]"),
+        }
+        p.xaxis.ticker = FixedTicker(ticks=list(range(len(dates))))
+        p.xaxis.major_label_overrides = dict(enumerate(dates))
+        p.yaxis.ticker = FixedTicker(ticks=list(range(len(element_names))))
+        p.yaxis.major_label_overrides = dict(enumerate(element_names))
 
         p.grid.grid_line_color = None
         p.axis.axis_line_color = None
@@ -179,10 +191,20 @@ class MapHtml(OutputStrategy):
             y="element_name",
             width=1,
             height=1,
-            source=_json,
+            source=ColumnDataSource(
+                data={
+                    "run_date": columns.astype(np.int32),
+                    "element_name": name_rank[rows].astype(np.int32),
+                    "element_status": matrix.statuses[rows, columns],
+                },
+            ),
             fill_color={
                 "field": "element_status",
-                "transform": mapper,
+                "transform": LinearColorMapper(
+                    palette=STATUS_COLORS,
+                    low=0,
+                    high=len(STATUS_COLORS) - 1,
+                ),
             },
             line_color=None,
         )
@@ -192,7 +214,7 @@ class MapHtml(OutputStrategy):
 
 class MapCsv(OutputStrategy):
     @staticmethod
-    async def render(table_rows: List[Tuple]) -> str:
+    async def render(dataset: dict) -> str:
         filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.csv"
         with open(filename, "w", newline="") as file:
             _csv = csv.writer(
@@ -207,25 +229,207 @@ class MapCsv(OutputStrategy):
                     "element_name",
                 ),
             )
-            _csv.writerows(table_rows)
+            _csv.writerows(
+                zip(
+                    dataset["run_date"],
+                    dataset["element_id"],
+                    dataset["element_status"],
+                    dataset["element_name"],
+                ),
+            )
         return filename.name
 
 
 class MapJson(OutputStrategy):
     @staticmethod
-    async def render(table_rows: List[Tuple]) -> dict:
-        result = {
-            "run_date": [],
-            "element_id": [],
-            "element_status": [],
-            "element_name": [],
+    async def render(dataset: dict) -> dict:
+        return {
+            "run_date": dataset["run_date"],
+            "element_id": dataset["element_id"],
+            "element_status": dataset["element_status"],
+            "element_name": dataset["element_name"],
         }
-        for row in table_rows:
-            result["run_date"].append(row[0])
-            result["element_id"].append(row[1])
-            result["element_status"].append(row[2])
-            result["element_name"].append(row[3])
-        return result
+
+
+# Flaky scenario table columns: title, cell formatter
+TABLE_COLUMNS = {
+    "element_name": ("Scenario", None),
+    "runs": ("Runs", None),
+    "flips": ("Flips", None),
+    "flip_rate": ("Flip rate", NumberFormatter(format="0.0 %")),
+    "last_failure": ("Last failure", DateFormatter(format="%Y-%m-%d %H:%M")),
+    "failure_streak": ("Longest failure streak", None),
+    "current_streak": ("Current failure streak", None),
+    "run_date": ("Last run", DateFormatter(format="%Y-%m-%d %H:%M")),
+}
+
+
+class TableHtml(OutputStrategy):
+    @staticmethod
+    async def render(dataset: dict) -> str:
+        filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.html"
+        output_file(
+            filename=filename,
+            title="Flaky scenarios",
+        )
+        table = DataTable(
+            source=ColumnDataSource({column: dataset[column] for column in TABLE_COLUMNS}),
+            columns=[
+                TableColumn(field=column, title=title, **({"formatter": formatter} if formatter else {}))
+                for column, (title, formatter) in TABLE_COLUMNS.items()
+            ],
+            sizing_mode="stretch_both",
+            index_position=None,
+        )
+        save(table, resources=resources.INLINE)
+        return filename.name
+
+
+class TableCsv(OutputStrategy):
+    @staticmethod
+    async def render(dataset: dict) -> str:
+        filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.csv"
+        with open(filename, "w", newline="") as file:
+            _csv = csv.writer(
+                file,
+                quoting=csv.QUOTE_ALL,
+            )
+            _csv.writerow(tuple(dataset))
+            _csv.writerows(zip(*dataset.values()))
+        return filename.name
+
+
+class TableJson(OutputStrategy):
+    @staticmethod
+    async def render(dataset: dict) -> dict:
+        return dict(dataset)
+
+
+# Statuses and names are few distinct values repeated on every run: dictionary encode them
+ARROW_TYPES = {
+    "run_date": pa.timestamp("us"),
+    "element_id": pa.int64(),
+    "element_status": pa.dictionary(pa.int8(), pa.string()),
+    "element_name": pa.dictionary(pa.int32(), pa.string()),
+    "passed": pa.int64(),
+    "skipped": pa.int64(),
+    "failed": pa.int64(),
+    "runs": pa.int64(),
+    "flips": pa.int64(),
+    "flip_rate": pa.float64(),
+    "last_failure": pa.timestamp("us"),
+    "failure_streak": pa.int64(),
+    "current_streak": pa.int64(),
+}
+
+
+PARQUET_ROW_GROUP = 128 * 1024
+
+
+def _arrow_schema(columns: Sequence[str]) -> pa.Schema:
+    return pa.schema([(column, ARROW_TYPES[column]) for column in columns])
+
+
+def _record_batch(
+    schema: pa.Schema,
+    values: Iterable[Sequence],
+) -> pa.RecordBatch:
+    """Build a record batch from the values of each column"""
+    return pa.record_batch(
+        [pa.array(column_values, type=field.type) for field, column_values in zip(schema, values)],
+        schema=schema,
+    )
+
+
+def _row_groups(
+    schema: pa.Schema,
+    batches: Iterator[List[Tuple]],
+) -> Iterator[pa.Table]:
+    """Gather the cursor batches in tables of PARQUET_ROW_GROUP rows.
+
+    A row group per cursor batch makes the file twice bigger and five times slower to load.
+    """
+    record_batches = []
+    rows_count = 0
+    for rows in batches:
+        record_batches.append(_record_batch(schema, zip(*rows)))
+        rows_count += len(rows)
+        if rows_count >= PARQUET_ROW_GROUP:
+            yield pa.Table.from_batches(record_batches, schema=schema)
+            record_batches = []
+            rows_count = 0
+    if record_batches:
+        yield pa.Table.from_batches(record_batches, schema=schema)
+
+
+class BatchOutputStrategy(OutputStrategy):
+    """Output written batch by batch from a server side cursor, see WhatStrategy.stream"""
+
+    @staticmethod
+    @abc.abstractmethod
+    def write_batches(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> str:
+        pass
+
+    @classmethod
+    async def render_batches(
+        cls: Type["BatchOutputStrategy"],
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> str:
+        # Reading the cursor and writing the file block: both are done in a thread
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            cls.write_batches,
+            columns,
+            batches,
+        )
+
+    @classmethod
+    async def render(
+        cls: Type["BatchOutputStrategy"],
+        dataset: dict,
+    ) -> str:
+        # Already gathered (i.e. downsampled) dataset written as a single batch
+        columns = tuple(dataset)
+        return await cls.render_batches(
+            columns,
+            iter([list(zip(*(dataset[column] for column in columns)))]),
+        )
+
+
+class ParquetOutput(BatchOutputStrategy):
+    @staticmethod
+    def write_batches(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> str:
+        filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.parquet"
+        schema = _arrow_schema(columns)
+        with pq.ParquetWriter(filename, schema, compression="zstd") as writer:
+            for table in _row_groups(schema, batches):
+                writer.write_table(table, row_group_size=PARQUET_ROW_GROUP)
+        return filename.name
+
+
+class ArrowOutput(BatchOutputStrategy):
+    @staticmethod
+    def write_batches(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> str:
+        # Stream format: each batch may carry its own dictionaries
+        filename = BASE_DIR / "static" / f"testoutput_{uuid.uuid4()}.arrows"
+        schema = _arrow_schema(columns)
+        with (
+            pa.OSFile(str(filename), "wb") as sink,
+            pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer,
+        ):
+            for rows in batches:
+                writer.write_batch(_record_batch(schema, zip(*rows)))
+        return filename.name
 
 
 REGISTERED_OUTPUT = {
@@ -233,10 +437,72 @@ REGISTERED_OUTPUT = {
         "text/csv": MapCsv,
         "application/json": MapJson,
         "text/html": MapHtml,
+        "application/vnd.apache.parquet": ParquetOutput,
+        "application/vnd.apache.arrow.stream": ArrowOutput,
     },
     "stacked": {
         "text/csv": StakedCsv,
         "application/json": StakedJson,
         "text/html": StakedHtml,
+        "application/vnd.apache.parquet": ParquetOutput,
+        "application/vnd.apache.arrow.stream": ArrowOutput,
     },
+    "table": {
+        "text/csv": TableCsv,
+        "application/json": TableJson,
+        "text/html": TableHtml,
+        "application/vnd.apache.parquet": ParquetOutput,
+        "application/vnd.apache.arrow.stream": ArrowOutput,
+    },
+}
+
+
+class StreamStrategy(ABC):
+    @staticmethod
+    @abc.abstractmethod
+    def encode(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> Iterator[str]:
+        """Encode batches of gathered rows as they come, see WhatStrategy.stream"""
+        pass
+
+
+class StreamCsv(StreamStrategy):
+    @staticmethod
+    def encode(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> Iterator[str]:
+        buffer = io.StringIO()
+        _csv = csv.writer(
+            buffer,
+            quoting=csv.QUOTE_ALL,
+        )
+        _csv.writerow(columns)
+        yield buffer.getvalue()
+        for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            _csv.writerows(rows)
+            yield buffer.getvalue()
+
+
+def _json_default(value: datetime) -> str:
+    return value.isoformat()
+
+
+class StreamNdjson(StreamStrategy):
+    @staticmethod
+    def encode(
+        columns: Tuple[str, ...],
+        batches: Iterator[List[Tuple]],
+    ) -> Iterator[str]:
+        for rows in batches:
+            yield "".join(f"{json.dumps(dict(zip(columns, row)), default=_json_default)}\n" for row in rows)
+
+
+REGISTERED_STREAM = {
+    "text/csv": StreamCsv,
+    "application/x-ndjson": StreamNdjson,
 }
@@ -0,0 +1,135 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+from app.database.postgre.pg_campaigns_management import retrieve_campaign_occurrence
+from app.database.postgre.pg_test_results import TestResults
+from app.database.redis.rs_file_management import (
+    rs_record_file,
+    rs_record_render_hit,
+    rs_retrieve_file,
+    rs_retrieve_hot_renders,
+)
+from app.database.utils.chart_dataset import run_scopes, warm_dataset
+from app.database.utils.output_strategy import REGISTERED_OUTPUT
+from app.database.utils.what_strategy import REGISTERED_STRATEGY
+from app.utils.log_management import log_error
+from app.utils.project_alias import provide
+
+# Number of the most requested renders of a scope warmed after an ingest
+WARMED_RENDERS = 5
+
+
+def render_key(
+    project_name: str,
+    version: str,
+    campaign_occurrence: str,
+    category: str,
+    rendering: str,
+    accept: str,
+    resolution: str = "run",
+    top: int = None,
+) -> str:
+    return (
+        f"file:{provide(project_name)}:{version}:{campaign_occurrence}:{category}:{rendering}:{accept}"
+        f":{resolution}:{top}"
+    )
+
+
+async def cached_render(
+    project_name: str,
+    version: str,
+    campaign_occurrence: str,
+    category: str,
+    rendering: str,
+    accept: str,
+    resolution: str = "run",
+    top: int = None,
+    count_hit: bool = True,
+) -> str | dict:
+    """
+    Render a test results chart, rendered files being served from the render cache
+    Args:
+        project_name: str
+        version: str, None for the project scope
+        campaign_occurrence: str, None for the project and version scopes
+        category: str, epics, features, scenarios or flaky
+        rendering: str, stacked, map or table
+        accept: str, the output media type
+        resolution: str, run, day or week
+        top: int, for map, number of the most volatile elements to keep, for table, number of rows to keep
+        count_hit: bool, count the request in the scope hot renders
+
+    Returns: the rendered filename or the json content
+    """
+    if count_hit:
+        rs_record_render_hit(
+            f"render_hits:{provide(project_name)}:{version}:{campaign_occurrence}",
+            {
+                "category": category,
+                "rendering": rendering,
+                "accept": accept,
+                "resolution": resolution,
+                "top": top,
+            },
+        )
+    file_key = render_key(project_name, version, campaign_occurrence, category, rendering, accept, resolution, top)
+    if accept != "application/json":
+        filename = rs_retrieve_file(file_key)
+        if filename is not None:
+            return filename
+    result = await TestResults(
+        REGISTERED_STRATEGY[category][rendering],
+        REGISTERED_OUTPUT[rendering][accept],
+    ).render(
+        project_name,
+        version,
+        campaign_occurrence,
+        resolution,
+        top,
+    )
+    if isinstance(result, str):
+        rs_record_file(file_key, result)
+    return result
+
+
+async def warm_render_cache(
+    project_name: str,
+    version: str,
+    campaign_id: int,
+    is_partial: bool,
+) -> None:
+    """
+    Render again the most requested files of the scopes a newly recorded run changed and gather the datasets of the
+    most requested json renders the run could not be appended to, so that users loading them hit the cache.
+    Args:
+        project_name: str
+        version: str
+        campaign_id: int, internal id of the campaign the run belongs to
+        is_partial: bool, mark if the results are for specific tests (True) or whole test repository (False)
+    """
+    campaign_occurrence = await retrieve_campaign_occurrence(campaign_id)
+    for scope_version, scope_occurrence in run_scopes(version, campaign_occurrence, is_partial):
+        hot_renders = rs_retrieve_hot_renders(
+            f"render_hits:{provide(project_name)}:{scope_version}:{scope_occurrence}",
+            WARMED_RENDERS,
+        )
+        for render in hot_renders:
+            # Json is built from the dataset: only gathered if the run could not be appended to the cached one
+            if render["accept"] == "application/json":
+                warm = warm_dataset(
+                    REGISTERED_STRATEGY[render["category"]][render["rendering"]],
+                    project_name,
+                    scope_version,
+                    scope_occurrence,
+                )
+            else:
+                warm = cached_render(
+                    project_name,
+                    scope_version,
+                    scope_occurrence,
+                    count_hit=False,
+                    **render,
+                )
+            try:
+                await warm
+            except Exception as exception:
+                log_error(f"Cannot warm {render} for {project_name} {scope_version} {scope_occurrence}: {exception}")
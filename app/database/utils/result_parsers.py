@@ -0,0 +1,232 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import abc
+from abc import ABC
+from csv import DictReader
+from io import TextIOWrapper
+from typing import BinaryIO, Iterator, List
+from xml.etree.ElementTree import Element, ParseError, iterparse
+
+import ijson
+
+from app.app_exception import MalformedCsvFile
+from app.schema.postgres_enums import TestResultStatusEnum
+
+# SPEC: CSV file must contain the following field: project_id, epic_id, feature_name,
+# scenario_id, status
+EXPECTED_HEADERS = (
+    "epic_id",
+    "feature_name",
+    "scenario_id",
+    "status",
+)
+
+
+def check_result_headers(
+    fieldnames: List[str] | None,
+    source: str = "csv file",
+) -> None:
+    """Raise MalformedCsvFile if a result file misses some of the expected headers"""
+    oracle = [header not in (fieldnames or []) for header in EXPECTED_HEADERS]
+    if any(oracle):
+        raise MalformedCsvFile(
+            f"The {source} misses some headers\n Missing header is True\n "
+            f"{''.join([str(item) for item in zip(EXPECTED_HEADERS, oracle)])}"
+        )
+
+
+def _worse_status(
+    statuses: List[str],
+) -> str:
+    """Map a test framework status list to the passed/failed/skipped result status"""
+    if any(status in ("failed", "error", "undefined", "ambiguous") for status in statuses):
+        return TestResultStatusEnum.failed.value
+    if not statuses or any(status not in ("passed", "ok") for status in statuses):
+        return TestResultStatusEnum.skipped.value
+    return TestResultStatusEnum.passed.value
+
+
+class ResultParser(ABC):
+    """Read a test report as result rows having the csv fields epic_id, feature_name, scenario_id and status.
+    The report is read incrementally so that its size does not bound the memory"""
+
+    @staticmethod
+    @abc.abstractmethod
+    def check(
+        stream: BinaryIO,
+        source: str,
+    ) -> None:
+        """Raise MalformedCsvFile if the report cannot be read"""
+        pass
+
+    @staticmethod
+    @abc.abstractmethod
+    def rows(
+        stream: BinaryIO,
+    ) -> Iterator[dict]:
+        pass
+
+
+class CsvResult(ResultParser):
+    @staticmethod
+    def check(
+        stream: BinaryIO,
+        source: str,
+    ) -> None:
+        text = TextIOWrapper(stream, encoding="utf-8")
+        try:
+            check_result_headers(DictReader(text).fieldnames, f"csv file {source}")
+        finally:
+            # The stream belongs to the caller, the wrapper would close it
+            text.detach()
+
+    @staticmethod
+    def rows(
+        stream: BinaryIO,
+    ) -> Iterator[dict]:
+        text = TextIOWrapper(stream, encoding="utf-8")
+        try:
+            yield from DictReader(text)
+        finally:
+            text.detach()
+
+
+class JunitResult(ResultParser):
+    """JUnit XML report, the repository elements of a testcase being:
+    - epic: the testcase property 'epic', else the testsuite property 'epic'
+    - feature_name: the testcase property 'feature', else its classname
+    - scenario_id: the testcase property 'scenario_id', else its name
+    """
+
+    @staticmethod
+    def check(
+        stream: BinaryIO,
+        source: str,
+    ) -> None:
+        try:
+            _, root = next(iterparse(stream, events=("start",)))
+        except (ParseError, StopIteration) as error:
+            raise MalformedCsvFile(f"The junit file {source} cannot be read") from error
+        if root.tag not in ("testsuites", "testsuite"):
+            raise MalformedCsvFile(f"The junit file {source} has no testsuite")
+
+    @staticmethod
+    def rows(
+        stream: BinaryIO,
+    ) -> Iterator[dict]:
+        parents: List[Element] = []
+        suite_properties: List[dict] = []
+        for event, element in iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if element.tag == "testsuite":
+                    suite_properties.append({})
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag == "property" and len(parents) > 1 and parents[-2].tag == "testsuite":
+                suite_properties[-1][element.get("name")] = element.get("value")
+            elif element.tag == "testcase":
+                properties = {prop.get("name"): prop.get("value") for prop in element.iterfind("properties/property")}
+                outcomes = [child.tag for child in element if child.tag in ("failure", "error", "skipped")]
+                yield {
+                    "epic_id": properties.get("epic", suite_properties[-1].get("epic") if suite_properties else None),
+                    "feature_name": properties.get("feature", element.get("classname")),
+                    "scenario_id": properties.get("scenario_id", element.get("name")),
+                    "status": _worse_status(
+                        [{"failure": "failed", "error": "failed"}.get(tag, tag) for tag in outcomes] or ["passed"]
+                    ),
+                }
+                # Forget the handled testcase, the suites only keep the ones not read yet
+                if parents:
+                    parents[-1].remove(element)
+            elif element.tag == "testsuite":
+                suite_properties.pop()
+                if parents:
+                    parents[-1].remove(element)
+
+
+# Cucumber json values kept by the parser: event prefix -> element, field.
+# Cucumber tags are objects, behave tags are strings
+CUCUMBER_FIELDS = {
+    "item.name": ("feature", "name"),
+    "item.tags.item": ("feature", "tags"),
+    "item.tags.item.name": ("feature", "tags"),
+    "item.elements.item.type": ("scenario", "type"),
+    "item.elements.item.status": ("scenario", "status"),
+    "item.elements.item.tags.item": ("scenario", "tags"),
+    "item.elements.item.tags.item.name": ("scenario", "tags"),
+    "item.elements.item.steps.item.result.status": ("scenario", "steps"),
+}
+
+
+class CucumberResult(ResultParser):
+    """Cucumber or behave JSON report, the repository elements of a scenario being:
+    - epic: the feature tag 'epic=<epic name>'
+    - feature_name: the feature name
+    - scenario_id: the scenario tag 'id=<scenario id>'
+    Backgrounds are not results, step outputs and embeddings are skipped while reading.
+    """
+
+    @staticmethod
+    def check(
+        stream: BinaryIO,
+        source: str,
+    ) -> None:
+        try:
+            _, event, _ = next(ijson.parse(stream))
+        except (ijson.JSONError, StopIteration) as error:
+            raise MalformedCsvFile(f"The json file {source} cannot be read") from error
+        if event != "start_array":
+            raise MalformedCsvFile(f"The json file {source} is not a list of features")
+
+    @staticmethod
+    def _tag_value(
+        tags: List[str],
+        name: str,
+    ) -> str | None:
+        return next((tag.split("=", 1)[1].strip() for tag in tags if tag.startswith(f"{name}=")), None)
+
+    @staticmethod
+    def _feature_rows(
+        feature: dict,
+        scenarios: List[dict],
+    ) -> Iterator[dict]:
+        epic = CucumberResult._tag_value(feature.get("tags", []), "epic")
+        for scenario in scenarios:
+            yield {
+                "epic_id": epic,
+                "feature_name": feature.get("name"),
+                "scenario_id": CucumberResult._tag_value(scenario.get("tags", []), "id"),
+                "status": _worse_status([scenario["status"]] if "status" in scenario else scenario.get("steps", [])),
+            }
+
+    @staticmethod
+    def rows(
+        stream: BinaryIO,
+    ) -> Iterator[dict]:
+        feature, scenario, scenarios = {}, {}, []
+        for prefix, event, value in ijson.parse(stream):
+            if event == "string" and prefix in CUCUMBER_FIELDS:
+                target, field = CUCUMBER_FIELDS[prefix]
+                element = feature if target == "feature" else scenario
+                if field in ("tags", "steps"):
+                    element.setdefault(field, []).append(value.lstrip("@"))
+                else:
+                    element[field] = value
+            elif event == "start_map" and prefix == "item":
+                feature, scenarios = {}, []
+            elif event == "start_map" and prefix == "item.elements.item":
+                scenario = {}
+            elif event == "end_map" and prefix == "item.elements.item" and scenario.get("type") != "background":
+                scenarios.append(scenario)
+            # The feature name and tags might follow its scenarios
+            elif event == "end_map" and prefix == "item":
+                yield from CucumberResult._feature_rows(feature, scenarios)
+
+
+# Result parser by report file extension
+REGISTERED_PARSER = {
+    ".csv": CsvResult,
+    ".xml": JunitResult,
+    ".json": CucumberResult,
+}
@@ -0,0 +1,234 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Partitioned test result computation.
+Run in worker processes: the module must not open database or redis connections at import."""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import psycopg
+from psycopg import Copy
+
+from app.database.utils.status_matrix import STATUS_CODES
+
+# Columns of the stored results: project and version references, status code
+SCENARIO_RESULT_COLUMNS = (
+    "run_date, project_id, version_id, campaign_id, epic_id, feature_id, scenario_id, status, is_partial"
+)
+FEATURE_RESULT_COLUMNS = "run_date, project_id, version_id, campaign_id, epic_id, feature_id, status, is_partial"
+EPIC_RESULT_COLUMNS = "run_date, project_id, version_id, campaign_id, epic_id, status, is_partial"
+
+# Rows buffered before a partition is computed and recorded, the chunks of a same element being merged afterwards
+PARTITION_CHUNK = 20_000
+# Chunks sent to the process pool and not recorded yet
+PARTITIONS_IN_FLIGHT = 8
+
+# Result row reduced to its repository keys: epic name, feature name, scenario id, status
+ResultKey = Tuple[str, str, str, str]
+# Repository ids and names of a scenario: epic id, feature id, scenario internal id, epic name, feature name
+ScenarioIds = Tuple[int, int, int, str, str]
+
+
+def compact_result(
+    result: tuple,
+    project_ref: int,
+    version_ref: int,
+) -> tuple:
+    """Scenario, feature or epic result row as stored: the project and version names being replaced by their ids
+    and the status, the one before last column, by its code"""
+    return (
+        result[0],
+        project_ref,
+        version_ref,
+        *result[3:-2],
+        STATUS_CODES.get(result[-2].strip().casefold(), STATUS_CODES["skipped"]),
+        result[-1],
+    )
+
+
+def partition_chunks(
+    rows: Iterable[dict],
+    by: str = "epic",
+    size: int = PARTITION_CHUNK,
+) -> Iterator[List[ResultKey]]:
+    """Group result rows by epic or by feature (epic and feature names) in their reading order and yield them by
+    chunks of size rows so that the whole run is never held: a partition comes in several chunks when the rows are
+    not ordered by it."""
+    partitions = defaultdict(list)
+    buffered = 0
+    for row in rows:
+        key = (
+            row.get("epic", row.get("epic_id", None)),
+            row.get("feature_name", row.get("feature_id", None)),
+            row["scenario_id"],
+            row["status"],
+        )
+        partitions[key[0] if by == "epic" else f"{key[0]}/{key[1]}"].append(key)
+        buffered += 1
+        if buffered >= size:
+            yield [key for partition in partitions.values() for key in partition]
+            partitions.clear()
+            buffered = 0
+    if buffered:
+        yield [key for partition in partitions.values() for key in partition]
+
+
+def _worse_status(
+    current_status: str | None,
+    new_status: str,
+) -> str:
+    if current_status is None or STATUS_CODES[new_status] > STATUS_CODES[current_status]:
+        return new_status
+    return current_status
+
+
+def compute_partition(
+    result_date: datetime,
+    project_name: str,
+    version: str,
+    campaign_id: int,
+    is_partial: bool,
+    rows: List[ResultKey],
+    scenario_ids: Dict[Tuple[str, str, str], ScenarioIds],
+) -> Tuple[List[tuple], List[tuple], List[tuple], dict]:
+    """
+    Resolve the partition rows to the repository ids, normalize their status and compute the feature and epic results
+    Args:
+        result_date: datetime, the results are observed
+        project_name: str
+        version: str
+        campaign_id: int, the campaign internal id
+        is_partial: bool, mark if the results are for specific tests (True) or whole test repository (False)
+        rows: the partition result rows
+        scenario_ids: ids and names of the partition scenarios by epic name, feature name and scenario id
+
+    Returns: scenario, feature and epic rows to COPY, names of the elements by category and internal id
+    """
+    scenarios, feature_status, epic_status = [], {}, {}
+    element_names = {"epics": {}, "features": {}, "scenarios": {}}
+    for epic_name, feature_name, scenario_id, status in rows:
+        if (ids := scenario_ids.get((epic_name, feature_name, scenario_id))) is None:
+            continue
+        epic_id, feature_id, scenario_internal_id, _epic_name, _feature_name = ids
+        status = status.strip().casefold()
+        # Unknown statuses are stored as skipped, see compact_result
+        status = status if status in STATUS_CODES else "skipped"
+        scenarios.append(
+            (
+                result_date,
+                project_name,
+                version,
+                campaign_id,
+                epic_id,
+                feature_id,
+                scenario_internal_id,
+                status,
+                is_partial,
+            ),
+        )
+        feature_status[(epic_id, feature_id)] = _worse_status(feature_status.get((epic_id, feature_id)), status)
+        epic_status[epic_id] = _worse_status(epic_status.get(epic_id), status)
+        element_names["epics"][epic_id] = _epic_name
+        element_names["features"][feature_id] = _feature_name
+        element_names["scenarios"][scenario_internal_id] = f"{_feature_name}--{scenario_id}"
+    features = [
+        (result_date, project_name, version, campaign_id, epic_id, feature_id, status, is_partial)
+        for (epic_id, feature_id), status in feature_status.items()
+    ]
+    epics = [
+        (result_date, project_name, version, campaign_id, epic_id, status, is_partial)
+        for epic_id, status in epic_status.items()
+    ]
+    return scenarios, features, epics, element_names
+
+
+def copy_partition(
+    copy: Copy,
+    scenarios: List[tuple],
+    project_ref: int,
+    version_ref: int,
+) -> None:
+    """COPY the scenario results of a computed partition, see compute_partition"""
+    for scenario in scenarios:
+        copy.write_row(compact_result(scenario, project_ref, version_ref))
+
+
+def partition_rollups(
+    scenarios: List[tuple],
+    features: List[tuple],
+    epics: List[tuple],
+    element_names: dict,
+) -> Tuple[List[tuple], List[tuple], List[tuple], dict]:
+    """What is kept of a computed partition once its scenario results are copied, see merge_partitions:
+    scenario id, status and name for the datasets, feature and epic rows to COPY, epic and feature names"""
+    return (
+        [(scenario[6], scenario[7], element_names["scenarios"][scenario[6]]) for scenario in scenarios],
+        features,
+        epics,
+        {"epics": element_names["epics"], "features": element_names["features"]},
+    )
+
+
+def record_partition(
+    dsn: str,
+    table: str,
+    project_ref: int,
+    version_ref: int,
+    result_date: datetime,
+    project_name: str,
+    version: str,
+    campaign_id: int,
+    is_partial: bool,
+    rows: List[ResultKey],
+    scenario_ids: Dict[Tuple[str, str, str], ScenarioIds],
+) -> Tuple[List[tuple], List[tuple], List[tuple], dict]:
+    """
+    Compute a partition, see compute_partition, and COPY its scenario results into table with an own connection
+    so that only the partition rollups go back to the calling process
+    Args:
+        dsn: str, the database connection string
+        table: str, the table receiving the scenario results
+        project_ref: int, the project id
+        version_ref: int, the version id
+
+    Returns: the partition rollups, see partition_rollups
+    """
+    computed = compute_partition(
+        result_date,
+        project_name,
+        version,
+        campaign_id,
+        is_partial,
+        rows,
+        scenario_ids,
+    )
+    if computed[0]:
+        with psycopg.connect(dsn) as connection:
+            with connection.cursor().copy(f"COPY {table} ({SCENARIO_RESULT_COLUMNS}) from stdin") as copy:
+                copy_partition(copy, computed[0], project_ref, version_ref)
+    return partition_rollups(*computed)
+
+
+def merge_partitions(
+    partitions: List[Tuple[List[tuple], List[tuple], List[tuple], dict]],
+) -> Tuple[List[tuple], List[tuple], dict]:
+    """Merge the feature and epic results of recorded partitions, an element split across partitions keeping its
+    worse status, and their element names"""
+    # Results by their columns but the status, which is the one before last
+    feature_status, epic_status = {}, {}
+    element_names = {"epics": {}, "features": {}}
+    for _, features, epics, names in partitions:
+        for *columns, status, is_partial in features:
+            key = (*columns, is_partial)
+            feature_status[key] = _worse_status(feature_status.get(key), status)
+        for *columns, status, is_partial in epics:
+            key = (*columns, is_partial)
+            epic_status[key] = _worse_status(epic_status.get(key), status)
+        for category, category_names in names.items():
+            element_names[category].update(category_names)
+    return (
+        [(*key[:-1], status, key[-1]) for key, status in feature_status.items()],
+        [(*key[:-1], status, key[-1]) for key, status in epic_status.items()],
+        element_names,
+    )
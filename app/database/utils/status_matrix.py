@@ -0,0 +1,146 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+from typing import Tuple
+
+import numpy as np
+
+# Status codes ordered by severity so that the worse status of several results is their max
+NO_STATUS = -1
+STATUS_CODES = {
+    "skipped": 0,
+    "passed": 1,
+    "failed": 2,
+}
+STATUS_LABELS = np.array(list(STATUS_CODES.keys()), dtype=object)
+STATUS_COLORS = ["gray", "green", "red"]
+
+
+class StatusMatrix:
+    """Dense elements x run dates matrix of int8 status codes.
+
+    Attributes
+        - run_dates: np.ndarray of datetime64, sorted
+        - element_ids: np.ndarray of int, sorted
+        - element_names: np.ndarray of str, aligned on element_ids
+        - statuses: np.ndarray of int8 (elements, run_dates), NO_STATUS when the element has no result
+    """
+
+    def __init__(
+        self: "StatusMatrix",
+        run_dates: np.ndarray,
+        element_ids: np.ndarray,
+        element_names: np.ndarray,
+        statuses: np.ndarray,
+    ) -> None:
+        self.run_dates = run_dates
+        self.element_ids = element_ids
+        self.element_names = element_names
+        self.statuses = statuses
+
+    @classmethod
+    def from_dataset(cls: "StatusMatrix", dataset: dict) -> "StatusMatrix":
+        """Build the matrix from a columnar map dataset.
+        Several results for the same element and run date are merged to the worse status."""
+        # Run dates repeat for every element: index the distinct ones before converting them
+        distinct_dates = {}
+        first_index = np.fromiter(
+            (distinct_dates.setdefault(run_date, len(distinct_dates)) for run_date in dataset["run_date"]),
+            dtype=np.int64,
+            count=len(dataset["run_date"]),
+        )
+        run_dates, date_rank = np.unique(
+            np.asarray(list(distinct_dates), dtype="datetime64[us]"),
+            return_inverse=True,
+        )
+        date_index = date_rank.reshape(-1)[first_index]
+        element_ids, element_index = np.unique(
+            np.asarray(dataset["element_id"], dtype=np.int64),
+            return_inverse=True,
+        )
+        element_names = np.empty(len(element_ids), dtype=object)
+        element_names[element_index] = dataset["element_name"]
+        codes = np.fromiter(
+            (STATUS_CODES.get(status, STATUS_CODES["skipped"]) for status in dataset["element_status"]),
+            dtype=np.int8,
+            count=len(dataset["element_status"]),
+        )
+        statuses = np.full((len(element_ids), len(run_dates)), NO_STATUS, dtype=np.int8)
+        np.maximum.at(statuses, (element_index, date_index), codes)
+        return cls(run_dates, element_ids, element_names, statuses)
+
+    def cells(self: "StatusMatrix") -> Tuple[np.ndarray, np.ndarray]:
+        """Row and column indexes of the cells having a status, ordered by run date then element"""
+        columns, rows = np.nonzero(self.statuses.T != NO_STATUS)
+        return rows, columns
+
+    def date_labels(self: "StatusMatrix") -> np.ndarray:
+        return np.datetime_as_string(self.run_dates, unit="s")
+
+    def bucket(self: "StatusMatrix", resolution: str) -> "StatusMatrix":
+        """Merge the run dates by day or week (starting on monday) to the worse status"""
+        days = self.run_dates.astype("datetime64[D]")
+        match resolution:
+            case "day":
+                buckets = days
+            case "week":
+                # 1970-01-01 is a thursday
+                buckets = days - (days.astype(np.int64) + 3) % 7
+            case _:
+                return self
+        bucket_dates, starts = np.unique(buckets, return_index=True)
+        if not len(bucket_dates):
+            return self
+        return StatusMatrix(
+            bucket_dates.astype("datetime64[us]"),
+            self.element_ids,
+            self.element_names,
+            np.maximum.reduceat(self.statuses, starts, axis=1),
+        )
+
+    def volatility(self: "StatusMatrix") -> np.ndarray:
+        """Number of status changes of each element between its consecutive results"""
+        present = self.statuses != NO_STATUS
+        columns = np.arange(self.statuses.shape[1])
+        # Index of the last result at or before each column
+        last_present = np.maximum.accumulate(np.where(present, columns, -1), axis=1)
+        previous = np.full_like(last_present, -1)
+        previous[:, 1:] = last_present[:, :-1]
+        rows = np.arange(self.statuses.shape[0])[:, None]
+        previous_status = np.where(previous >= 0, self.statuses[rows, np.maximum(previous, 0)], NO_STATUS)
+        changes = present & (previous_status != NO_STATUS) & (previous_status != self.statuses)
+        return changes.sum(axis=1)
+
+    def top(self: "StatusMatrix", count: int, collapsed_id: int) -> "StatusMatrix":
+        """Keep the count most volatile elements, the others being collapsed into a single element"""
+        volatility = self.volatility()
+        # Most volatile first, lowest id first on ties
+        ranked = np.lexsort((self.element_ids, -volatility))
+        kept = ranked[:count][volatility[ranked[:count]] > 0]
+        others = np.setdiff1d(ranked, kept)
+        kept = np.sort(kept)
+        if not len(others):
+            return StatusMatrix(
+                self.run_dates,
+                self.element_ids[kept],
+                self.element_names[kept],
+                self.statuses[kept],
+            )
+        names = np.empty(len(kept) + 1, dtype=object)
+        names[0] = f"{len(others)} other elements"
+        names[1:] = self.element_names[kept]
+        return StatusMatrix(
+            self.run_dates,
+            np.concatenate(([collapsed_id], self.element_ids[kept])),
+            names,
+            np.vstack((self.statuses[others].max(axis=0), self.statuses[kept])),
+        )
+
+    def to_dataset(self: "StatusMatrix") -> dict:
+        """Back to a columnar map dataset ordered by run date then element id"""
+        rows, columns = self.cells()
+        return {
+            "run_date": self.run_dates[columns].tolist(),
+            "element_id": self.element_ids[rows].tolist(),
+            "element_status": STATUS_LABELS[self.statuses[rows, columns]].tolist(),
+            "element_name": self.element_names[rows].tolist(),
+        }
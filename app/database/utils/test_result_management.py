@@ -1,46 +1,40 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+from contextlib import nullcontext
 from csv import DictReader
 from datetime import datetime
+from functools import partial
 from io import StringIO
-from typing import List, Tuple
+from pathlib import PurePath
+from typing import Awaitable, BinaryIO, Callable, ContextManager, Iterable, Iterator, List, Tuple, Type
+from zipfile import BadZipFile, ZipFile
 
 from app.app_exception import IncorrectFieldsRequest, MalformedCsvFile
 from app.database.postgre.pg_campaigns_management import create_campaign, retrieve_campaign_id
 from app.database.postgre.pg_test_results import check_result_uniqueness
 from app.database.postgre.testcampaign import db_get_campaign_scenarios
-from app.database.redis.rs_test_result import mg_insert_test_result
+from app.database.redis.rs_test_result import (
+    mg_insert_test_result,
+    mg_insert_test_result_done,
+    rs_forget_result_upload,
+)
+from app.database.utils.result_parsers import REGISTERED_PARSER, CsvResult, ResultParser, check_result_headers
 from app.schema.campaign_followup_schema import ComputeResultSchema
 from app.schema.error_code import ApplicationError
 from app.schema.postgres_enums import CampaignStatusEnum, ScenarioStatusEnum, TestResultStatusEnum
 from app.schema.respository.scenario_schema import ScenarioExecution
+from app.utils.log_management import log_error
 
 
-async def insert_result(
+async def __register_result(
     project_name: str,
     version: str,
     result_date: datetime,
     is_partial: bool,
-    csv_file_content: str,
     part_of_campaign_occurrence: str = None,
-) -> Tuple[str, int, DictReader]:
-    """Check csv result format for insertion."""
-    # SPEC: CSV file must contain the following field: project_id, epic_id, feature_name,
-    # scenario_id, status
-    buffer = StringIO(csv_file_content)
-    rows = DictReader(buffer)
-    expected_headers = (
-        "epic_id",
-        "feature_name",
-        "scenario_id",
-        "status",
-    )
-    oracle = [header not in rows.fieldnames for header in expected_headers]
-    if any(oracle):
-        raise MalformedCsvFile(
-            f"The csv file misses some headers\n Missing header is True\n "
-            f"{''.join([str(item) for item in zip(expected_headers, oracle)])}"
-        )
+) -> Tuple[str, int]:
+    """Retrieve (partial) or create (complete) the campaign of the results and register their processing
+    :return test_result_uuid, campaign_id"""
     # SPEC: Check that a test result does not exist for the project_name, version, result_date tuple
     # for complete run
     if not is_partial:
@@ -77,9 +71,145 @@ async def insert_result(
         is_partial,
     )
 
+    return test_result_uuid, campaign_id
+
+
+async def insert_result(
+    project_name: str,
+    version: str,
+    result_date: datetime,
+    is_partial: bool,
+    csv_file_content: str,
+    part_of_campaign_occurrence: str = None,
+) -> Tuple[str, int, DictReader]:
+    """Check csv result format for insertion."""
+    buffer = StringIO(csv_file_content)
+    rows = DictReader(buffer)
+    check_result_headers(rows.fieldnames)
+    test_result_uuid, campaign_id = await __register_result(
+        project_name,
+        version,
+        result_date,
+        is_partial,
+        part_of_campaign_occurrence,
+    )
     return test_result_uuid, campaign_id, rows
 
 
+def __open_member(
+    archive: ZipFile,
+    member: str,
+) -> ContextManager[BinaryIO]:
+    return archive.open(member)
+
+
+def __rewind(
+    stream: BinaryIO,
+) -> ContextManager[BinaryIO]:
+    # The uploaded file is read once per pass and closed with the request
+    stream.seek(0)
+    return nullcontext(stream)
+
+
+def __result_sources(
+    files: List[Tuple[str, BinaryIO]],
+) -> List[Tuple[str, Callable[[], ContextManager[BinaryIO]], Type[ResultParser]]]:
+    """Name, opener and parser of each result report, archives (zip) providing one source per report member.
+    Reports are read according to their extension, csv by default. The files are read from their streams, an
+    uploaded file being spooled to disk, so that no report is held in memory"""
+    sources = []
+    for filename, stream in files:
+        if filename.casefold().endswith(".zip"):
+            try:
+                archive = ZipFile(stream)
+            except BadZipFile as bzf:
+                raise MalformedCsvFile(f"The archive {filename} cannot be read") from bzf
+            sources.extend(
+                (
+                    f"{filename}/{member}",
+                    partial(__open_member, archive, member),
+                    REGISTERED_PARSER[PurePath(member).suffix.casefold()],
+                )
+                for member in archive.namelist()
+                if PurePath(member).suffix.casefold() in REGISTERED_PARSER
+            )
+        else:
+            sources.append(
+                (
+                    filename,
+                    partial(__rewind, stream),
+                    REGISTERED_PARSER.get(PurePath(filename).suffix.casefold(), CsvResult),
+                ),
+            )
+    if not sources:
+        raise MalformedCsvFile("No result file provided")
+    return sources
+
+
+def __merged_rows(
+    sources: List[Tuple[str, Callable[[], ContextManager[BinaryIO]], Type[ResultParser]]],
+) -> Iterator[dict]:
+    # Reports are decoded and parsed one at a time while the rows are consumed, the ingest rolling the results up
+    # by element whatever the order of the reports
+    for _, opener, parser in sources:
+        with opener() as stream:
+            yield from parser.rows(stream)
+
+
+async def insert_bulk_result(
+    project_name: str,
+    version: str,
+    result_date: datetime,
+    is_partial: bool,
+    files: List[Tuple[str, BinaryIO]],
+    part_of_campaign_occurrence: str = None,
+) -> Tuple[str, int, Iterator[dict]]:
+    """Check the results of a run split in several reports (csv, junit xml, cucumber json or zip archives of them)
+    for a single insertion. The files are given as filename and binary stream.
+    :return test_result_uuid, campaign_id, rows of all the reports"""
+    sources = __result_sources(files)
+    # Check every report before registering anything
+    for name, opener, parser in sources:
+        with opener() as stream:
+            parser.check(stream, name)
+    test_result_uuid, campaign_id = await __register_result(
+        project_name,
+        version,
+        result_date,
+        is_partial,
+        part_of_campaign_occurrence,
+    )
+    return test_result_uuid, campaign_id, __merged_rows(sources)
+
+
+async def ingest_upload(
+    ingest: Callable[..., Awaitable[None]],
+    content_hash: str,
+    result_date: datetime,
+    project_name: str,
+    version: str,
+    campaign_id: int,
+    is_partial: bool,
+    test_result_uuid: str,
+    rows: Iterable[dict],
+    *options: str,
+) -> None:
+    """
+    Record the results of an upload, see pg_test_results.insert_result, the upload being forgotten when its
+    recording fails so that it can be posted again
+    Args:
+        ingest: the recording function, insert_result or insert_result_partitioned
+        content_hash: str, sha-256 of the upload content and parameters
+        options: the ingest specific arguments, e.g. partition_by
+    """
+    try:
+        await ingest(result_date, project_name, version, campaign_id, is_partial, test_result_uuid, rows, *options)
+    except Exception as exception:
+        log_error(f"Import {test_result_uuid} failed: {exception!r}")
+        rs_forget_result_upload(project_name, version, content_hash)
+        mg_insert_test_result_done(test_result_uuid, message="Import failed, no result recorded")
+
+
 def __convert_scenario_status_to_three_state(
     scenarios: List[ScenarioExecution],
 ) -> None:
@@ -8,6 +8,7 @@ from app.database.postgre.pg_campaigns_management import retrieve_campaign_id
 from app.database.postgre.pg_tickets import get_ticket
 from app.database.postgre.pg_versions import version_exists
 from app.database.redis.rs_file_management import rs_invalidate_file
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.schema.error_code import ApplicationError
 from app.utils.pgdb import pool
 from app.utils.project_alias import provide
@@ -73,8 +74,9 @@ async def add_ticket_to_campaign(
                 ticket_reference,
             ),
         ).fetchone()
-        rs_invalidate_file(f"file:{project_name}:{version}:{occurrence}:*")
-        return result[0]
+        rs_invalidate_file(f"file:{provide(project_name)}:{version}:{occurrence}:*")
+    rs_bump_data_version(project_name, version)
+    return result[0]
 
 
 # flake8: noqa
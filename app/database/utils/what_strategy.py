@@ -2,423 +2,525 @@
 # -*- Author: E.Aivayan -*-
 import abc
 from abc import ABC
-from typing import List, Tuple
+from typing import Iterator, List, Tuple, Type
 
 from psycopg.rows import tuple_row
 
 from app.database.postgre.pg_campaigns_management import retrieve_campaign_id
-from app.utils.pgdb import pool
+from app.database.utils.status_matrix import STATUS_CODES
+from app.utils.pgdb import fetch_batches, pool
+from app.utils.project_alias import provide
+
+# Rows fetched per round trip when streaming
+STREAM_BATCH_SIZE = 5000
+# Status codes of the stacked passed, skipped and failed counts
+STACKED_STATUS_CODES = (
+    STATUS_CODES["passed"],
+    STATUS_CODES["skipped"],
+    STATUS_CODES["failed"],
+)
 
 
 class WhatStrategy(ABC):
+    category: str
+    rendering: str
+    # The rows of a new run can be appended to the cached dataset, else the dataset is dropped
+    incremental: bool = True
+
     @staticmethod
     @abc.abstractmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        """Provide the query and its parameters gathering the scope rows"""
         pass
 
-
-class EpicStaked(WhatStrategy):
     @staticmethod
+    async def campaign_scope(
+        project_name: str,
+        version: str = None,
+        campaign_occurrence: str = None,
+    ) -> int | None:
+        """Internal id of the campaign scope, None for project and version scopes"""
+        if campaign_occurrence is None:
+            return None
+        campaign = await retrieve_campaign_id(
+            project_name,
+            version,
+            campaign_occurrence,
+        )
+        return campaign.campaign_id
+
+    @classmethod
     async def gather(
+        cls: Type["WhatStrategy"],
         project_name: str,
         version: str = None,
         campaign_occurrence: str = None,
     ) -> List[Tuple]:
+        query, parameters = cls.query(
+            project_name,
+            version,
+            await cls.campaign_scope(project_name, version, campaign_occurrence),
+        )
         with pool.connection() as connection:
             connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(epic_id) filter (where status = %s) as passed, "
-                    "count(epic_id) filter (where status = %s) as skipped, "
-                    "count(epic_id) filter (where status = %s) as failed "
-                    "from test_epic_results "
-                    "where project_id = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                    ),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(epic_id) filter (where status = %s) as passed, "
-                    "count(epic_id) filter (where status = %s) as skipped, "
-                    "count(epic_id) filter (where status = %s) as failed "
-                    "from test_epic_results "
-                    "where project_id = %s "
-                    "and version = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+            result = connection.execute(query, parameters)
+            return list(result.fetchall())
+
+    @classmethod
+    async def stream(
+        cls: Type["WhatStrategy"],
+        project_name: str,
+        version: str = None,
+        campaign_occurrence: str = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Iterator[List[Tuple]]:
+        """Provide the scope rows by batches from a server side cursor.
+        The connection is held until the returned iterator is exhausted or closed."""
+        query, parameters = cls.query(
+            project_name,
+            version,
+            await cls.campaign_scope(project_name, version, campaign_occurrence),
+        )
+        return fetch_batches(query, parameters, batch_size)
+
+    @staticmethod
+    def include_run(
+        version: str = None,
+        campaign_occurrence: str = None,
+        is_partial: bool = False,
+    ) -> bool:
+        """Tell if a run belongs to the gathered scope.
+        Project and version scopes only count complete runs, campaign scope counts every run."""
+        return campaign_occurrence is not None or not is_partial
+
+
+class EpicStaked(WhatStrategy):
+    category = "epics"
+    rendering = "stacked"
+
+    @staticmethod
+    def query(
+        project_name: str,
+        version: str = None,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select er.run_date, "
+                "count(er.epic_id) filter (where er.status = %s) as passed, "
+                "count(er.epic_id) filter (where er.status = %s) as skipped, "
+                "count(er.epic_id) filter (where er.status = %s) as failed "
+                "from epic_results as er "
+                "join projects as pjt on pjt.id = er.project_id "
+                "where pjt.alias = %s "
+                "and er.is_partial = false "
+                "group by er.run_date "
+                "order by er.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
+                ),
+            )
+        elif campaign_id is None:
+            return (
+                "select er.run_date, "
+                "count(er.epic_id) filter (where er.status = %s) as passed, "
+                "count(er.epic_id) filter (where er.status = %s) as skipped, "
+                "count(er.epic_id) filter (where er.status = %s) as failed "
+                "from epic_results as er "
+                "join projects as pjt on pjt.id = er.project_id "
+                "join versions as ve on ve.id = er.version_id "
+                "where pjt.alias = %s "
+                "and ve.version = %s "
+                "and er.is_partial = false "
+                "group by er.run_date "
+                "order by er.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select run_date, "
-                    "count(epic_id) filter (where status = %s) as passed, "
-                    "count(epic_id) filter (where status = %s) as skipped, "
-                    "count(epic_id) filter (where status = %s) as failed "
-                    "from test_epic_results "
-                    "where campaign_id = %s "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        campaign_id,
-                    ),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select run_date, "
+                "count(epic_id) filter (where status = %s) as passed, "
+                "count(epic_id) filter (where status = %s) as skipped, "
+                "count(epic_id) filter (where status = %s) as failed "
+                "from epic_results "
+                "where campaign_id = %s "
+                "group by run_date "
+                "order by run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    campaign_id,
+                ),
+            )
 
 
 class EpicMap(WhatStrategy):
+    category = "epics"
+    rendering = "map"
+
     @staticmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
-        with pool.connection() as connection:
-            connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.epic_id, ter.status, ep.name "
-                    "from test_epic_results as ter "
-                    "join epics as ep on ep.id = ter.epic_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "order by ter.run_date, ter.epic_id;",
-                    (project_name,),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.epic_id, ter.status, ep.name "
-                    "from test_epic_results as ter "
-                    "join epics as ep on ep.id = ter.epic_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "and ter.version = %s "
-                    "order by ter.run_date, ter.epic_id;",
-                    (
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select ter.run_date, ter.epic_id, ter.status, ep.name "
+                "from test_epic_results as ter "
+                "join epics as ep on ep.id = ter.epic_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "order by ter.run_date, ter.epic_id;",
+                (provide(project_name),),
+            )
+        elif campaign_id is None:
+            return (
+                "select ter.run_date, ter.epic_id, ter.status, ep.name "
+                "from test_epic_results as ter "
+                "join epics as ep on ep.id = ter.epic_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "and ter.version = %s "
+                "order by ter.run_date, ter.epic_id;",
+                (
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select ter.run_date, ter.epic_id, ter.status, ep.name "
-                    "from test_epic_results as ter "
-                    "join epics as ep on ep.id = ter.epic_id "
-                    "where ter.campaign_id = %s "
-                    "order by ter.run_date, ter.epic_id;",
-                    (campaign_id,),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select ter.run_date, ter.epic_id, ter.status, ep.name "
+                "from test_epic_results as ter "
+                "join epics as ep on ep.id = ter.epic_id "
+                "where ter.campaign_id = %s "
+                "order by ter.run_date, ter.epic_id;",
+                (campaign_id,),
+            )
 
 
 class FeatureStaked(WhatStrategy):
+    category = "features"
+    rendering = "stacked"
+
     @staticmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
-        with pool.connection() as connection:
-            connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_feature_results "
-                    "where project_id = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                    ),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_feature_results "
-                    "where project_id = %s "
-                    "and version = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select fr.run_date, "
+                "count(fr.feature_id) filter (where fr.status = %s) as passed, "
+                "count(fr.feature_id) filter (where fr.status = %s) as skipped, "
+                "count(fr.feature_id) filter (where fr.status = %s) as failed "
+                "from feature_results as fr "
+                "join projects as pjt on pjt.id = fr.project_id "
+                "where pjt.alias = %s "
+                "and fr.is_partial = false "
+                "group by fr.run_date "
+                "order by fr.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
+                ),
+            )
+        elif campaign_id is None:
+            return (
+                "select fr.run_date, "
+                "count(fr.feature_id) filter (where fr.status = %s) as passed, "
+                "count(fr.feature_id) filter (where fr.status = %s) as skipped, "
+                "count(fr.feature_id) filter (where fr.status = %s) as failed "
+                "from feature_results as fr "
+                "join projects as pjt on pjt.id = fr.project_id "
+                "join versions as ve on ve.id = fr.version_id "
+                "where pjt.alias = %s "
+                "and ve.version = %s "
+                "and fr.is_partial = false "
+                "group by fr.run_date "
+                "order by fr.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select run_date, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(feature_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_feature_results "
-                    "where campaign_id = %s "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        campaign_id,
-                    ),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select run_date, "
+                "count(feature_id) filter (where status = %s) as passed, "
+                "count(feature_id) filter (where status = %s) as skipped, "
+                "count(feature_id) filter (where status = %s) as failed "
+                "from feature_results "
+                "where campaign_id = %s "
+                "group by run_date "
+                "order by run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    campaign_id,
+                ),
+            )
 
 
 class FeatureMap(WhatStrategy):
+    category = "features"
+    rendering = "map"
+
     @staticmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
-        with pool.connection() as connection:
-            connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.feature_id, ter.status, ep.name "
-                    "from test_feature_results as ter "
-                    "join features as ep on ep.id = ter.feature_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "order by ter.run_date, ter.feature_id;",
-                    (project_name,),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.feature_id, ter.status, ep.name "
-                    "from test_feature_results as ter "
-                    "join features as ep on ep.id = ter.feature_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "and ter.version = %s "
-                    "order by ter.run_date, ter.feature_id;",
-                    (
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select ter.run_date, ter.feature_id, ter.status, ep.name "
+                "from test_feature_results as ter "
+                "join features as ep on ep.id = ter.feature_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "order by ter.run_date, ter.feature_id;",
+                (provide(project_name),),
+            )
+        elif campaign_id is None:
+            return (
+                "select ter.run_date, ter.feature_id, ter.status, ep.name "
+                "from test_feature_results as ter "
+                "join features as ep on ep.id = ter.feature_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "and ter.version = %s "
+                "order by ter.run_date, ter.feature_id;",
+                (
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select ter.run_date, ter.feature_id, ter.status, ep.name "
-                    "from test_feature_results as ter "
-                    "join features as ep on ep.id = ter.feature_id "
-                    "where ter.campaign_id = %s "
-                    "order by ter.run_date, ter.feature_id;",
-                    (campaign_id,),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select ter.run_date, ter.feature_id, ter.status, ep.name "
+                "from test_feature_results as ter "
+                "join features as ep on ep.id = ter.feature_id "
+                "where ter.campaign_id = %s "
+                "order by ter.run_date, ter.feature_id;",
+                (campaign_id,),
+            )
 
 
 class ScenarioStaked(WhatStrategy):
+    category = "scenarios"
+    rendering = "stacked"
+
     @staticmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
-        with pool.connection() as connection:
-            connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_scenario_results "
-                    "where project_id = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                    ),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select run_date, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_scenario_results "
-                    "where project_id = %s "
-                    "and version = %s "
-                    "and is_partial = false "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select sr.run_date, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as passed, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as skipped, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as failed "
+                "from scenario_results as sr "
+                "join projects as pjt on pjt.id = sr.project_id "
+                "where pjt.alias = %s "
+                "and sr.is_partial = false "
+                "group by sr.run_date "
+                "order by sr.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
+                ),
+            )
+        elif campaign_id is None:
+            return (
+                "select sr.run_date, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as passed, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as skipped, "
+                "count(sr.scenario_id) filter (where sr.status = %s) as failed "
+                "from scenario_results as sr "
+                "join projects as pjt on pjt.id = sr.project_id "
+                "join versions as ve on ve.id = sr.version_id "
+                "where pjt.alias = %s "
+                "and ve.version = %s "
+                "and sr.is_partial = false "
+                "group by sr.run_date "
+                "order by sr.run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select run_date, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "passed, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "skipped, "
-                    "count(scenario_id) filter (where status = %s) as "
-                    "failed "
-                    "from test_scenario_results "
-                    "where campaign_id = %s "
-                    "group by run_date "
-                    "order by run_date;",
-                    (
-                        "passed",
-                        "skipped",
-                        "failed",
-                        campaign_id,
-                    ),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select run_date, "
+                "count(scenario_id) filter (where status = %s) as passed, "
+                "count(scenario_id) filter (where status = %s) as skipped, "
+                "count(scenario_id) filter (where status = %s) as failed "
+                "from scenario_results "
+                "where campaign_id = %s "
+                "group by run_date "
+                "order by run_date;",
+                (
+                    *STACKED_STATUS_CODES,
+                    campaign_id,
+                ),
+            )
 
 
 class ScenarioMap(WhatStrategy):
+    category = "scenarios"
+    rendering = "map"
+
     @staticmethod
-    async def gather(
+    def query(
         project_name: str,
         version: str = None,
-        campaign_occurrence: str = None,
-    ) -> List[Tuple]:
-        with pool.connection() as connection:
-            connection.row_factory = tuple_row
-            if version is None and campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.scenario_id, ter.status, "
-                    "concat (ft.name,'--', ep.scenario_id) "
-                    "from test_scenario_results as ter "
-                    "join scenarios as ep on ep.id = ter.scenario_id "
-                    "join features as ft on ft.id =  ep.feature_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "order by ter.run_date, ter.scenario_id;",
-                    (project_name,),
-                )
-            elif campaign_occurrence is None:
-                result = connection.execute(
-                    "select ter.run_date, ter.scenario_id, ter.status, "
-                    "concat (ft.name,'--', ep.scenario_id) "
-                    "from test_scenario_results as ter "
-                    "join scenarios as ep on ep.id = ter.scenario_id "
-                    "join features as ft on ft.id =  ep.feature_id "
-                    "where ter.project_id = %s "
-                    "and ter.is_partial = false "
-                    "and ter.version = %s "
-                    "order by ter.run_date, ter.scenario_id;",
-                    (
-                        project_name,
-                        version,
-                    ),
-                )
-            else:
-                campaign_id = await retrieve_campaign_id(
-                    project_name,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            return (
+                "select ter.run_date, ter.scenario_id, ter.status, "
+                "concat (ft.name,'--', ep.scenario_id) "
+                "from test_scenario_results as ter "
+                "join scenarios as ep on ep.id = ter.scenario_id "
+                "join features as ft on ft.id =  ep.feature_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "order by ter.run_date, ter.scenario_id;",
+                (provide(project_name),),
+            )
+        elif campaign_id is None:
+            return (
+                "select ter.run_date, ter.scenario_id, ter.status, "
+                "concat (ft.name,'--', ep.scenario_id) "
+                "from test_scenario_results as ter "
+                "join scenarios as ep on ep.id = ter.scenario_id "
+                "join features as ft on ft.id =  ep.feature_id "
+                "where ter.project_alias = %s "
+                "and ter.is_partial = false "
+                "and ter.version = %s "
+                "order by ter.run_date, ter.scenario_id;",
+                (
+                    provide(project_name),
                     version,
-                    campaign_occurrence,
-                )
-                campaign_id = campaign_id.campaign_id
-                result = connection.execute(
-                    "select ter.run_date, ter.scenario_id, ter.status,"
-                    " concat (ft.name,'--', ep.scenario_id)"
-                    " from test_scenario_results as ter"
-                    " join scenarios as ep on ep.id = ter.scenario_id"
-                    " join features as ft on ft.id =  ep.feature_id"
-                    " where ter.campaign_id = %s"
-                    " and ter.is_partial = %s"
-                    " order by ter.run_date, ter.scenario_id;",
-                    (
-                        campaign_id,
-                        True,
-                    ),
-                )
-        return list(result.fetchall())
+                ),
+            )
+        else:
+            return (
+                "select ter.run_date, ter.scenario_id, ter.status,"
+                " concat (ft.name,'--', ep.scenario_id)"
+                " from test_scenario_results as ter"
+                " join scenarios as ep on ep.id = ter.scenario_id"
+                " join features as ft on ft.id =  ep.feature_id"
+                " where ter.campaign_id = %s"
+                " and ter.is_partial = %s"
+                " order by ter.run_date, ter.scenario_id;",
+                (
+                    campaign_id,
+                    True,
+                ),
+            )
+
+    @staticmethod
+    def include_run(
+        version: str = None,
+        campaign_occurrence: str = None,
+        is_partial: bool = False,
+    ) -> bool:
+        """Campaign scope only maps the partial runs"""
+        if campaign_occurrence is not None:
+            return is_partial
+        return not is_partial
+
+
+# Executed runs (skipped ones being ignored) of each scenario in the scope.
+# A failure streak is the consecutive failed runs sharing the count of the previous not failed ones.
+FLAKY_QUERY = """with executions as (
+    select sr.scenario_id, sr.run_date, sr.status,
+    lag(sr.status) over scenario_runs as previous_status,
+    count(*) filter (where sr.status <> %s) over scenario_runs as streak_group
+    from scenario_results as sr
+    {scope}
+    and sr.status <> %s
+    window scenario_runs as (partition by sr.scenario_id order by sr.run_date)),
+streaks as (
+    select scenario_id, count(*) as length, max(run_date) as ended
+    from executions
+    where status = %s
+    group by scenario_id, streak_group),
+stats as (
+    select scenario_id, max(run_date) as last_run, count(*) as runs,
+    count(*) filter (where status <> previous_status) as flips,
+    max(run_date) filter (where status = %s) as last_failure
+    from executions
+    group by scenario_id)
+select st.last_run, st.scenario_id, concat(ft.name, '--', sc.scenario_id),
+st.runs, st.flips, coalesce(st.flips::float8 / nullif(st.runs - 1, 0), 0) as flip_rate, st.last_failure,
+max(sk.length), coalesce(max(sk.length) filter (where sk.ended = st.last_run), 0)
+from stats as st
+join streaks as sk on sk.scenario_id = st.scenario_id
+join scenarios as sc on sc.id = st.scenario_id
+join features as ft on ft.id = sc.feature_id
+group by st.last_run, st.scenario_id, ft.name, sc.scenario_id, st.runs, st.flips, st.last_failure
+order by flip_rate desc, st.flips desc, st.scenario_id;"""
+
+
+class ScenarioFlaky(WhatStrategy):
+    """Scenarios that failed at least once in the scope, the ones flipping the most between passed and failed first.
+    A row holds the scenario last run, its id and name, its executed runs, flips, flip rate (flips per consecutive
+    runs), last failure, longest and current failure streaks."""
+
+    category = "flaky"
+    rendering = "table"
+    incremental = False
+
+    @staticmethod
+    def query(
+        project_name: str,
+        version: str = None,
+        campaign_id: int = None,
+    ) -> Tuple[str, tuple]:
+        if version is None and campaign_id is None:
+            scope = "join projects as pjt on pjt.id = sr.project_id where pjt.alias = %s and sr.is_partial = false"
+            parameters = (provide(project_name),)
+        elif campaign_id is None:
+            scope = (
+                "join projects as pjt on pjt.id = sr.project_id "
+                "join versions as ve on ve.id = sr.version_id "
+                "where pjt.alias = %s "
+                "and ve.version = %s "
+                "and sr.is_partial = false"
+            )
+            parameters = (
+                provide(project_name),
+                version,
+            )
+        else:
+            scope = "where sr.campaign_id = %s"
+            parameters = (campaign_id,)
+        return (
+            FLAKY_QUERY.format(scope=scope),
+            (
+                STATUS_CODES["failed"],
+                *parameters,
+                STATUS_CODES["skipped"],
+                STATUS_CODES["failed"],
+                STATUS_CODES["failed"],
+            ),
+        )
 
 
 REGISTERED_STRATEGY = {
@@ -434,4 +536,7 @@ REGISTERED_STRATEGY = {
         "stacked": ScenarioStaked,
         "map": ScenarioMap,
     },
+    "flaky": {
+        "table": ScenarioFlaky,
+    },
 }
@@ -1,7 +1,7 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 
-from fastapi import APIRouter, Security
+from fastapi import APIRouter, Depends, Security
 from starlette.requests import Request
 from starlette.responses import HTMLResponse
 
@@ -12,6 +12,7 @@ from app.database.postgre.pg_projects import register_project
 from app.database.postgre.testrepository import db_project_epics, db_project_features
 from app.schema.project_schema import RegisterProject
 from app.schema.users import User, UserLight
+from app.utils.conditional_get import front_conditional_get
 from app.utils.log_management import log_error
 from app.utils.project_alias import provide
 
@@ -91,6 +92,7 @@ async def front_create_project(
     "/{project_name}",
     tags=["Front - Project"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def front_project_management(
     project_name: str,
@@ -4,7 +4,7 @@ import json
 from logging import getLogger
 from typing import Optional
 
-from fastapi import APIRouter, Security
+from fastapi import APIRouter, Depends, Security
 from pydantic import ValidationError
 from starlette.requests import Request
 from starlette.responses import HTMLResponse
@@ -21,6 +21,7 @@ from app.schema.error_code import ApplicationError
 from app.schema.mongo_enums import BugCriticalityEnum
 from app.schema.status_enum import BugStatusEnum
 from app.schema.users import User, UserLight
+from app.utils.conditional_get import front_conditional_get
 from app.utils.project_alias import provide
 
 router = APIRouter(prefix="/front/v1/projects")
@@ -40,6 +41,7 @@ def __validate_from_scenario(
     "/{project_name}/bugs",
     tags=["Front - Project"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def front_project_bugs(
     project_name: str,
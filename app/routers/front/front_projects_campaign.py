@@ -1,13 +1,18 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 
+import asyncio
 import datetime
 import json
+from html import escape
+from typing import AsyncIterator
+from urllib.parse import quote
 
-from fastapi import APIRouter, Form, Security
+from fastapi import APIRouter, Depends, Form, Security
+from redis.client import PubSub
 from starlette.background import BackgroundTasks
 from starlette.requests import Request
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, StreamingResponse
 
 from app.app_exception import front_access_denied, front_error_message
 from app.conf import templates
@@ -19,12 +24,12 @@ from app.database.postgre.pg_campaigns_management import (
     update_campaign_occurrence,
 )
 from app.database.postgre.pg_projects import registered_projects
-from app.database.postgre.pg_test_results import TestResults
 from app.database.postgre.pg_test_results import insert_result as pg_insert_result
 from app.database.postgre.pg_tickets_management import get_tickets_not_in_campaign
 from app.database.postgre.pg_versions import get_versions
 from app.database.postgre.testcampaign import (
     db_delete_campaign_ticket_scenario,
+    db_get_campaign_status_count,
     db_get_campaign_ticket_scenario,
     db_get_campaign_ticket_scenarios,
     db_get_campaign_ticket_scenarios_status_count,
@@ -34,11 +39,12 @@ from app.database.postgre.testcampaign import (
     get_campaign_content,
 )
 from app.database.postgre.testrepository import db_project_epics, db_project_features, db_project_scenarios
-from app.database.redis.rs_file_management import rs_invalidate_file, rs_record_file, rs_retrieve_file
-from app.database.utils.output_strategy import REGISTERED_OUTPUT
+from app.database.redis.rs_campaign_status import rs_subscribe_campaign_status
+from app.database.redis.rs_deliverable import rs_retrieve_deliverable_file
+from app.database.redis.rs_file_management import rs_invalidate_file
+from app.database.utils.render_cache import cached_render, warm_render_cache
 from app.database.utils.test_result_management import register_manual_campaign_result
 from app.database.utils.ticket_management import add_tickets_to_campaign
-from app.database.utils.what_strategy import REGISTERED_STRATEGY
 from app.schema.campaign_schema import CampaignPatch
 from app.schema.error_code import ApplicationError
 from app.schema.postgres_enums import CampaignStatusEnum, ScenarioStatusEnum
@@ -50,13 +56,19 @@ from app.schema.rest_enum import (
     RestTestResultRenderingEnum,
 )
 from app.schema.users import User, UserLight
+from app.utils.conditional_get import front_conditional_get
 from app.utils.log_management import log_error, log_message
 from app.utils.pages import page_numbering
 from app.utils.project_alias import provide
-from app.utils.report_generator import campaign_deliverable
+from app.utils.report_generator import deliverable_file, deliverable_key, deliverable_version
 
 router = APIRouter(prefix="/front/v1/projects")
 
+# Seconds between two reads of the campaign status channel
+CAMPAIGN_EVENTS_POLL = 0.5
+# Seconds without update before a comment keeps the event stream alive
+CAMPAIGN_EVENTS_KEEPALIVE = 15
+
 
 @router.get(
     "/{project_name}/campaigns",
@@ -235,6 +247,7 @@ async def front_scenarios_selector(
     "/{project_name}/campaigns/{version}/{occurrence}",
     tags=["Front - Campaign"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def front_get_campaign(
     project_name: str,
@@ -252,11 +265,17 @@ async def front_get_campaign(
                 version,
                 occurrence,
             )
+            status_count = await db_get_campaign_status_count(
+                project_name,
+                version,
+                occurrence,
+            )
             return templates.TemplateResponse(
                 "tables/campaign_board_table.html",
                 {
                     "request": request,
                     "campaign": campaign,
+                    "status_count": status_count if isinstance(status_count, dict) else {},
                     "project_name": project_name,
                     "version": version,
                     "occurrence": occurrence,
@@ -369,6 +388,62 @@ async def front_update_campaign(
         )  # Change swap
 
 
+def _sse_event(
+    event: str,
+    data: str,
+) -> str:
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
+
+
+async def _campaign_status_events(
+    subscription: PubSub,
+) -> AsyncIterator[str]:
+    """Turn the published campaign status updates into the board cell swaps: the scenario status cells and the
+    ticket status count cells, see tables/campaign_board_table.html and tables/ticket_scenarios.html"""
+    statistics_template = templates.get_template("formatting/ticket_scenarios_count.html")
+    idle = 0.0
+    try:
+        while True:
+            message = subscription.get_message(timeout=0)
+            if message is None:
+                await asyncio.sleep(CAMPAIGN_EVENTS_POLL)
+                idle += CAMPAIGN_EVENTS_POLL
+                if idle >= CAMPAIGN_EVENTS_KEEPALIVE:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+                continue
+            idle = 0.0
+            update = json.loads(message["data"])
+            for reference, scenario_internal_id, status in update["scenarios"]:
+                yield _sse_event(f"scenario-{quote(reference)}-{scenario_internal_id}", escape(status))
+            for reference, statistics in update["status_count"].items():
+                yield _sse_event(f"ticket-{quote(reference)}", statistics_template.render(statistics=statistics))
+    finally:
+        subscription.close()
+
+
+@router.get(
+    "/{project_name}/campaigns/{version}/{occurrence}/events",
+    tags=["Front - Campaign"],
+    include_in_schema=False,
+)
+async def front_campaign_events(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    user: User = Security(front_authorize, scopes=["admin", "user"]),
+) -> StreamingResponse:
+    """Server sent events of the campaign scenario status updates, the board swapping the changed cells only"""
+    if not isinstance(user, (User, UserLight)):
+        return user
+    return StreamingResponse(
+        _campaign_status_events(rs_subscribe_campaign_status(project_name, version, occurrence)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @router.get(
     "/{project_name}/campaigns/{version}/{occurrence}/tickets/{ticket_reference}",
     tags=["Front - Campaign"],
@@ -418,6 +493,7 @@ async def front_get_campaign_ticket_add_scenario(
     "/{project_name}/campaigns/{version}/{occurrence}/tickets/{ticket_reference}/scenarios",
     tags=["Front - Campaign"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def front_get_campaign_ticket(
     project_name: str,
@@ -714,6 +790,7 @@ async def front_campaign_add_tickets(
     "/{project_name}/campaigns/{version}/{occurrence}/results",
     tags=["Front - Campaign"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def front_campaign_occurrence_status(
     project_name: str,
@@ -725,21 +802,14 @@ async def front_campaign_occurrence_status(
     if not isinstance(user, (User, UserLight)):
         return user
     try:
-        result = rs_retrieve_file(f"file:{provide(project_name)}:{version}:{occurrence}:scenarios:map:text/html")
-        if result is None:
-            test_results = TestResults(
-                REGISTERED_STRATEGY[RestTestResultCategoryEnum.SCENARIOS][RestTestResultRenderingEnum.MAP],
-                REGISTERED_OUTPUT[RestTestResultRenderingEnum.MAP][RestTestResultHeaderEnum.HTML],
-            )
-            result = await test_results.render(
-                project_name,
-                version,
-                occurrence,
-            )
-            rs_record_file(
-                f"file:{provide(project_name)}:{version}:{occurrence}:scenarios:map:text/html",
-                result,
-            )
+        result = await cached_render(
+            project_name,
+            version,
+            occurrence,
+            RestTestResultCategoryEnum.SCENARIOS.value,
+            RestTestResultRenderingEnum.MAP.value,
+            RestTestResultHeaderEnum.HTML.value,
+        )
         return templates.TemplateResponse(
             "frame.html",
             {
@@ -789,6 +859,13 @@ async def front_campaign_occurrence_snapshot_status(
             rs_invalidate_file,
             f"file:{provide(project_name)}:{version}:{occurrence}:*",
         )
+        background_task.add_task(
+            warm_render_cache,
+            project_name,
+            version,
+            result.campaign_id,
+            True,
+        )
         return templates.TemplateResponse(
             "back_message.html",
             {
@@ -821,20 +898,21 @@ async def front_campaign_occurrence_deliverables(
     if not isinstance(user, (User, UserLight)):
         return user
     try:
-        if ticket_ref is not None:
-            key = f"file:{project_name}:{version}:{occurrence}:{ticket_ref}:{deliverable_type.value}"
-        else:
-            key = f"file:{project_name}:{version}:{occurrence}:{deliverable_type.value}"
-        filename = rs_retrieve_file(key)
+        key = deliverable_key(project_name, version, occurrence, deliverable_type, ticket_ref)
+        file_version = deliverable_version(project_name, version, deliverable_type)
+        filename = rs_retrieve_deliverable_file(key, file_version)
         if filename is None:
-            filename = await campaign_deliverable(
+            filename = await deliverable_file(
+                key,
+                file_version,
                 project_name,
                 version,
                 occurrence,
                 deliverable_type,
                 ticket_ref,
             )
-            rs_record_file(key, filename)
+        if isinstance(filename, ApplicationError):
+            raise Exception(filename.message)
 
         return templates.TemplateResponse(
             "download_link.html",
@@ -1,6 +1,6 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
-from fastapi import APIRouter, Form, Security
+from fastapi import APIRouter, Depends, Form, Security
 from psycopg.errors import CheckViolation, UniqueViolation
 from starlette.requests import Request
 from starlette.responses import HTMLResponse
@@ -18,6 +18,7 @@ from app.schema.project_schema import RegisterVersion, RegisterVersionResponse
 from app.schema.status_enum import StatusEnum, TicketType
 from app.schema.ticket_schema import ToBeTicket
 from app.schema.users import User, UserLight
+from app.utils.conditional_get import front_conditional_get
 from app.utils.log_management import log_error, log_message
 from app.utils.project_alias import provide
 
@@ -83,6 +84,7 @@ async def project_versions(
     "/{project_name}/versions/{version}",
     tags=["Front - Project"],
     include_in_schema=False,
+    dependencies=[Depends(front_conditional_get)],
 )
 async def project_version_tickets(
     project_name: str,
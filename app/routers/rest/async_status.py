@@ -4,9 +4,10 @@ import logging
 
 from fastapi import APIRouter, Security
 from starlette.exceptions import HTTPException
+from starlette.responses import StreamingResponse
 
 from app.database.authorization import authorize_user
-from app.database.redis.rs_test_result import test_result_status
+from app.database.redis.rs_test_result import test_result_events, test_result_status
 from app.schema.users import UpdateUser
 from app.utils.project_alias import provide
 
@@ -15,6 +16,16 @@ router = APIRouter(prefix="/api/v1/status")
 log = logging.getLogger(__name__)
 
 
+def _check_status_access(
+    status_key: str,
+    user: UpdateUser,
+) -> None:
+    projects = user.scopes.keys()
+    project, _ = status_key.split(":", 1)
+    if not (user.scopes.get("*") == "admin" or any(provide(proj) == project for proj in projects)):
+        raise HTTPException(403, "You cannot access this project.")
+
+
 @router.get("", description="Retrieve asynchronous status")
 async def async_status(status_key: str, user: UpdateUser = Security(authorize_user, scopes=["admin", "user"])) -> dict:
     """
@@ -27,9 +38,32 @@ async def async_status(status_key: str, user: UpdateUser = Security(authorize_us
     Returns: the content of the status
 
     """
-    projects = user.scopes.keys()
-    project, _ = status_key.split(":", 1)
-    if user.scopes.get("*") == "admin" or any(provide(proj) == project for proj in projects):
-        return test_result_status(status_key)
-    else:
-        raise HTTPException(403, "You cannot access this project.")
+    _check_status_access(status_key, user)
+    return test_result_status(status_key)
+
+
+@router.get(
+    "/events",
+    description="Stream asynchronous status updates as server-sent events",
+    response_class=StreamingResponse,
+)
+async def async_status_events(
+    status_key: str,
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+) -> StreamingResponse:
+    """
+    Push the asynchronous task status, then each of its progress updates until the task is done.
+    Validate the user is allowed and has access to the project.
+    Args:
+        status_key: a status key
+        user: the user
+
+    Returns: a text/event-stream response
+
+    """
+    _check_status_access(status_key, user)
+    return StreamingResponse(
+        test_result_events(status_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
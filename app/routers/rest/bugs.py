@@ -2,7 +2,7 @@
 # -*- Author: E.Aivayan -*-
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, HTTPException, Query, Security
+from fastapi import APIRouter, Depends, HTTPException, Query, Security
 from psycopg.errors import UniqueViolation
 from starlette.responses import Response
 
@@ -16,6 +16,7 @@ from app.schema.mongo_enums import BugCriticalityEnum
 from app.schema.project_schema import RegisterVersionResponse
 from app.schema.status_enum import BugStatusEnum
 from app.schema.users import UpdateUser
+from app.utils.conditional_get import conditional_get
 from app.utils.log_management import log_error
 
 router = APIRouter(prefix="/api/v1/projects")
@@ -30,6 +31,7 @@ router = APIRouter(prefix="/api/v1/projects")
         404: {"model": ErrorMessage, "description": "Project is not found"},
         500: {"model": ErrorMessage, "description": "Computation error"},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_bugs(
     project_name: str,
@@ -70,6 +72,7 @@ async def get_bugs(
         404: {"model": ErrorMessage, "description": "Project is not found"},
         500: {"model": ErrorMessage, "description": "Computation error"},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_bug(
     project_name: str,
@@ -2,33 +2,42 @@
 # -*- Author: E.Aivayan -*-
 import datetime
 import logging
-from typing import List
+from typing import Dict, List
 
-from fastapi import APIRouter, HTTPException, Response, Security
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, Security
 from starlette.background import BackgroundTasks
 from starlette.requests import Request
+from starlette.responses import StreamingResponse
 
 from app.database.authorization import authorize_user
 from app.database.postgre.pg_campaigns_management import create_campaign, retrieve_campaign
 from app.database.postgre.pg_campaigns_management import update_campaign_occurrence as pg_update_campaign_occurrence
 from app.database.postgre.pg_test_results import insert_result as pg_insert_result
 from app.database.postgre.testcampaign import (
+    CAMPAIGN_DIFF_COLUMNS,
+    db_get_campaign_diff,
+    db_get_campaign_status_count,
     db_get_campaign_ticket_scenario,
     db_get_campaign_ticket_scenarios,
     db_get_campaign_tickets,
     db_put_campaign_ticket_scenarios,
     db_set_campaign_ticket_scenario_status,
+    db_set_campaign_ticket_scenario_statuses,
+    db_stream_campaign_diff,
     get_campaign_content,
 )
 from app.database.postgre.testcampaign import fill_campaign as db_fill_campaign
-from app.database.redis.rs_file_management import rs_record_file, rs_retrieve_file
+from app.database.redis.rs_deliverable import rs_register_deliverable_job, rs_retrieve_deliverable_file
 from app.database.utils.object_existence import if_error_raise_http, project_version_raise
+from app.database.utils.output_strategy import REGISTERED_STREAM
+from app.database.utils.render_cache import warm_render_cache
 from app.database.utils.test_result_management import register_manual_campaign_result
 from app.schema.base_schema import CreateUpdateModel
-from app.schema.campaign.campaign_response_schema import CampaignFull, CampaignLight
+from app.schema.campaign.campaign_response_schema import CampaignDiff, CampaignFull, CampaignLight
 from app.schema.campaign_followup_schema import ComputeResultSchema
 from app.schema.campaign_schema import (
     CampaignPatch,
+    ScenarioStatusUpdate,
     TicketScenarioCampaign,
     ToBeCampaign,
 )
@@ -39,8 +48,17 @@ from app.schema.respository.feature_schema import Feature
 from app.schema.respository.scenario_schema import BaseScenario, ScenarioExecution
 from app.schema.rest_enum import DeliverableTypeEnum
 from app.schema.users import UpdateUser
+from app.utils.conditional_get import conditional_get
 from app.utils.log_management import log_error
-from app.utils.report_generator import campaign_deliverable
+from app.utils.report_generator import (
+    deliverable_file,
+    deliverable_key,
+    deliverable_version,
+    generate_deliverable,
+)
+
+# Scenario status updates accepted by call
+MAX_STATUS_UPDATES = 10_000
 
 router = APIRouter(prefix="/api/v1/projects")
 
@@ -150,6 +168,7 @@ async def fill_campaign(
         401: {"model": ErrorMessage, "description": "You are not authenticated"},
         500: {"model": ErrorMessage, "description": "Computation error"},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_campaigns(
     project_name: str,
@@ -255,6 +274,7 @@ async def update_campaign_occurrence(
         },
         500: {"model": ErrorMessage, "description": "The server could not compute the result."},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_campaign(
     project_name: str,
@@ -290,6 +310,7 @@ async def get_campaign(
         },
         500: {"model": ErrorMessage, "description": "Backend computation error"},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_campaign_tickets(
     project_name: str,
@@ -312,11 +333,117 @@ async def get_campaign_tickets(
     return if_error_raise_http(result)
 
 
+@router.get(
+    "/{project_name}/campaigns/{version}/{occurrence}/statistics",
+    tags=["Campaign"],
+    description="Count the campaign scenarios by ticket reference then by status."
+    " Tickets without scenario are left out",
+    response_model=Dict[str, Dict[str, int]],
+    responses={
+        404: {
+            "model": ErrorMessage,
+            "description": "Cannot find a campaign matching project, version or occurrence",
+        },
+        500: {"model": ErrorMessage, "description": "Backend computation error"},
+    },
+    dependencies=[Depends(conditional_get)],
+)
+async def get_campaign_status_count(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+) -> Dict[str, Dict[str, int]]:
+    await project_version_raise(
+        project_name,
+        version,
+    )
+    try:
+        result = await db_get_campaign_status_count(
+            project_name,
+            version,
+            occurrence,
+        )
+    except Exception as exp:
+        raise HTTPException(500, repr(exp)) from exp
+    return if_error_raise_http(result)
+
+
+@router.get(
+    "/{project_name}/campaigns/{version}/{occurrence}/diff/{other_occurrence}",
+    tags=["Campaign"],
+    description="""Compare the tickets and ticket scenarios of two campaign occurrences of a version.
+
+    Each row is a ticket (no scenario) or a ticket scenario with its status in both occurrences and its
+    change from `occurrence` to `other_occurrence`: added, removed, changed or unchanged.
+    Unchanged rows are left out unless `include_unchanged` is set.
+
+    **text/csv** and **application/x-ndjson** accept headers stream all the rows, `limit` and `skip` being ignored.
+    Otherwise a page of rows is provided, X-total-count header contains the total number of rows.""",
+    response_model=List[CampaignDiff],
+    responses={
+        404: {
+            "model": ErrorMessage,
+            "description": "Cannot find a campaign matching project, version or occurrences",
+        },
+        500: {"model": ErrorMessage, "description": "Backend computation error"},
+    },
+    dependencies=[Depends(conditional_get)],
+)
+async def get_campaign_diff(  # noqa:ANN201
+    project_name: str,
+    version: str,
+    occurrence: str,
+    other_occurrence: str,
+    response: Response,
+    include_unchanged: bool = False,
+    limit: int = Query(default=100, gt=0),
+    skip: int = Query(default=0, ge=0),
+    accept: str = Header(default="application/json"),
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+):
+    await project_version_raise(
+        project_name,
+        version,
+    )
+    try:
+        if accept in REGISTERED_STREAM:
+            batches = await db_stream_campaign_diff(
+                project_name,
+                version,
+                occurrence,
+                other_occurrence,
+                include_unchanged,
+            )
+            batches = if_error_raise_http(batches)
+            return StreamingResponse(
+                REGISTERED_STREAM[accept].encode(CAMPAIGN_DIFF_COLUMNS, batches),
+                media_type=accept,
+            )
+        result = await db_get_campaign_diff(
+            project_name,
+            version,
+            occurrence,
+            other_occurrence,
+            include_unchanged,
+            limit,
+            skip,
+        )
+    except HTTPException:
+        raise
+    except Exception as exp:
+        raise HTTPException(500, repr(exp)) from exp
+    diff, count = if_error_raise_http(result)
+    response.headers["X-total-count"] = str(count)
+    return diff
+
+
 @router.get(
     "/{project_name}/campaigns/{version}/{occurrence}/tickets/{ticket_ref}",
     tags=["Campaign"],
     description="Retrieve a campaign ticket",
     response_model=List[ScenarioExecution],
+    dependencies=[Depends(conditional_get)],
 )
 async def get_campaign_ticket(
     project_name: str,
@@ -384,6 +511,7 @@ async def put_campaign_ticket_scenarios(
         },
         500: {"model": ErrorMessage, "description": "Backend computation error"},
     },
+    dependencies=[Depends(conditional_get)],
 )
 async def get_campaign_ticket_scenario(
     project_name: str,
@@ -447,6 +575,44 @@ async def update_campaign_ticket_scenario_status(
     return if_error_raise_http(_status)
 
 
+@router.put(
+    "/{project_name}/campaigns/{version}/{occurrence}/scenarios/status",
+    tags=["Campaign"],
+    description="Update the status of many scenarios linked to the campaign tickets at once.\n"
+    f" At most {MAX_STATUS_UPDATES} updates by call, the ones matching no campaign ticket scenario being"
+    " reported in raw_data",
+    response_model=CreateUpdateModel,
+    responses={
+        404: {
+            "model": ErrorMessage,
+            "description": "Cannot find a campaign matching project, version or occurrence",
+        },
+        422: {"model": ErrorMessage, "description": "Payload does not match the expected schema"},
+        500: {"model": ErrorMessage, "description": "Backend computation error"},
+    },
+)
+async def update_campaign_ticket_scenario_statuses(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    updates: List[ScenarioStatusUpdate] = Body(max_length=MAX_STATUS_UPDATES),
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+) -> CreateUpdateModel:
+    try:
+        result = await db_set_campaign_ticket_scenario_statuses(
+            project_name,
+            version,
+            occurrence,
+            updates,
+        )
+    except Exception as exp:
+        raise HTTPException(
+            500,
+            repr(exp),
+        )
+    return if_error_raise_http(result)
+
+
 @router.post(
     "/{project_name}/campaigns/{version}/{occurrence}",
     description="Generate the result for this particular occurrence i.e. capture the current state",
@@ -483,6 +649,13 @@ async def create_campaign_occurrence_result(
                 result.result_uuid,
                 result.scenarios,
             )
+            background_task.add_task(
+                warm_render_cache,
+                project_name,
+                version,
+                result.campaign_id,
+                True,
+            )
             return result.result_uuid
     except Exception as exp:
         raise HTTPException(500, repr(exp))
@@ -493,36 +666,62 @@ async def create_campaign_occurrence_result(
 @router.get(
     "/{project_name}/campaigns/{version}/{occurrence}/deliverables",
     tags=["Campaign-Deliverables"],
+    description="""Provide the deliverable download url.
+
+    The deliverable is generated on a worker process, identical requests received meanwhile sharing the generation.
+    With `asynchronous` a status key is returned instead when the deliverable is not generated yet,
+    the `/api/v1/status` endpoints providing its filename once done.
+    The `evidence_pack` deliverable is a zip archive of the evidences of every ticket of the campaign.""",
 )
 async def retrieve_campaign_occurrence_deliverables(
     project_name: str,
     version: str,
     occurrence: str,
     request: Request,
+    background_task: BackgroundTasks,
     deliverable_type: DeliverableTypeEnum = DeliverableTypeEnum.TEST_PLAN,
     ticket_ref: str = None,
+    asynchronous: bool = False,
     user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
 ) -> str:
     try:
-        if ticket_ref is not None:
-            key = f"file:{project_name}:{version}:{occurrence}:{ticket_ref}:{deliverable_type.value}"
-        else:
-            key = f"file:{project_name}:{version}:{occurrence}:{deliverable_type.value}"
-        filename = rs_retrieve_file(key)
+        key = deliverable_key(project_name, version, occurrence, deliverable_type, ticket_ref)
+        file_version = deliverable_version(project_name, version, deliverable_type)
+        filename = rs_retrieve_deliverable_file(key, file_version)
+        if filename is None and asynchronous:
+            status_key, generate = rs_register_deliverable_job(
+                project_name,
+                version,
+                occurrence,
+                deliverable_type.value,
+                key,
+                file_version,
+            )
+            if generate:
+                background_task.add_task(
+                    generate_deliverable,
+                    status_key,
+                    key,
+                    file_version,
+                    project_name,
+                    version,
+                    occurrence,
+                    deliverable_type,
+                    ticket_ref,
+                )
+            return status_key
         if filename is None:
-            filename = await campaign_deliverable(
+            filename = await deliverable_file(
+                key,
+                file_version,
                 project_name,
                 version,
                 occurrence,
                 deliverable_type,
                 ticket_ref,
             )
-            if isinstance(filename, str):
-                rs_record_file(
-                    key,
-                    filename,
-                )
-                filename = f"{request.base_url}static/{filename}"
+        if isinstance(filename, str):
+            filename = f"{request.base_url}static/{filename}"
     except Exception as exp:
         raise HTTPException(500, repr(exp)) from exp
     return if_error_raise_http(filename)
@@ -21,6 +21,7 @@ from app.database.postgre.testrepository import (
     db_project_features,
     db_project_scenarios,
 )
+from app.database.redis.rs_data_version import rs_bump_data_version
 from app.database.utils.object_existence import if_error_raise_http
 from app.schema.error_code import ErrorMessage
 from app.schema.postgres_enums import RepositoryEnum
@@ -262,5 +263,6 @@ async def process_upload(
     await clean_scenario_with_fake_id(project_name.casefold())
     for scenario in scenarios:
         await add_scenario(TestScenario(**scenario))
+    rs_bump_data_version(project_name)
 
     return {"excluded_features": excluded_features, "excluded_scenarios": excluded_scenarios}
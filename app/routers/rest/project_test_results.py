@@ -1,36 +1,92 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
+import hashlib
 from datetime import datetime
+from typing import List
 
-from fastapi import APIRouter, File, Form, Header, HTTPException, Security, UploadFile
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Security, UploadFile
 from fastapi.encoders import jsonable_encoder
 from starlette.background import BackgroundTasks
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 from app.app_exception import DuplicateTestResults, IncorrectFieldsRequest, MalformedCsvFile, VersionNotFound
 from app.database.authorization import authorize_user
-from app.database.postgre.pg_test_results import TestResults
 from app.database.postgre.pg_test_results import insert_result as pg_insert_result
+from app.database.postgre.pg_test_results import insert_result_partitioned
 from app.database.postgre.pg_versions import version_exists
-from app.database.redis.rs_file_management import rs_invalidate_file, rs_record_file, rs_retrieve_file
-from app.database.utils.output_strategy import REGISTERED_OUTPUT
-from app.database.utils.test_result_management import insert_result
+from app.database.redis.rs_test_result import (
+    RESULT_UPLOAD_PENDING,
+    rs_forget_result_upload,
+    rs_record_result_upload,
+    rs_reserve_result_upload,
+)
+from app.database.utils.chart_dataset import DATASET_COLUMNS, downsample_dataset, gather_datasets
+from app.database.utils.output_strategy import REGISTERED_STREAM
+from app.database.utils.render_cache import cached_render, warm_render_cache
+from app.database.utils.test_result_management import ingest_upload, insert_bulk_result, insert_result
 from app.database.utils.what_strategy import REGISTERED_STRATEGY
 from app.schema.error_code import ErrorMessage
-from app.schema.rest_enum import RestTestResultCategoryEnum, RestTestResultHeaderEnum, RestTestResultRenderingEnum
+from app.schema.rest_enum import (
+    RestIngestPartitionEnum,
+    RestTestResultCategoryEnum,
+    RestTestResultHeaderEnum,
+    RestTestResultRenderingEnum,
+    RestTestResultResolutionEnum,
+)
 from app.schema.users import UpdateUser
-from app.utils.project_alias import provide
+from app.utils.conditional_get import conditional_get
 
 router = APIRouter(prefix="/api/v1/projects")
 
+# Bytes read at once from an uploaded result file
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Seconds between two reads of an upload reservation, and reads before giving up, while a concurrent identical
+# request registers the upload
+UPLOAD_POLL = 0.1
+UPLOAD_POLLS = 100
+
+
+async def _upload_hash(
+    files: List[UploadFile],
+    result_date: datetime,
+    is_partial: bool,
+    campaign_occurrence: str | None,
+) -> str:
+    """sha-256 identifying an upload: its files, read by chunks then rewound for their processing, and its run,
+    a same file posted for another run being another upload"""
+    digest = hashlib.sha256(f"{result_date.isoformat()}|{is_partial}|{campaign_occurrence}".encode())
+    for file in files:
+        digest.update(f"|{file.filename}|".encode())
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+        await file.seek(0)
+    return digest.hexdigest()
+
+
+async def _reserve_upload(
+    project_name: str,
+    version: str,
+    content_hash: str,
+) -> str | None:
+    """None if the upload is new and reserved by this request, else the status key of the same upload received
+    before, waiting for its registration by a concurrent request"""
+    for _ in range(UPLOAD_POLLS):
+        status_key = rs_reserve_result_upload(project_name, version, content_hash)
+        if status_key != RESULT_UPLOAD_PENDING:
+            return status_key
+        await asyncio.sleep(UPLOAD_POLL)
+    raise DuplicateTestResults("The same upload is being registered, please retry later")
+
 
 @router.post(
     "/{project_name}/testResults",
     status_code=200,
     description="Successful request, processing data."
     " It might be import error during the process.\n"
-    "'campaign_occurrence' is mandatory for partial results",
+    "'campaign_occurrence' is mandatory for partial results.\n"
+    "Posting again the same content for the same run returns the status key of the first upload.",
     responses={
         # 204: {"description": "Processing data"},
         400: {
@@ -54,23 +110,32 @@ async def rest_import_test_results(
     user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
 ) -> str:
     try:
-        if not version_exists(
+        if not await version_exists(
             project_name,
             version,
         ):
             raise VersionNotFound(f"Project '{project_name}' in version '{version}' not found")
-        contents = await file.read()
-        decoded = contents.decode()
-        res, campaign_id, rows = await insert_result(
-            project_name,
-            version,
-            result_date,
-            is_partial,
-            decoded,
-            part_of_campaign_occurrence=campaign_occurrence,
-        )
+        content_hash = await _upload_hash([file], result_date, is_partial, campaign_occurrence)
+        # A retried upload gets the status of the original one, its rows are not read again
+        if (status_key := await _reserve_upload(project_name, version, content_hash)) is not None:
+            return status_key
+        try:
+            res, campaign_id, rows = await insert_result(
+                project_name,
+                version,
+                result_date,
+                is_partial,
+                (await file.read()).decode(),
+                part_of_campaign_occurrence=campaign_occurrence,
+            )
+        except Exception:
+            rs_forget_result_upload(project_name, version, content_hash)
+            raise
+        rs_record_result_upload(project_name, version, content_hash, res)
         background_task.add_task(
+            ingest_upload,
             pg_insert_result,
+            content_hash,
             result_date,
             project_name,
             version,
@@ -79,11 +144,123 @@ async def rest_import_test_results(
             res,
             rows,
         )
-        # Invalidate current result files and remove them
-        if campaign_occurrence is None:
-            rs_invalidate_file(f"file:{provide(project_name)}:{version}:*")
+        background_task.add_task(
+            warm_render_cache,
+            project_name,
+            version,
+            campaign_id,
+            is_partial,
+        )
+        # Cached datasets and result files are refreshed once the results are recorded
+        return res
+    except IncorrectFieldsRequest as ifr:
+        raise HTTPException(400, detail="".join(ifr.args)) from ifr
+    except DuplicateTestResults as dtr:
+        raise HTTPException(400, detail=" ".join(dtr.args)) from dtr
+    except MalformedCsvFile as mcf:
+        raise HTTPException(400, detail=" ".join(mcf.args)) from mcf
+    except VersionNotFound as vnf:
+        raise HTTPException(404, detail=" ".join(vnf.args)) from vnf
+    except Exception as exp:
+        raise HTTPException(500, repr(exp))
+
+
+@router.post(
+    "/{project_name}/testResults/bulk",
+    status_code=200,
+    description="Successful request, processing data."
+    " It might be import error during the process.\n"
+    "Import a run split in several reports, or zip archives of reports, as a single result.\n"
+    "Reports are read according to their extension: csv (default), JUnit xml or Cucumber json.\n"
+    "JUnit testcases are mapped with their 'epic', 'feature' and 'scenario_id' properties (testsuite 'epic'"
+    " property, classname and name otherwise). Cucumber scenarios are mapped with the 'epic=' feature tag,"
+    " the feature name and the 'id=' scenario tag.\n"
+    "'partition_by' (epic or feature) splits very large runs to compute and record the parts in parallel,"
+    " the run being recorded at once when all parts are. Without it, the default, the run is recorded serially,"
+    " which is faster unless the server has idle cores for the parts.\n"
+    "'campaign_occurrence' is mandatory for partial results.\n"
+    "Posting again the same content for the same run returns the status key of the first upload.",
+    responses={
+        400: {
+            "model": ErrorMessage,
+            "description": "CSV file with no headers or bad headers.\n "
+            "Unreadable report or archive, no report.\n"
+            "Test results with same date for project/version.\n"
+            "Missing field.",
+        },
+        404: {"model": ErrorMessage, "description": "project/version not found"},
+    },
+    tags=["Test Results"],
+)
+async def rest_import_bulk_test_results(
+    project_name: str,
+    background_task: BackgroundTasks,
+    files: List[UploadFile] = File(),
+    version: str = Form(),
+    result_date: datetime = Form(),
+    is_partial: bool = Form(default=False),
+    campaign_occurrence: str = Form(default=None),
+    partition_by: RestIngestPartitionEnum = Form(default=None),
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+) -> str:
+    try:
+        if not await version_exists(
+            project_name,
+            version,
+        ):
+            raise VersionNotFound(f"Project '{project_name}' in version '{version}' not found")
+        content_hash = await _upload_hash(files, result_date, is_partial, campaign_occurrence)
+        # A retried upload gets the status of the original one, its rows are not read again
+        if (status_key := await _reserve_upload(project_name, version, content_hash)) is not None:
+            return status_key
+        try:
+            res, campaign_id, rows = await insert_bulk_result(
+                project_name,
+                version,
+                result_date,
+                is_partial,
+                [(file.filename or "", file.file) for file in files],
+                part_of_campaign_occurrence=campaign_occurrence,
+            )
+        except Exception:
+            rs_forget_result_upload(project_name, version, content_hash)
+            raise
+        rs_record_result_upload(project_name, version, content_hash, res)
+        # One status, one recording and one cache refresh for all the files
+        if partition_by is None:
+            background_task.add_task(
+                ingest_upload,
+                pg_insert_result,
+                content_hash,
+                result_date,
+                project_name,
+                version,
+                campaign_id,
+                is_partial,
+                res,
+                rows,
+            )
         else:
-            rs_invalidate_file(f"file:{provide(project_name)}:{version}:{campaign_occurrence}:*")
+            background_task.add_task(
+                ingest_upload,
+                insert_result_partitioned,
+                content_hash,
+                result_date,
+                project_name,
+                version,
+                campaign_id,
+                is_partial,
+                res,
+                rows,
+                partition_by.value,
+            )
+        background_task.add_task(
+            warm_render_cache,
+            project_name,
+            version,
+            campaign_id,
+            is_partial,
+        )
         return res
     except IncorrectFieldsRequest as ifr:
         raise HTTPException(400, detail="".join(ifr.args)) from ifr
@@ -107,8 +284,30 @@ async def rest_import_test_results(
             **Complete test repository results** are retrieved on the all other cases.
 
             Please note that partial results are not counted in the application results.
+
+            **Large results** can be downsampled: `resolution` merges the runs by day or week
+            (the worse status for maps, the last run for stacked) and `top` keeps only the most
+            volatile elements of a map, the others being collapsed into a single row.
+
+            **Exports** can be streamed: `stream` sends the CSV rows in the response instead of a
+            file url. `application/x-ndjson` is always streamed. Streamed exports are not downsampled.
+
+            **Columnar exports** `application/vnd.apache.parquet` and `application/vnd.apache.arrow.stream`
+            provide a file url, status and element names being dictionary encoded.
+
+            **Flaky scenarios** are provided by the `flaky` category with the `table` rendering: the scenarios
+            failed at least once, with their executed runs, flips between passed and failed, flip rate,
+            last failure, longest and current failure streaks. The most flipping come first, `top` keeps them only.
             """,
+    responses={
+        400: {
+            "model": ErrorMessage,
+            "description": "Rendering not available for the category, streaming not available for the accept header"
+            " or downsampling",
+        },
+    },
     tags=["Test Results"],
+    dependencies=[Depends(conditional_get)],
 )
 async def rest_export_results(  # noqa:ANN201
     project_name: str,
@@ -117,30 +316,90 @@ async def rest_export_results(  # noqa:ANN201
     request: Request,
     version: str = None,
     campaign_occurrence: str = None,
+    resolution: RestTestResultResolutionEnum = RestTestResultResolutionEnum.RUN,
+    top: int = Query(default=None, gt=0),
+    stream: bool = False,
     accept: RestTestResultHeaderEnum = Header(),
     user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
 ):
     try:
-        file_key = f"file:{provide(project_name)}:{version}:{campaign_occurrence}:{category}:{rendering}:{accept}"
-        if accept != "application/json":
-            filename = rs_retrieve_file(file_key)
-            if filename is not None:
-                return f"{request.base_url}static/{filename}"
-        test_results = TestResults(
-            REGISTERED_STRATEGY[category][rendering],
-            REGISTERED_OUTPUT[rendering][accept],
-        )
-        result = await test_results.render(
+        if rendering.value not in REGISTERED_STRATEGY[category.value]:
+            raise IncorrectFieldsRequest(f"'{category.value}' results have no '{rendering.value}' rendering")
+        if stream or accept == RestTestResultHeaderEnum.NDJSON:
+            if accept not in REGISTERED_STREAM:
+                raise IncorrectFieldsRequest(f"Streaming is not available for '{accept.value}'")
+            if resolution != RestTestResultResolutionEnum.RUN or top is not None:
+                raise IncorrectFieldsRequest("Streamed exports are not downsampled")
+            batches = await REGISTERED_STRATEGY[category][rendering].stream(
+                project_name,
+                version,
+                campaign_occurrence,
+            )
+            return StreamingResponse(
+                REGISTERED_STREAM[accept].encode(DATASET_COLUMNS[rendering], batches),
+                media_type=accept.value,
+            )
+        result = await cached_render(
             project_name,
             version,
             campaign_occurrence,
+            category.value,
+            rendering.value,
+            accept.value,
+            resolution.value,
+            top,
         )
-
         if isinstance(result, dict):
             return JSONResponse(content=jsonable_encoder(result))
-
-        rs_record_file(file_key, result)
         return f"{request.base_url}static/{result}"
+    except IncorrectFieldsRequest as ifr:
+        raise HTTPException(400, detail=" ".join(ifr.args)) from ifr
+    except VersionNotFound as vnf:
+        raise HTTPException(404, detail=" ".join(vnf.args)) from vnf
+    except Exception as exp:
+        raise HTTPException(500, repr(exp)) from exp
+
+
+@router.get(
+    "/{project_name}/testResults/combined",
+    description="""Provide several test result charts of a project in one call.
+
+            Each requested category and rendering is provided as the columnar dataset
+            its `application/json` rendering would return, grouped by category then rendering.
+            Renderings a category does not have are left out.
+            Scope and downsampling parameters are the same as for a single chart.
+            """,
+    tags=["Test Results"],
+    dependencies=[Depends(conditional_get)],
+)
+async def rest_export_combined_results(  # noqa:ANN201
+    project_name: str,
+    categories: List[RestTestResultCategoryEnum] = Query(default=list(RestTestResultCategoryEnum)),
+    renderings: List[RestTestResultRenderingEnum] = Query(default=[RestTestResultRenderingEnum.STACKED]),
+    version: str = None,
+    campaign_occurrence: str = None,
+    resolution: RestTestResultResolutionEnum = RestTestResultResolutionEnum.RUN,
+    top: int = Query(default=None, gt=0),
+    user: UpdateUser = Security(authorize_user, scopes=["admin", "user"]),
+):
+    try:
+        datasets = await gather_datasets(
+            [
+                REGISTERED_STRATEGY[category][rendering]
+                for category in categories
+                for rendering in renderings
+                if rendering in REGISTERED_STRATEGY[category]
+            ],
+            project_name,
+            version,
+            campaign_occurrence,
+        )
+        result = {}
+        for (category, rendering), dataset in datasets.items():
+            if resolution != RestTestResultResolutionEnum.RUN or top is not None:
+                dataset = downsample_dataset(rendering, dataset, resolution.value, top)
+            result.setdefault(category, {})[rendering] = dataset
+        return JSONResponse(content=jsonable_encoder(result))
     except VersionNotFound as vnf:
         raise HTTPException(404, detail=" ".join(vnf.args)) from vnf
     except Exception as exp:
@@ -2,7 +2,7 @@
 # -*- Author: E.Aivayan -*-
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Security
 from psycopg import IntegrityError
 
 from app.database.authorization import authorize_user
@@ -13,6 +13,7 @@ from app.schema.error_code import ErrorMessage
 from app.schema.project_schema import RegisterVersionResponse
 from app.schema.ticket_schema import EnrichedTicket, Ticket, ToBeTicket, UpdatedTicket
 from app.schema.users import UpdateUser
+from app.utils.conditional_get import conditional_get
 from app.utils.log_management import log_error
 
 router = APIRouter(prefix="/api/v1")
@@ -69,6 +70,7 @@ async def create_ticket(
     },
     tags=["Tickets"],
     description="Retrieve all tickets in a version",
+    dependencies=[Depends(conditional_get)],
 )
 async def router_get_tickets(
     project_name: str,
@@ -109,6 +111,7 @@ async def router_get_tickets(
     },
     tags=["Tickets"],
     description="Retrieve one ticket of a version",
+    dependencies=[Depends(conditional_get)],
 )
 async def get_one_ticket(
     project_name: str,
@@ -1,7 +1,7 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 
-from fastapi import APIRouter, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Security
 
 from app.database.authorization import authorize_user
 from app.database.postgre.pg_projects import create_project_version
@@ -12,6 +12,7 @@ from app.schema.error_code import ApplicationError, ErrorMessage
 from app.schema.project_schema import RegisterVersion, RegisterVersionResponse
 from app.schema.users import UpdateUser
 from app.schema.versions_schema import Version
+from app.utils.conditional_get import conditional_get
 
 router = APIRouter(prefix="/api/v1")
 
@@ -51,6 +52,7 @@ async def create_version(
     responses={404: {"model": ErrorMessage, "description": "Project name is not registered (ignore case)"}},
     tags=["Versions"],
     description="Retrieve a specific project's version details",
+    dependencies=[Depends(conditional_get)],
 )
 async def version_details(
     project_name: str,
@@ -5,6 +5,7 @@ from typing import Optional
 from app.schema.base_schema import ExtendedBaseModel
 from app.schema.campaign_schema import TicketScenario
 from app.schema.postgres_enums import CampaignStatusEnum
+from app.schema.rest_enum import CampaignDiffChangeEnum
 from app.schema.ticket_schema import Ticket
 
 
@@ -37,3 +38,27 @@ class CampaignFull(CampaignLight):
     """
 
     tickets: Optional[list[TicketScenario | Ticket]] = []
+
+
+class CampaignDiff(ExtendedBaseModel):
+    """
+    Ticket or ticket scenario compared between two campaign occurrences, a ticket row having no scenario
+    Attributes
+        - ticket_reference: str
+        - scenario_internal_id: Optional[int]
+        - scenario_id: Optional[str]
+        - feature_name: Optional[str]
+        - epic: Optional[str]
+        - status: Optional[str], the status in the first occurrence
+        - other_status: Optional[str], the status in the other occurrence
+        - change: CampaignDiffChangeEnum
+    """
+
+    ticket_reference: str
+    scenario_internal_id: Optional[int] = None
+    scenario_id: Optional[str] = None
+    feature_name: Optional[str] = None
+    epic: Optional[str] = None
+    status: Optional[str] = None
+    other_status: Optional[str] = None
+    change: CampaignDiffChangeEnum
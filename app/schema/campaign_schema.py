@@ -5,7 +5,7 @@ from typing import List, Optional, Union
 from pydantic import model_validator
 
 from app.schema.base_schema import ExtendedBaseModel
-from app.schema.postgres_enums import CampaignStatusEnum
+from app.schema.postgres_enums import CampaignStatusEnum, ScenarioStatusEnum
 from app.schema.respository.feature_schema import Feature
 from app.schema.respository.scenario_schema import BaseScenario, ScenarioExecution
 from app.schema.status_enum import TicketType
@@ -83,6 +83,19 @@ class TicketScenario(ExtendedBaseModel):
     scenarios: Optional[list[ScenarioExecution]] = []
 
 
+class ScenarioStatusUpdate(ExtendedBaseModel, extra="forbid"):
+    """
+    Attributes
+        - ticket_reference: str
+        - scenario_internal_id: int
+        - status: ScenarioStatusEnum
+    """
+
+    ticket_reference: str
+    scenario_internal_id: int
+    status: ScenarioStatusEnum
+
+
 class CampaignPatch(ExtendedBaseModel):
     """
     Attributes
@@ -1,8 +1,9 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
 from datetime import datetime
+from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RdTestResult(BaseModel):
@@ -10,6 +11,27 @@ class RdTestResult(BaseModel):
     version: str
     is_partial: bool
     status: str
-    created: datetime = datetime.now()
-    updated: datetime = datetime.now()
+    created: datetime = Field(default_factory=datetime.now)
+    updated: datetime = Field(default_factory=datetime.now)
     message: str = ""
+    # Ingest progress: rows read from the file, matched to a repository scenario, copied to the database
+    parsed: int = 0
+    resolved: int = 0
+    written: int = 0
+    unresolved: int = 0
+    # Rows parsed per second since the import started
+    throughput: float = 0.0
+
+
+class RdDeliverable(BaseModel):
+    version: str
+    occurrence: str
+    deliverable_type: str
+    status: str
+    created: datetime = Field(default_factory=datetime.now)
+    updated: datetime = Field(default_factory=datetime.now)
+    message: str = ""
+    # Generated file, served from the static directory, once done
+    filename: Optional[str] = None
+    # Application error code when the generation failed
+    error: Optional[int] = None
@@ -7,20 +7,44 @@ class RestTestResultHeaderEnum(str, Enum):
     JSON = "application/json"
     HTML = "text/html"
     CSV = "text/csv"
+    NDJSON = "application/x-ndjson"
+    PARQUET = "application/vnd.apache.parquet"
+    ARROW = "application/vnd.apache.arrow.stream"
 
 
 class RestTestResultCategoryEnum(str, Enum):
     EPICS = "epics"
     FEATURES = "features"
     SCENARIOS = "scenarios"
+    FLAKY = "flaky"
 
 
 class RestTestResultRenderingEnum(str, Enum):
     STACKED = "stacked"
     MAP = "map"
+    TABLE = "table"
+
+
+class RestTestResultResolutionEnum(str, Enum):
+    RUN = "run"
+    DAY = "day"
+    WEEK = "week"
+
+
+class RestIngestPartitionEnum(str, Enum):
+    EPIC = "epic"
+    FEATURE = "feature"
 
 
 class DeliverableTypeEnum(str, Enum):
     TEST_PLAN = "test_plan"
     TER = "TER"
     EVIDENCE = "evidence"
+    EVIDENCE_PACK = "evidence_pack"
+
+
+class CampaignDiffChangeEnum(str, Enum):
+    ADDED = "added"
+    REMOVED = "removed"
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
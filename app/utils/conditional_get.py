@@ -0,0 +1,84 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import hashlib
+from email.utils import format_datetime
+
+from fastapi import HTTPException, Security
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database.authorization import authorize_user, front_authorize
+from app.database.redis.rs_data_version import rs_retrieve_data_version
+from app.schema.users import User, UserLight
+from app.utils.project_alias import provide
+
+# Request headers changing the representation of a same url
+VARYING_HEADERS = ("accept", "hx-request", "hx-target", "eaid-request")
+
+
+def _check_data_version(
+    request: Request,
+    user: User | UserLight,
+) -> None:
+    """Raise 304 if the client representation is up to date with the project (or version) data.
+    Otherwise keep the validators for DataVersionMiddleware to send them with the response."""
+    project_name = request.path_params.get("project_name")
+    if project_name is None or provide(project_name) is None:
+        return
+    version = request.path_params.get("version", request.query_params.get("version"))
+    data_version, modified = rs_retrieve_data_version(project_name, version)
+    representation = "|".join(
+        [
+            user.username,
+            request.url.path,
+            request.url.query,
+            *(request.headers.get(header, "") for header in VARYING_HEADERS),
+        ],
+    )
+    etag = f'W/"{data_version}-{hashlib.blake2b(representation.encode(), digest_size=8).hexdigest()}"'
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        raise HTTPException(304, headers={"ETag": etag})
+    request.state.etag = etag
+    request.state.last_modified = modified
+
+
+async def conditional_get(
+    request: Request,
+    user: User = Security(authorize_user, scopes=["admin", "user"]),
+) -> None:
+    _check_data_version(request, user)
+
+
+async def front_conditional_get(
+    request: Request,
+    user: User = Security(front_authorize, scopes=["admin", "user"]),
+) -> None:
+    # Unauthorized users get an error message, it must not be validated
+    if isinstance(user, (User, UserLight)):
+        _check_data_version(request, user)
+
+
+class DataVersionMiddleware:
+    """Send the ETag and Last-Modified computed by conditional_get with the successful responses"""
+
+    def __init__(self: "DataVersionMiddleware", app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self: "DataVersionMiddleware", scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+
+        async def send_with_validators(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200 and "etag" in state:
+                headers = MutableHeaders(scope=message)
+                headers["ETag"] = state["etag"]
+                # Clients must revalidate before using their copy
+                headers["Cache-Control"] = "no-cache"
+                if state.get("last_modified") is not None:
+                    headers["Last-Modified"] = format_datetime(state["last_modified"], usegmt=True)
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
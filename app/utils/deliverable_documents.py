@@ -0,0 +1,374 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Docx deliverable documents.
+Run in worker processes: the module must not open database or redis connections at import,
+the campaign, ticket and bug models are then provided as their json dump."""
+
+import os
+import re
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.document import Document as WordDocument
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.table import Table
+
+from app.schema.postgres_enums import ScenarioStatusEnum, TestResultStatusEnum
+
+# Documents parsed by the process, the python-docx default one under None: template path to modification time
+# and document, copied for each deliverable
+_templates: Dict[str | None, Tuple[float, WordDocument]] = {}
+
+
+def new_document(template: str | None = None) -> WordDocument:
+    """Blank document or copy of a customer template, parsed once per process and again only once modified"""
+    modified = os.stat(template).st_mtime if template is not None else 0.0
+    cached = _templates.get(template)
+    if cached is None or cached[0] != modified:
+        cached = _templates[template] = (modified, Document(template))
+    return deepcopy(cached[1])
+
+
+def _style(
+    document: WordDocument,
+    name: str,
+) -> str | None:
+    """The style if the document, a customer template maybe, defines it, else the default style"""
+    return name if name in document.styles else None
+
+
+def _cell_xml(
+    text: str,
+    width: str | None,
+) -> str:
+    """Table cell as python-docx sets its text: line breaks and tabs as their elements"""
+    properties = f'<w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>' if width is not None else ""
+    if not text:
+        return f"<w:tc>{properties}<w:p/></w:tc>"
+    content = "<w:br/>".join(
+        "<w:tab/>".join(f'<w:t xml:space="preserve">{escape(part)}</w:t>' for part in line.split("\t"))
+        for line in re.split(r"\r\n|\r|\n", text)
+    )
+    return f"<w:tc>{properties}<w:p><w:r>{content}</w:r></w:p></w:tc>"
+
+
+def add_table_rows(
+    table: Table,
+    rows: Iterable[Sequence[str]],
+) -> None:
+    """
+    Append rows to a table from a single xml fragment, table.add_row building each row and cell element by element
+    Args:
+        table: Table
+        rows: the cell texts of each row, a row having at most as many cells as the table columns
+    """
+    widths = [grid_column.get(qn("w:w")) for grid_column in table._tbl.tblGrid.gridCol_lst]
+    fragment = "".join(
+        "<w:tr>"
+        + "".join(_cell_xml(text, width) for text, width in zip([*row, *[""] * (len(widths) - len(row))], widths))
+        + "</w:tr>"
+        for row in rows
+    )
+    table._tbl.extend(parse_xml(f"<w:tbl {nsdecls('w')}>{fragment}</w:tbl>"))
+
+
+def test_plan_document(
+    campaign: dict,
+    filename: Path,
+    template: str | None = None,
+) -> str:
+    document = new_document(template)
+    document.add_heading("Test Plan", 0)
+    document.add_paragraph(
+        f"Campaign for {campaign['project_name']} in version {campaign['version']}",
+        style=_style(document, "Subtitle"),
+    )
+    document.add_page_break()
+    document.add_heading("Test scope")
+    # Create table of tickets with a default column for acceptance criteria
+    table = document.add_table(rows=1, cols=3, style=_style(document, "Table Grid"))
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Reference"
+    hdr_cells[1].text = "Summary"
+    hdr_cells[2].text = "# Acceptance criteria"
+    add_table_rows(table, ((ticket["reference"], ticket["summary"]) for ticket in campaign["tickets"]))
+
+    document.add_heading("Test environment")
+    # Add test environment
+    document.add_paragraph("Here add data about test environment")
+
+    document.add_heading("Test scope impediments and non-testable items")
+    # Create table of ticket with two column for testability and reason
+    table = document.add_table(
+        rows=1,
+        cols=4,
+        style=_style(document, "Table Grid"),
+    )
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Reference"
+    hdr_cells[1].text = "Summary"
+    hdr_cells[2].text = "Testability"
+    hdr_cells[3].text = "Reason"
+    add_table_rows(table, ((ticket["reference"], ticket["summary"]) for ticket in campaign["tickets"]))
+
+    document.add_heading("Test scope estimation")
+    # Add table of ticket with one column for estimation
+    table = document.add_table(
+        rows=1,
+        cols=3,
+        style=_style(document, "Table Grid"),
+    )
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Reference"
+    hdr_cells[1].text = "Summary"
+    hdr_cells[2].text = "Estimation (md)"
+    add_table_rows(table, ((ticket["reference"], ticket["summary"]) for ticket in campaign["tickets"]))
+    # Add total estimation
+    document.add_paragraph("The total test execution estimation is <your estimation>md.")
+    # Add start and end forecast
+    document.add_paragraph(
+        "We plan a test execution start at <start date> "
+        "and with the current estimation expect an end forecast date "
+        "on <end date>."
+    )
+
+    document.add_heading("Campaign scenario")
+    # Create subsection for each tickets with table of scenario
+    for ticket in campaign["tickets"]:
+        document.add_heading(
+            f"Scenarios for {ticket['reference']}",
+            2,
+        )
+        table = document.add_table(
+            rows=1,
+            cols=5,
+            style=_style(document, "Table Grid"),
+        )
+        hdr_cells = table.rows[0].cells
+        hdr_cells[0].text = "Scenario id"
+        hdr_cells[1].text = "Scenario name"
+        hdr_cells[2].text = "Feature name"
+        hdr_cells[3].text = "Epic name"
+        hdr_cells[4].text = "Steps"
+        add_table_rows(
+            table,
+            (
+                (
+                    scenario["scenario_id"],
+                    scenario["name"],
+                    scenario["feature_name"],
+                    scenario["epic"],
+                    scenario["steps"],
+                )
+                for scenario in ticket["scenarios"]
+            ),
+        )
+
+    document.save(filename)
+
+    return filename.name
+
+
+def _compute_status(scenarios: list[dict] | None) -> TestResultStatusEnum:
+    # TODO: Check signature as it might break with "None" is not iterable
+    status = [scenario["status"] for scenario in scenarios]
+    if ScenarioStatusEnum.waiting_fix in status or ScenarioStatusEnum.waiting_answer in status:
+        return TestResultStatusEnum.failed
+    if (
+        all(ScenarioStatusEnum(stat) in [ScenarioStatusEnum.done, ScenarioStatusEnum.cancelled] for stat in status)
+        and status
+    ):
+        return TestResultStatusEnum.passed
+    return TestResultStatusEnum.skipped
+
+
+def test_exit_report_document(
+    campaign: dict,
+    bugs: List[dict],
+    filename: Path,
+    template: str | None = None,
+) -> str:
+    document = new_document(template)
+    document.add_heading("Test Exit Report", 0)
+    document.add_paragraph(
+        f"Campaign for {campaign['project_name']} in version {campaign['version']}",
+        style=_style(document, "Subtitle"),
+    )
+    document.add_page_break()
+    document.add_heading("Test campaign overview")
+    # Add go/no go sentence
+
+    document.add_heading("Test scope")
+    # Create table of ticket
+    table = document.add_table(
+        rows=1,
+        cols=2,
+        style=_style(document, "Table Grid"),
+    )
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Reference"
+    hdr_cells[1].text = "Summary"
+    add_table_rows(table, ((ticket["reference"], ticket["summary"]) for ticket in campaign["tickets"]))
+
+    document.add_heading("Test campaign indicators")
+    document.add_heading(
+        "Environment",
+        2,
+    )
+    # Add template for test environment
+    document.add_paragraph(
+        "Operating system: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "Browser (version): ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "Application environment: ",
+        style=_style(document, "List Bullet"),
+    )
+
+    document.add_heading(
+        "Schedule",
+        2,
+    )
+    # Add test campaign start/end dates or leave it blank
+    document.add_paragraph(
+        "Start date: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "End date: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "End reason: ",
+        style=_style(document, "List Bullet"),
+    )
+
+    document.add_heading(
+        "Impediment",
+        2,
+    )
+    # Add template for impediment section
+
+    document.add_heading(
+        "Test result summary",
+    )
+    # Create table of ticket with computed status based on scenarios status
+    table = document.add_table(
+        rows=1,
+        cols=4,
+        style=_style(document, "Table Grid"),
+    )
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Reference"
+    hdr_cells[1].text = "Summary"
+    hdr_cells[2].text = "Status"
+    hdr_cells[3].text = "Comment"
+    add_table_rows(
+        table,
+        (
+            (ticket["reference"], ticket["summary"], _compute_status(ticket["scenarios"]).value)
+            for ticket in campaign["tickets"]
+        ),
+    )
+
+    document.add_heading("Defect status")
+    # Create table of defect within the version
+    table = document.add_table(
+        rows=1,
+        cols=3,
+        style=_style(document, "Table Grid"),
+    )
+    hdr_cells = table.rows[0].cells
+    hdr_cells[0].text = "Title"
+    hdr_cells[1].text = "Criticality"
+    hdr_cells[2].text = "Status"
+    add_table_rows(table, ((bug["title"], bug["criticality"], bug["status"]) for bug in bugs))
+
+    document.save(filename)
+
+    return filename.name
+
+
+def _evidence(
+    ticket: dict,
+    template: str | None = None,
+) -> WordDocument:
+    document = new_document(template)
+    document.add_heading(
+        "Test Evidence",
+        0,
+    )
+
+    document.add_paragraph(
+        f"Ticket {ticket['reference']} test execution evidence",
+        style=_style(document, "Subtitle"),
+    )
+
+    document.add_page_break()
+    document.add_heading("Scenarios")
+    for scenario in ticket["scenarios"]:
+        document.add_heading(scenario["name"], 2)
+        document.add_paragraph(f"Scenario id is {scenario['scenario_id']}.")
+        document.add_paragraph(scenario["steps"])
+
+    document.add_heading("Test conditions")
+    document.add_paragraph(
+        "Operating system: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "Browser (version): ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "Application environment: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "Start date: ",
+        style=_style(document, "List Bullet"),
+    )
+    document.add_paragraph(
+        "End date: ",
+        style=_style(document, "List Bullet"),
+    )
+
+    document.add_heading("Prerequisites")
+
+    document.add_heading("Test evidence")
+    for scenario in ticket["scenarios"]:
+        document.add_heading(scenario["name"], 2)
+        document.add_paragraph(f"Scenario id is {scenario['scenario_id']}.")
+        document.add_paragraph(scenario["steps"])
+
+    document.add_heading("Test execution conclusion")
+
+    return document
+
+
+def evidence_document(
+    ticket: dict,
+    filename: Path,
+    template: str | None = None,
+) -> str:
+    _evidence(ticket, template).save(filename)
+    return filename.name
+
+
+def evidence_archive_entry(
+    ticket: dict,
+    template: str | None = None,
+) -> Tuple[str, bytes]:
+    """Evidence of a ticket rendered in memory: its name in the evidence pack and its content"""
+    content = BytesIO()
+    _evidence(ticket, template).save(content)
+    return f"evidence_{ticket['reference']}.docx", content.getvalue()
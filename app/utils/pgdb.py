@@ -1,8 +1,10 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
-from typing import Callable, ContextManager, Optional
+from typing import Callable, ContextManager, Iterator, List, Optional, Tuple
+from uuid import uuid4
 
 from psycopg import Connection
+from psycopg.rows import tuple_row
 from psycopg_pool import ConnectionPool
 
 from app.conf import config
@@ -23,3 +25,18 @@ def get_connection(row_factory: Optional[Callable[..., object]] = None) -> Conte
     if row_factory:
         conn.row_factory = row_factory
     return conn
+
+
+def fetch_batches(
+    query: str,
+    parameters: tuple | dict,
+    batch_size: int,
+) -> Iterator[List[Tuple]]:
+    """Provide the query rows by batches, the connection being held until the iterator is exhausted or closed"""
+    with pool.connection() as connection:
+        connection.row_factory = tuple_row
+        # Named cursor: rows stay on the server until fetched
+        with connection.cursor(name=f"stream_{uuid4().hex}") as cursor:
+            cursor.execute(query, parameters)
+            while rows := cursor.fetchmany(batch_size):
+                yield rows
@@ -0,0 +1,29 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app.conf import config
+
+process_pool = None
+
+
+def process_pool_executor() -> ProcessPoolExecutor:
+    """Pool of worker processes for CPU bound tasks.
+    Workers are spawned so that they do not inherit the database and redis connections."""
+    global process_pool
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(
+            max_workers=int(config.get("PROCESS_WORKERS", max((os.cpu_count() or 2) - 1, 1))),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the worker processes, if any were started, once their tasks are done"""
+    global process_pool
+    if process_pool is not None:
+        process_pool.shutdown()
+        process_pool = None
@@ -1,311 +1,125 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
+import os
 import uuid
+from pathlib import Path
+from zipfile import ZIP_STORED, ZipFile
 
-from docx import Document
-
-from app.conf import BASE_DIR
+from app.conf import BASE_DIR, config
 from app.database.postgre.pg_bugs import get_bugs
-from app.database.postgre.testcampaign import get_campaign_content
+from app.database.postgre.testcampaign import db_get_campaign_tickets_with_scenarios, get_campaign_content
+from app.database.redis.rs_data_version import rs_retrieve_deliverable_version
+from app.database.redis.rs_deliverable import (
+    rs_deliverable_done,
+    rs_deliverable_job_running,
+    rs_record_deliverable_file,
+    rs_register_deliverable_job,
+    rs_retrieve_deliverable,
+)
 from app.database.utils.combined_results import get_ticket_with_scenarios
 from app.schema.campaign.campaign_response_schema import CampaignFull
 from app.schema.campaign_schema import TicketScenario
 from app.schema.error_code import ApplicationError, ApplicationErrorCode
-from app.schema.postgres_enums import ScenarioStatusEnum, TestResultStatusEnum
-from app.schema.respository.scenario_schema import ScenarioExecution
 from app.schema.rest_enum import DeliverableTypeEnum
+from app.utils.deliverable_documents import (
+    evidence_archive_entry,
+    evidence_document,
+    test_exit_report_document,
+    test_plan_document,
+)
+from app.utils.process_pool import process_pool_executor
 from app.utils.project_alias import provide
 
+# Seconds between two reads of a joined deliverable generation status
+DELIVERABLE_POLL = 0.2
 
-async def test_plan_from_campaign(campaign: CampaignFull) -> str:
-    document = Document()
-    document.add_heading("Test Plan", 0)
-    document.add_paragraph(
-        f"Campaign for {campaign.project_name} in version {campaign.version}",
-        style="Subtitle",
-    )
-    document.add_page_break()
-    document.add_heading("Test scope")
-    # Create table of tickets with a default column for acceptance criteria
-    table = document.add_table(rows=1, cols=3, style="TableGrid")
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Reference"
-    hdr_cells[1].text = "Summary"
-    hdr_cells[2].text = "# Acceptance criteria"
-    for ticket in campaign.tickets:
-        row_cells = table.add_row().cells
-        row_cells[0].text = ticket.reference
-        row_cells[1].text = ticket.summary
 
-    document.add_heading("Test environment")
-    # Add test environment
-    document.add_paragraph("Here add data about test environment")
+def deliverable_template(deliverable_type: DeliverableTypeEnum) -> str | None:
+    """The customer docx template of a deliverable type: DELIVERABLE_TEMPLATES/<type>.docx, the evidence one being
+    used for the evidence pack too. None to build the deliverable from the python-docx default document."""
+    if (directory := config.get("DELIVERABLE_TEMPLATES")) is None:
+        return None
+    if deliverable_type == DeliverableTypeEnum.EVIDENCE_PACK:
+        deliverable_type = DeliverableTypeEnum.EVIDENCE
+    template = Path(directory) / f"{deliverable_type.value}.docx"
+    return str(template) if template.is_file() else None
 
-    document.add_heading("Test scope impediments and non-testable items")
-    # Create table of ticket with two column for testability and reason
-    table = document.add_table(
-        rows=1,
-        cols=4,
-        style="TableGrid",
-    )
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Reference"
-    hdr_cells[1].text = "Summary"
-    hdr_cells[2].text = "Testability"
-    hdr_cells[3].text = "Reason"
-    for ticket in campaign.tickets:
-        row_cells = table.add_row().cells
-        row_cells[0].text = ticket.reference
-        row_cells[1].text = ticket.summary
-
-    document.add_heading("Test scope estimation")
-    # Add table of ticket with one column for estimation
-    table = document.add_table(
-        rows=1,
-        cols=3,
-        style="TableGrid",
-    )
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Reference"
-    hdr_cells[1].text = "Summary"
-    hdr_cells[2].text = "Estimation (md)"
-    for ticket in campaign.tickets:
-        row_cells = table.add_row().cells
-        row_cells[0].text = ticket.reference
-        row_cells[1].text = ticket.summary
-    # Add total estimation
-    document.add_paragraph("The total test execution estimation is <your estimation>md.")
-    # Add start and end forecast
-    document.add_paragraph(
-        "We plan a test execution start at <start date> "
-        "and with the current estimation expect an end forecast date "
-        "on <end date>."
-    )
-
-    document.add_heading("Campaign scenario")
-    # Create subsection for each tickets with table of scenario
-    for ticket in campaign.tickets:
-        document.add_heading(
-            f"Scenarios for {ticket.reference}",
-            2,
-        )
-        table = document.add_table(
-            rows=1,
-            cols=5,
-            style="TableGrid",
-        )
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = "Scenario id"
-        hdr_cells[1].text = "Scenario name"
-        hdr_cells[2].text = "Feature name"
-        hdr_cells[3].text = "Epic name"
-        hdr_cells[4].text = "Steps"
-        for scenario in ticket.scenarios:
-            row_cells = table.add_row().cells
-            row_cells[0].text = scenario.scenario_id
-            row_cells[1].text = scenario.name
-            row_cells[2].text = scenario.feature_name
-            row_cells[3].text = scenario.epic
-            row_cells[4].text = scenario.steps
 
+async def test_plan_from_campaign(campaign: CampaignFull) -> str:
     filename = (
         BASE_DIR / "static" / f"Test_Plan_{provide(campaign.project_name)}_{campaign.version}_{uuid.uuid4()}.docx"
     )  # pragma:noqa
-
-    document.save(filename)
-
-    return filename.name
-
-
-def _compute_status(scenarios: list[ScenarioExecution] | None) -> TestResultStatusEnum:
-    # TODO: Check signature as it might break with "None" is not iterable
-    status = [scenario.status for scenario in scenarios]
-    if ScenarioStatusEnum.waiting_fix in status or ScenarioStatusEnum.waiting_answer in status:
-        return TestResultStatusEnum.failed
-    if (
-        all(ScenarioStatusEnum(stat) in [ScenarioStatusEnum.done, ScenarioStatusEnum.cancelled] for stat in status)
-        and status
-    ):
-        return TestResultStatusEnum.passed
-    return TestResultStatusEnum.skipped
-
-
-async def test_exit_report_from_campaign(campaign: CampaignFull) -> str:
-    document = Document()
-    document.add_heading("Test Exit Report", 0)
-    document.add_paragraph(
-        f"Campaign for {campaign.project_name} in version {campaign.version}",
-        style="Subtitle",
-    )
-    document.add_page_break()
-    document.add_heading("Test campaign overview")
-    # Add go/no go sentence
-
-    document.add_heading("Test scope")
-    # Create table of ticket
-    table = document.add_table(
-        rows=1,
-        cols=2,
-        style="TableGrid",
-    )
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Reference"
-    hdr_cells[1].text = "Summary"
-    for ticket in campaign.tickets:
-        row_cells = table.add_row().cells
-        row_cells[0].text = ticket.reference
-        row_cells[1].text = ticket.summary
-
-    document.add_heading("Test campaign indicators")
-    document.add_heading(
-        "Environment",
-        2,
-    )
-    # Add template for test environment
-    document.add_paragraph(
-        "Operating system: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "Browser (version): ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "Application environment: ",
-        style="List Bullet",
+    return await asyncio.get_running_loop().run_in_executor(
+        process_pool_executor(),
+        test_plan_document,
+        campaign.model_dump(mode="json"),
+        filename,
+        deliverable_template(DeliverableTypeEnum.TEST_PLAN),
     )
 
-    document.add_heading(
-        "Schedule",
-        2,
-    )
-    # Add test campaign start/end dates or leave it blank
-    document.add_paragraph(
-        "Start date: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "End date: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "End reason: ",
-        style="List Bullet",
-    )
-
-    document.add_heading(
-        "Impediment",
-        2,
-    )
-    # Add template for impediment section
 
-    document.add_heading(
-        "Test result summary",
-    )
-    # Create table of ticket with computed status based on scenarios status
-    table = document.add_table(
-        rows=1,
-        cols=4,
-        style="TableGrid",
-    )
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Reference"
-    hdr_cells[1].text = "Summary"
-    hdr_cells[2].text = "Status"
-    hdr_cells[3].text = "Comment"
-    for ticket in campaign.tickets:
-        row_cells = table.add_row().cells
-        row_cells[0].text = ticket.reference
-        row_cells[1].text = ticket.summary
-        row_cells[2].text = _compute_status(ticket.scenarios)
-
-    document.add_heading("Defect status")
-    # Create table of defect within the version
+async def test_exit_report_from_campaign(campaign: CampaignFull) -> str:
     bugs, _ = await get_bugs(
         project_name=campaign.project_name,
         version=campaign.version,
     )
-    table = document.add_table(
-        rows=1,
-        cols=3,
-        style="TableGrid",
-    )
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Title"
-    hdr_cells[1].text = "Criticality"
-    hdr_cells[2].text = "Status"
-    for bug in bugs:
-        row_cells = table.add_row().cells
-        row_cells[0].text = bug["title"]
-        row_cells[1].text = bug["criticality"]
-        row_cells[2].text = bug.status.value
-
     filename = (
         BASE_DIR
         / "static"
         / (f"TER_{provide(campaign.project_name)}_{campaign.version}_{campaign.occurrence}{uuid.uuid4()}.docx")
     )  # pragma:noqa
-
-    document.save(filename)
-
-    return filename.name
-
-
-async def evidence_from_ticket(ticket: TicketScenario) -> str:
-    document = Document()
-    document.add_heading(
-        "Test Evidence",
-        0,
+    return await asyncio.get_running_loop().run_in_executor(
+        process_pool_executor(),
+        test_exit_report_document,
+        campaign.model_dump(mode="json"),
+        [bug.model_dump(mode="json") for bug in bugs],
+        filename,
+        deliverable_template(DeliverableTypeEnum.TER),
     )
 
-    document.add_paragraph(
-        f"Ticket {ticket.reference} test execution evidence",
-        style="Subtitle",
-    )
-
-    document.add_page_break()
-    document.add_heading("Scenarios")
-    for scenario in ticket.scenarios:
-        document.add_heading(scenario.name, 2)
-        document.add_paragraph(f"Scenario id is {scenario.scenario_id}.")
-        document.add_paragraph(scenario.steps)
-
-    document.add_heading("Test conditions")
-    document.add_paragraph(
-        "Operating system: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "Browser (version): ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "Application environment: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "Start date: ",
-        style="List Bullet",
-    )
-    document.add_paragraph(
-        "End date: ",
-        style="List Bullet",
-    )
-
-    document.add_heading("Prerequisites")
-
-    document.add_heading("Test evidence")
-    for scenario in ticket.scenarios:
-        document.add_heading(scenario.name, 2)
-        document.add_paragraph(f"Scenario id is {scenario.scenario_id}.")
-        document.add_paragraph(scenario.steps)
-
-    document.add_heading("Test execution conclusion")
 
+async def evidence_from_ticket(ticket: TicketScenario) -> str:
     filename = BASE_DIR / "static" / f"evidence_{ticket.reference}-{uuid.uuid4()}.docx"
+    return await asyncio.get_running_loop().run_in_executor(
+        process_pool_executor(),
+        evidence_document,
+        ticket.model_dump(mode="json"),
+        filename,
+        deliverable_template(DeliverableTypeEnum.EVIDENCE),
+    )
 
-    document.save(filename)
 
+async def evidence_pack_from_campaign(
+    project_name: str,
+    version: str,
+    occurrence: str,
+) -> str | ApplicationError:
+    """
+    Zip the evidences of every ticket of a campaign, the tickets and their scenarios being loaded at once
+    and the evidences rendered in parallel on the process pool
+    Args:
+        project_name: str
+        version: str
+        occurrence: str
+
+    Returns: the archive filename or the campaign retrieval error
+    """
+    tickets = await db_get_campaign_tickets_with_scenarios(project_name, version, occurrence)
+    if isinstance(tickets, ApplicationError):
+        return tickets
+    filename = BASE_DIR / "static" / f"evidences_{provide(project_name)}_{version}_{occurrence}_{uuid.uuid4()}.zip"
+    loop = asyncio.get_running_loop()
+    template = deliverable_template(DeliverableTypeEnum.EVIDENCE_PACK)
+    evidences = [
+        loop.run_in_executor(process_pool_executor(), evidence_archive_entry, ticket.model_dump(mode="json"), template)
+        for ticket in tickets
+    ]
+    # Docx files are already compressed, evidences are written in the archive as soon as rendered
+    with ZipFile(filename, "w", ZIP_STORED) as archive:
+        for evidence in asyncio.as_completed(evidences):
+            name, content = await evidence
+            archive.writestr(name, content)
     return filename.name
 
 
@@ -316,8 +130,6 @@ async def campaign_deliverable(
     deliverable_type: DeliverableTypeEnum,
     ticket_ref: str = None,
 ) -> str | ApplicationError:
-    # TODO register file
-    # file:project_alias:version:occurrence:type
     match deliverable_type:
         case DeliverableTypeEnum.TEST_PLAN:
             campaign = await get_campaign_content(project_name, version, occurrence)
@@ -334,9 +146,150 @@ async def campaign_deliverable(
             if isinstance(ticket, ApplicationError):
                 return ticket
             filename = await evidence_from_ticket(ticket)
+        case DeliverableTypeEnum.EVIDENCE_PACK:
+            filename = await evidence_pack_from_campaign(project_name, version, occurrence)
         case _:
             return ApplicationError(
                 error=ApplicationErrorCode.value_error,
                 message="This value is not implemented yet.",
             )
     return filename
+
+
+def deliverable_key(
+    project_name: str,
+    version: str,
+    occurrence: str,
+    deliverable_type: DeliverableTypeEnum,
+    ticket_ref: str = None,
+) -> str:
+    # SPEC: deliverable:project_alias:version:occurrence(:ticket_reference):type
+    ticket = f":{ticket_ref}" if ticket_ref is not None else ""
+    return f"deliverable:{provide(project_name)}:{version}:{occurrence}{ticket}:{deliverable_type.value}"
+
+
+def deliverable_version(
+    project_name: str,
+    version: str,
+    deliverable_type: DeliverableTypeEnum,
+) -> str:
+    """Version of the deliverable inputs, only the test exit report showing the campaign scenario statuses.
+    A customer template is an input too, through its modification time."""
+    data_version = rs_retrieve_deliverable_version(
+        project_name,
+        version,
+        with_status=deliverable_type == DeliverableTypeEnum.TER,
+    )
+    if (template := deliverable_template(deliverable_type)) is not None:
+        return f"{data_version}.{os.stat(template).st_mtime_ns}"
+    return data_version
+
+
+async def generate_deliverable(
+    status_key: str,
+    file_key: str,
+    file_version: str,
+    project_name: str,
+    version: str,
+    occurrence: str,
+    deliverable_type: DeliverableTypeEnum,
+    ticket_ref: str = None,
+) -> str | ApplicationError:
+    """
+    Generate a registered deliverable, see rs_register_deliverable_job, then record its file and its status
+    Args:
+        status_key: str, project_alias:version:occurrence:uuid:deliverable key
+        file_key: str, the key the deliverable file is recorded under, see deliverable_key
+        file_version: str, the version of the deliverable inputs read before the generation, see deliverable_version
+
+    Returns: the generated filename or the generation error
+    """
+    try:
+        filename = await campaign_deliverable(project_name, version, occurrence, deliverable_type, ticket_ref)
+    except Exception as exception:
+        rs_deliverable_done(
+            status_key,
+            file_key,
+            file_version,
+            ApplicationError(error=ApplicationErrorCode.database_error, message=repr(exception)),
+        )
+        raise
+    if isinstance(filename, str):
+        rs_record_deliverable_file(file_key, file_version, filename)
+    rs_deliverable_done(status_key, file_key, file_version, filename)
+    return filename
+
+
+async def wait_deliverable(
+    status_key: str,
+    file_key: str,
+    file_version: str,
+) -> str | ApplicationError:
+    """
+    Wait for a deliverable generation run by another request, the event loop being released meanwhile.
+    The wait ends with an error once the generation has lost its job entry without being done, i.e. its worker died,
+    at most DELIVERABLE_JOB_TTL seconds after the generation started.
+    Args:
+        status_key: str, the key of the joined generation status
+        file_key: str, the key the deliverable file is recorded under
+        file_version: str, the version of the deliverable inputs
+
+    Returns: the filename or the generation error
+    """
+    while True:
+        running = rs_deliverable_job_running(status_key, file_key, file_version)
+        deliverable = rs_retrieve_deliverable(status_key)
+        if deliverable is not None and deliverable.status == "done":
+            if deliverable.error is not None:
+                return ApplicationError(error=ApplicationErrorCode(deliverable.error), message=deliverable.message)
+            return deliverable.filename
+        if deliverable is None or not running:
+            return ApplicationError(
+                error=ApplicationErrorCode.database_error,
+                message=f"The deliverable generation {status_key} is lost",
+            )
+        await asyncio.sleep(DELIVERABLE_POLL)
+
+
+async def deliverable_file(
+    file_key: str,
+    file_version: str,
+    project_name: str,
+    version: str,
+    occurrence: str,
+    deliverable_type: DeliverableTypeEnum,
+    ticket_ref: str = None,
+) -> str | ApplicationError:
+    """
+    Generate a deliverable on the process pool, concurrent identical requests sharing a single generation
+    Args:
+        file_key: str, the key the deliverable file is recorded under, see deliverable_key
+        file_version: str, the version of the deliverable inputs, see deliverable_version
+        project_name: str
+        version: str
+        occurrence: str
+        deliverable_type: DeliverableTypeEnum
+        ticket_ref: str, the ticket of an evidence
+
+    Returns: the filename or the generation error
+    """
+    status_key, generate = rs_register_deliverable_job(
+        project_name,
+        version,
+        occurrence,
+        deliverable_type.value,
+        file_key,
+        file_version,
+    )
+    if generate:
+        return await generate_deliverable(
+            status_key,
+            file_key,
+            file_version,
+            project_name,
+            version,
+            occurrence,
+            deliverable_type,
+            ticket_ref,
+        )
+    return await wait_deliverable(status_key, file_key, file_version)
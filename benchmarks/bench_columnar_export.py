@@ -0,0 +1,113 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Compare the CSV map export with the Parquet and Arrow exports: size, write and load time (best of 3).
+
+No database nor redis needed, only the application configuration (.env) for the imports.
+    python benchmarks/bench_columnar_export.py [elements] [runs]
+"""
+
+import csv
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterator, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database.utils.chart_dataset import DATASET_COLUMNS  # noqa: E402
+from app.database.utils.output_strategy import (  # noqa: E402
+    PARQUET_ROW_GROUP,
+    _arrow_schema,
+    _record_batch,
+    _row_groups,
+)
+
+STATUSES = ("passed", "failed", "skipped")
+BATCH_SIZE = 5000
+LOAD_REPEAT = 3
+
+
+def batches(elements: int, runs: int) -> Iterator[List[Tuple]]:
+    """Rows as the map query returns them, by cursor batches"""
+    random.seed(42)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for run in range(runs):
+        run_date = start + timedelta(hours=run * 7)
+        for element in range(elements):
+            batch.append((run_date, element, random.choice(STATUSES), f"feature {element % 50}--scenario {element}"))
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def write_csv(path: Path, rows: Iterator[List[Tuple]]) -> None:
+    with open(path, "w", newline="") as file:
+        _csv = csv.writer(file, quoting=csv.QUOTE_ALL)
+        _csv.writerow(DATASET_COLUMNS["map"])
+        for batch in rows:
+            _csv.writerows(batch)
+
+
+def read_csv(path: Path) -> None:
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row in reader:
+            datetime.fromisoformat(row[0]), int(row[1]), row[2], row[3]
+
+
+def write_parquet(path: Path, rows: Iterator[List[Tuple]]) -> None:
+    schema = _arrow_schema(DATASET_COLUMNS["map"])
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for table in _row_groups(schema, rows):
+            writer.write_table(table, row_group_size=PARQUET_ROW_GROUP)
+
+
+def read_parquet(path: Path) -> None:
+    pq.read_table(path)
+
+
+def write_arrow(path: Path, rows: Iterator[List[Tuple]]) -> None:
+    schema = _arrow_schema(DATASET_COLUMNS["map"])
+    with (
+        pa.OSFile(str(path), "wb") as sink,
+        pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer,
+    ):
+        for batch in rows:
+            writer.write_batch(_record_batch(schema, zip(*batch)))
+
+
+def read_arrow(path: Path) -> None:
+    with pa.OSFile(str(path), "rb") as source:
+        pa.ipc.open_stream(source).read_all()
+
+
+def measure(name: str, path: Path, write: Callable, read: Callable, elements: int, runs: int) -> None:
+    start = perf_counter()
+    write(path, batches(elements, runs))
+    written = perf_counter() - start
+    loaded = float("inf")
+    for _ in range(LOAD_REPEAT):
+        start = perf_counter()
+        read(path)
+        loaded = min(loaded, perf_counter() - start)
+    print(f"{name:<8} {path.stat().st_size / 1024 / 1024:8.1f} MiB  write {written:7.2f} s  load {loaded:7.3f} s")
+
+
+if __name__ == "__main__":
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{elements} elements x {runs} runs = {elements * runs} rows")
+    with tempfile.TemporaryDirectory() as directory:
+        measure("csv", Path(directory, "map.csv"), write_csv, read_csv, elements, runs)
+        measure("parquet", Path(directory, "map.parquet"), write_parquet, read_parquet, elements, runs)
+        measure("arrow", Path(directory, "map.arrows"), write_arrow, read_arrow, elements, runs)
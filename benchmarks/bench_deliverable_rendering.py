@@ -0,0 +1,104 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Compare the docx table filling and template loading of a large test plan.
+
+The scenario rows are added to a table row by row with python-docx and from a single xml fragment. A customer
+template is loaded by parsing it for each deliverable and by copying the document cached by the process. The whole
+test plan is rendered last, with the bulk rows and the cached template.
+
+    python benchmarks/bench_deliverable_rendering.py [scenarios] [tickets] [repeat]
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docx import Document  # noqa: E402
+
+from app.utils.deliverable_documents import add_table_rows, new_document, test_plan_document  # noqa: E402
+
+HEADER = ("Scenario id", "Scenario name", "Feature name", "Epic name", "Steps")
+
+
+def build_campaign(scenarios: int, tickets: int) -> dict:
+    return {
+        "project_name": "bench",
+        "version": "1.0.0",
+        "tickets": [
+            {
+                "reference": f"ticket-{ticket}",
+                "summary": f"Ticket {ticket} summary",
+                "scenarios": [
+                    {
+                        "scenario_id": f"sc-{index}",
+                        "name": f"Scenario {index}",
+                        "feature_name": f"feature {index % 200}",
+                        "epic": f"epic {index % 20}",
+                        "steps": "Given a <precondition>\nWhen the user acts & waits\nThen the result shows",
+                    }
+                    for index in range(ticket, scenarios, tickets)
+                ],
+            }
+            for ticket in range(tickets)
+        ],
+    }
+
+
+def scenario_rows(campaign: dict) -> list:
+    return [
+        (scenario["scenario_id"], scenario["name"], scenario["feature_name"], scenario["epic"], scenario["steps"])
+        for ticket in campaign["tickets"]
+        for scenario in ticket["scenarios"]
+    ]
+
+
+def fill_row_by_row(rows: list) -> None:
+    table = Document().add_table(rows=1, cols=len(HEADER))
+    for row in rows:
+        for cell, text in zip(table.add_row().cells, row):
+            cell.text = text
+
+
+def fill_bulk(rows: list) -> None:
+    add_table_rows(Document().add_table(rows=1, cols=len(HEADER)), rows)
+
+
+def measure(name: str, function: Callable, repeat: int) -> None:
+    start = perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = (perf_counter() - start) / repeat
+    print(f"{name:<32} {elapsed * 1000:10.1f} ms")
+
+
+def main() -> None:
+    scenarios = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    tickets = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    campaign = build_campaign(scenarios, tickets)
+    rows = scenario_rows(campaign)
+    print(f"test plan of {scenarios} scenarios in {tickets} tickets, {repeat} runs")
+    measure("scenario rows row by row", lambda: fill_row_by_row(rows), repeat)
+    measure("scenario rows bulk xml", lambda: fill_bulk(rows), repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        template = str(Path(directory) / "test_plan.docx")
+        document = Document()
+        for index in range(200):
+            document.add_paragraph(f"Customer boilerplate paragraph {index}", style="List Bullet")
+        document.save(template)
+        measure("template parsed", lambda: Document(template), repeat * 10)
+        new_document(template)
+        measure("template cached", lambda: new_document(template), repeat * 10)
+        measure(
+            "test plan",
+            lambda: test_plan_document(campaign, Path(directory) / "plan.docx", template),
+            repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Compare the serial and the partitioned ingest throughput of a large run.
+
+The partition computation (id mapping, status normalization, feature and epic rollups) is measured in a single
+process and in a process pool. Given a postgres dsn, the COPY of the scenario results into an unlogged scratch table
+is measured too: serially with one connection, and by the workers with their own connections.
+The process pool pays the transfer of the chunks to the workers: it only wins with as many idle cores as workers,
+which is why the serial ingest stays the default and partition_by is opt-in.
+
+    python benchmarks/bench_partitioned_ingest.py [scenarios] [epics] [workers] [dsn]
+"""
+
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import psycopg  # noqa: E402
+
+from app.database.utils.result_partition import (  # noqa: E402
+    compute_partition,
+    merge_partitions,
+    partition_chunks,
+    record_partition,
+)
+
+STATUSES = ("passed", "failed", "skipped")
+RUN = (datetime(2024, 1, 1), "bench", "1.0.0", 1, False)
+
+
+def build_run(scenarios: int, epics: int) -> tuple:
+    random.seed(42)
+    rows, scenario_ids = [], {}
+    for index in range(scenarios):
+        epic, feature = f"epic {index % epics}", f"feature {index % (epics * 20)}"
+        scenario_id = f"sc-{index}"
+        rows.append(
+            {"epic_id": epic, "feature_name": feature, "scenario_id": scenario_id, "status": random.choice(STATUSES)}
+        )
+        scenario_ids[(epic, feature, scenario_id)] = (index % epics, index % (epics * 20), index, epic, feature)
+    return rows, scenario_ids
+
+
+def compute_rollups(*arguments: object) -> tuple:
+    """compute_partition sending back only what record_partition does, its scenario results being copied"""
+    scenarios, features, epics, element_names = compute_partition(*arguments)
+    return (
+        [(scenario[6], scenario[7], element_names["scenarios"][scenario[6]]) for scenario in scenarios],
+        features,
+        epics,
+    )
+
+
+def ingest(
+    partitions: List[list],
+    scenario_ids: dict,
+    executor: ProcessPoolExecutor | None,
+    dsn: str | None,
+) -> None:
+    """Compute (and copy given a dsn) all the partitions in this process or in the pool"""
+    function = compute_rollups if dsn is None else partial(record_partition, dsn, "bench_ingest", 1, 1)
+    arguments = [
+        (*RUN, partition, {result[:3]: scenario_ids[result[:3]] for result in partition}) for partition in partitions
+    ]
+    if executor is None:
+        recorded = [function(*argument) for argument in arguments]
+    else:
+        recorded = list(executor.map(function, *zip(*arguments)))
+    if dsn is not None:
+        merge_partitions(recorded)
+
+
+def measure(name: str, function: Callable, rows: int, dsn: str | None) -> None:
+    if dsn is not None:
+        with psycopg.connect(dsn, autocommit=True) as connection:
+            connection.execute("drop table if exists bench_ingest;")
+            connection.execute(
+                "create unlogged table bench_ingest (run_date timestamp, project_id int, version_id int,"
+                " campaign_id int, epic_id int, feature_id int, scenario_id int, status smallint, is_partial bool);"
+            )
+    start = perf_counter()
+    function()
+    elapsed = perf_counter() - start
+    print(f"{name:<28} {elapsed:8.3f} s {rows / elapsed:12.0f} rows/s")
+    if dsn is not None:
+        with psycopg.connect(dsn, autocommit=True) as connection:
+            connection.execute("drop table bench_ingest;")
+
+
+def main() -> None:
+    scenarios = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    epics = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    dsn = sys.argv[4] if len(sys.argv) > 4 else None
+    rows, scenario_ids = build_run(scenarios, epics)
+    partitions = list(partition_chunks(rows))
+    step = "compute" if dsn is None else "compute and copy"
+    print(f"{scenarios} scenario results in {len(partitions)} epic chunks, {workers} workers on {os.cpu_count()} cores")
+    measure(f"{step} serial", lambda: ingest(partitions, scenario_ids, None, dsn), scenarios, dsn)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Warm the workers up: spawning is paid once by the application
+        list(executor.map(abs, range(workers)))
+        measure(
+            f"{step} in {workers} processes", lambda: ingest(partitions, scenario_ids, executor, dsn), scenarios, dsn
+        )
+
+
+if __name__ == "__main__":
+    main()
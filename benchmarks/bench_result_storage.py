@@ -0,0 +1,111 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Compare the size of the test results stored with their former layout (project name, version and status as
+strings) and with the compact one (project and version ids, status code).
+
+Both layouts are seeded server side with the same rows and the same indexes, then the table size, the index size
+and the duration of a version stacked count are reported.
+
+    python benchmarks/bench_result_storage.py dsn [runs] [scenarios]
+"""
+
+import sys
+from time import perf_counter
+
+import psycopg
+
+LEGACY = """create table bench_legacy_results (
+    id serial primary key,
+    run_date timestamp not null,
+    project_id varchar (50) not null,
+    version varchar (50) not null,
+    campaign_id int not null,
+    epic_id int not null,
+    feature_id int not null,
+    scenario_id int not null,
+    status varchar (50) not null,
+    is_partial boolean default false);
+insert into bench_legacy_results (run_date, project_id, version, campaign_id, epic_id, feature_id, scenario_id,
+    status, is_partial)
+select timestamp '2024-01-01' + run * interval '1 hour', 'benchmark project', '1.0.' || (run % 10), run % 10,
+    scenario % 40, scenario % 800, scenario, (array['skipped', 'passed', 'failed'])[(run + scenario) % 3 + 1], false
+from generate_series(1, {runs}) as run, generate_series(1, {scenarios}) as scenario;
+create index bench_legacy_scope_idx on bench_legacy_results (project_id, version, run_date);
+create index bench_legacy_campaign_idx on bench_legacy_results (campaign_id, run_date);"""
+
+COMPACT = """create table bench_compact_results (
+    run_date timestamp not null,
+    id serial primary key,
+    project_id int not null,
+    version_id int not null,
+    campaign_id int not null,
+    epic_id int not null,
+    feature_id int not null,
+    scenario_id int not null,
+    status smallint not null,
+    is_partial boolean not null default false);
+insert into bench_compact_results (run_date, project_id, version_id, campaign_id, epic_id, feature_id, scenario_id,
+    status, is_partial)
+select timestamp '2024-01-01' + run * interval '1 hour', 1, run % 10, run % 10,
+    scenario % 40, scenario % 800, scenario, (run + scenario) % 3, false
+from generate_series(1, {runs}) as run, generate_series(1, {scenarios}) as scenario;
+create index bench_compact_scope_idx on bench_compact_results (project_id, version_id, run_date);
+create index bench_compact_campaign_idx on bench_compact_results (campaign_id, run_date);"""
+
+LEGACY_STACKED = """select run_date,
+    count(scenario_id) filter (where status = 'passed'),
+    count(scenario_id) filter (where status = 'skipped'),
+    count(scenario_id) filter (where status = 'failed')
+from bench_legacy_results
+where project_id = 'benchmark project' and version = '1.0.3' and is_partial = false
+group by run_date order by run_date;"""
+
+COMPACT_STACKED = """select run_date,
+    count(scenario_id) filter (where status = 1),
+    count(scenario_id) filter (where status = 0),
+    count(scenario_id) filter (where status = 2)
+from bench_compact_results
+where project_id = 1 and version_id = 3 and is_partial = false
+group by run_date order by run_date;"""
+
+
+def measure(
+    connection: psycopg.Connection,
+    name: str,
+    table: str,
+    stacked: str,
+) -> None:
+    table_size, index_size = connection.execute(
+        "select pg_relation_size(%s), pg_indexes_size(%s);",
+        (table, table),
+    ).fetchone()
+    connection.execute(stacked).fetchall()
+    start = perf_counter()
+    for _ in range(5):
+        connection.execute(stacked).fetchall()
+    elapsed = (perf_counter() - start) / 5
+    print(
+        f"{name:<8} table {table_size / 2**20:8.1f} MiB   indexes {index_size / 2**20:8.1f} MiB"
+        f"   stacked count {elapsed * 1000:8.1f} ms"
+    )
+
+
+def main() -> None:
+    dsn = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    scenarios = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+    print(f"{runs * scenarios} scenario results ({runs} runs of {scenarios} scenarios)")
+    with psycopg.connect(dsn, autocommit=True) as connection:
+        try:
+            for layout in (LEGACY, COMPACT):
+                connection.execute(layout.format(runs=runs, scenarios=scenarios))
+            connection.execute("vacuum analyze bench_legacy_results;")
+            connection.execute("vacuum analyze bench_compact_results;")
+            measure(connection, "former", "bench_legacy_results", LEGACY_STACKED)
+            measure(connection, "compact", "bench_compact_results", COMPACT_STACKED)
+        finally:
+            connection.execute("drop table if exists bench_legacy_results, bench_compact_results;")
+
+
+if __name__ == "__main__":
+    main()
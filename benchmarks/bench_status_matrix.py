@@ -0,0 +1,159 @@
+# -*- Product under GNU GPL v3 -*-
+# -*- Author: E.Aivayan -*-
+"""Compare the map rendering before the status matrix with the current one, up to the saved html file.
+
+The former MapHtml and MapJson are kept below as they were, rendering the gathered rows. The current MapHtml
+renders the cached columnar dataset.
+
+No database nor redis needed, only the application configuration (.env) for the imports.
+    python benchmarks/bench_status_matrix.py [elements] [runs]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from math import pi
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from bokeh import resources
+from bokeh.io import output_file, save
+from bokeh.models import CategoricalColorMapper
+from bokeh.plotting import figure
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.conf import BASE_DIR  # noqa: E402
+from app.database.utils.chart_dataset import dataset_to_rows  # noqa: E402
+from app.database.utils.output_strategy import MapHtml  # noqa: E402
+
+STATUSES = ("passed", "failed", "skipped")
+
+
+def build_dataset(elements: int, runs: int) -> dict:
+    random.seed(42)
+    start = datetime(2024, 1, 1)
+    dataset = {"run_date": [], "element_id": [], "element_status": [], "element_name": []}
+    for run in range(runs):
+        run_date = start + timedelta(hours=run * 7)
+        for element in range(elements):
+            dataset["run_date"].append(run_date)
+            dataset["element_id"].append(element)
+            dataset["element_status"].append(random.choice(STATUSES))
+            dataset["element_name"].append(f"feature--scenario {element}")
+    return dataset
+
+
+async def former_map_json(table_rows: List[Tuple]) -> dict:
+    result = {
+        "run_date": [],
+        "element_id": [],
+        "element_status": [],
+        "element_name": [],
+    }
+    for row in table_rows:
+        result["run_date"].append(row[0])
+        result["element_id"].append(row[1])
+        result["element_status"].append(row[2])
+        result["element_name"].append(row[3])
+    return result
+
+
+async def former_map_html(table_rows: List[Tuple], filename: Path) -> str:
+    _json = await former_map_json(table_rows)
+
+    mapper = CategoricalColorMapper(
+        palette=[
+            "red",
+            "green",
+            "gray",
+        ],
+        factors=[
+            "failed",
+            "passed",
+            "skipped",
+        ],
+    )
+    item: datetime  # noqa: F842
+    _dates_range = [
+        item.strftime("%Y-%m-%dT%H:%M:%S")
+        for item in sorted(
+            set(
+                _json["run_date"],
+            ),
+        )
+    ]
+    _dates = [item.strftime("%Y-%m-%dT%H:%M:%S") for item in _json["run_date"]]
+    _json["run_date"] = _dates
+    _elements_names = sorted(list(set(_json["element_name"])))
+    output_file(
+        filename=filename,
+        title="Status map over time",
+    )
+    TOOLS = "hover,save,pan,box_zoom,reset,wheel_zoom"
+    p = figure(
+        title="Test map result",
+        x_range=_dates_range,
+        y_range=_elements_names,
+        x_axis_location="above",
+        sizing_mode="stretch_both",
+        tools=TOOLS,
+        toolbar_location="below",
+        tooltips=[
+            ("Test: ", "@element_name"),
+            ("Result_date", "@run_date"),
+            ("Status", "@element_status"),
+        ],
+    )
+
+    p.grid.grid_line_color = None
+    p.axis.axis_line_color = None
+    p.axis.major_tick_line_color = None
+    p.axis.major_label_text_font_size = "7px"
+    p.axis.major_label_standoff = 0
+    p.xaxis.major_label_orientation = pi / 3
+    p.rect(
+        x="run_date",
+        y="element_name",
+        width=1,
+        height=1,
+        source=_json,
+        fill_color={
+            "field": "element_status",
+            "transform": mapper,
+        },
+        line_color=None,
+    )
+    save(p, resources=resources.INLINE)
+    return filename.name
+
+
+def measure(name: str, function: Callable[[], Path]) -> None:
+    # tracemalloc slows allocations down: time and memory are measured on separate runs
+    start = perf_counter()
+    path = function()
+    elapsed = perf_counter() - start
+    size = path.stat().st_size
+    path.unlink()
+    tracemalloc.start()
+    function().unlink()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {elapsed:8.3f} s {peak / 1024 / 1024:10.1f} MiB peak {size / 1024 / 1024:10.1f} MiB html")
+
+
+if __name__ == "__main__":
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    dataset = build_dataset(elements, runs)
+    # The former strategies received the rows as gathered from the database
+    table_rows = dataset_to_rows("map", dataset)
+    print(f"{elements} elements x {runs} runs = {elements * runs} cells")
+    with tempfile.TemporaryDirectory() as directory:
+        former = Path(directory, "former.html")
+        measure("former", lambda: Path(directory, asyncio.run(former_map_html(table_rows, former))))
+    measure("matrix", lambda: BASE_DIR / "static" / asyncio.run(MapHtml.render(dataset)))
@@ -275,6 +275,37 @@ class TestRestVersions:
         assert response.status_code == 200
         assert response.json() == "1"
 
+    def test_get_one_ticket_not_modified(
+        self: "TestRestVersions",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        response = application.get(
+            "/api/v1/projects/test/versions/1.0.1/tickets/ref-001",
+            headers=logged,
+        )
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        response = application.get(
+            "/api/v1/projects/test/versions/1.0.1/tickets/ref-001",
+            headers={**logged, "If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        # Any write on the version changes the data version
+        response = application.put(
+            "/api/v1/projects/test/versions/1.0.1/tickets/ref-001",
+            json={"description": "Updated description"},
+            headers=logged,
+        )
+        assert response.status_code == 200
+        response = application.get(
+            "/api/v1/projects/test/versions/1.0.1/tickets/ref-001",
+            headers={**logged, "If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
     def test_update_ticket_errors_401(
         self: "TestRestVersions",
         application: Generator[TestClient, Any, None],
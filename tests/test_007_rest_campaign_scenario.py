@@ -1,11 +1,13 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import json
 from typing import Any, Generator, List
 from unittest.mock import patch
 
 import pytest
 from starlette.testclient import TestClient
 
+from app.database.redis.rs_campaign_status import rs_subscribe_campaign_status
 from tests.utils.project_setting import (
     set_project,
     set_project_campaign,
@@ -502,6 +504,174 @@ class TestRestCampaignScenario:
         assert response.status_code == 200, response.text
         assert response.json()["status"] == "in progress", response.text
 
+    def test_scenario_status_update_is_published(
+        self: "TestRestCampaignScenario",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        subscription = rs_subscribe_campaign_status(
+            TestRestCampaignScenario.project_name,
+            TestRestCampaignScenario.project_version,
+            str(TestRestCampaignScenario.project_campaign_occurrence),
+        )
+        try:
+            response = application.put(
+                f"/api/v1/projects/{TestRestCampaignScenario.project_name}/campaigns/"
+                f"{TestRestCampaignScenario.project_version}/{TestRestCampaignScenario.project_campaign_occurrence}"
+                f"/tickets/tcs-001/scenarios/{TestRestCampaignScenario.scenario_id}/status",
+                params={"new_status": "in progress"},
+                headers=logged,
+            )
+            assert response.status_code == 200, response.text
+            # The subscription confirmation is read first
+            message = subscription.get_message(timeout=5) or subscription.get_message(timeout=5)
+        finally:
+            subscription.close()
+        assert message is not None, "The status update is not published"
+        update = json.loads(message["data"])
+        assert update["scenarios"] == [["tcs-001", TestRestCampaignScenario.scenario_id, "in progress"]]
+        assert update["status_count"]["tcs-001"]["in progress"] >= 1, update
+
+    def test_update_scenario_statuses(
+        self: "TestRestCampaignScenario",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        base_url = (
+            f"/api/v1/projects/{TestRestCampaignScenario.project_name}/campaigns/"
+            f"{TestRestCampaignScenario.project_version}/{TestRestCampaignScenario.project_campaign_occurrence}"
+        )
+        # One statement by update, in the same transaction
+        with patch("app.database.postgre.testcampaign.STATUS_UPDATES_CHUNK", 1):
+            response = application.put(
+                f"{base_url}/scenarios/status",
+                json=[
+                    {
+                        "ticket_reference": "tcs-001",
+                        "scenario_internal_id": TestRestCampaignScenario.scenario_id,
+                        "status": "done",
+                    },
+                    {
+                        "ticket_reference": "tcs-001",
+                        "scenario_internal_id": TestRestCampaignScenario.scenario_id,
+                        "status": "in progress",
+                    },
+                    {
+                        "ticket_reference": "tcs-001",
+                        "scenario_internal_id": 999999,
+                        "status": "done",
+                    },
+                ],
+                headers=logged,
+            )
+        assert response.status_code == 200, response.text
+        assert response.json()["raw_data"]["not_updated"] == [
+            {"ticket_reference": "tcs-001", "scenario_internal_id": 999999}
+        ], response.text
+        # The last update of a scenario is kept
+        response = application.get(
+            f"{base_url}/tickets/tcs-001/scenarios/{TestRestCampaignScenario.scenario_id}",
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "in progress", response.text
+
+        response = application.put(
+            f"/api/v1/projects/{TestRestCampaignScenario.project_name}/campaigns/"
+            f"{TestRestCampaignScenario.project_version}/99/scenarios/status",
+            json=[],
+            headers=logged,
+        )
+        assert response.status_code == 404, response.text
+
+    def test_get_campaign_status_count(
+        self: "TestRestCampaignScenario",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        base_url = (
+            f"/api/v1/projects/{TestRestCampaignScenario.project_name}/campaigns/"
+            f"{TestRestCampaignScenario.project_version}"
+        )
+        response = application.get(
+            f"{base_url}/{TestRestCampaignScenario.project_campaign_occurrence}/statistics",
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["tcs-001"]["in progress"] == 1, response.text
+
+        response = application.get(
+            f"{base_url}/99/statistics",
+            headers=logged,
+        )
+        assert response.status_code == 404, response.text
+
+    def test_get_campaign_diff(
+        self: "TestRestCampaignScenario",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        base_url = (
+            f"/api/v1/projects/{TestRestCampaignScenario.project_name}/campaigns/"
+            f"{TestRestCampaignScenario.project_version}"
+        )
+        occurrence = TestRestCampaignScenario.project_campaign_occurrence
+        other_occurrence = set_project_campaign(
+            TestRestCampaignScenario.project_name,
+            TestRestCampaignScenario.project_version,
+            TestRestCampaignScenario.project_tickets,
+            application,
+            logged,
+        )
+        response = application.get(f"{base_url}/{occurrence}/diff/{other_occurrence}", headers=logged)
+        assert response.status_code == 200, response.text
+        diff = response.json()
+        assert diff, response.text
+        assert int(response.headers["X-total-count"]) == len(diff)
+        assert all(row["change"] == "removed" and row["other_status"] is None for row in diff), response.text
+        assert "tcs-001" in {row["ticket_reference"] for row in diff if row["scenario_id"] == "test_1"}
+
+        response = application.get(
+            f"{base_url}/{other_occurrence}/diff/{occurrence}",
+            params={"limit": 1, "skip": 1},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert int(response.headers["X-total-count"]) == len(diff)
+        assert response.json() == [{**diff[1], "status": None, "other_status": diff[1]["status"], "change": "added"}]
+
+        # The total is kept on a page past the last difference
+        response = application.get(
+            f"{base_url}/{occurrence}/diff/{other_occurrence}",
+            params={"limit": 10, "skip": len(diff)},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == [], response.text
+        assert int(response.headers["X-total-count"]) == len(diff)
+
+        response = application.get(
+            f"{base_url}/{occurrence}/diff/{occurrence}",
+            params={"limit": 10},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == [], response.text
+        assert int(response.headers["X-total-count"]) == 0
+
+        response = application.get(
+            f"{base_url}/{occurrence}/diff/{occurrence}",
+            params={"include_unchanged": True},
+            headers={**logged, "accept": "application/x-ndjson"},
+        )
+        assert response.status_code == 200, response.text
+        lines = response.text.splitlines()
+        assert len(lines) > len(diff), response.text
+        assert all('"change": "unchanged"' in line for line in lines), response.text
+
+        response = application.get(f"{base_url}/{occurrence}/diff/99", headers=logged)
+        assert response.status_code == 404, response.text
+
     def test_update_scenario_status_error_422(
         self: "TestRestCampaignScenario",
         application: Generator[TestClient, Any, None],
@@ -1,13 +1,20 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+from pathlib import Path
 from typing import Any, Generator
 from unittest.mock import patch
+from zipfile import ZipFile
 
 import pytest
+from docx import Document
 from starlette.testclient import TestClient
 
+from app.conf import BASE_DIR
+from app.database.redis.rs_deliverable import rs_register_deliverable_job
 from app.schema.rest_enum import DeliverableTypeEnum
 from app.utils.project_alias import provide
+from app.utils.redis import redis_connection
+from app.utils.report_generator import deliverable_key, deliverable_version
 from tests.utils.project_setting import (
     set_campaign_scenario_status,
     set_project,
@@ -266,7 +273,7 @@ class TestRestDeliverables:
         application: Generator[TestClient, Any, None],
         logged: Generator[dict[str, str], Any, None],
     ) -> None:
-        with patch("app.routers.rest.project_campaigns.rs_retrieve_file") as rp:
+        with patch("app.routers.rest.project_campaigns.rs_retrieve_deliverable_file") as rp:
             rp.side_effect = Exception("Error")
             response = application.get(
                 f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{TestRestDeliverables.project_version}"
@@ -292,3 +299,166 @@ class TestRestDeliverables:
             headers=logged,
         )
         assert response.status_code == 200, response.text
+
+    def test_get_campaign_deliverable_asynchronous(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        url = (
+            f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{TestRestDeliverables.project_version}"
+            f"/{TestRestDeliverables.project_campaign_occurrence}/deliverables"
+        )
+        response = application.get(
+            url,
+            params={"deliverable_type": DeliverableTypeEnum.TER.value, "asynchronous": True},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        status_key = response.json()
+        assert status_key.endswith(":deliverable"), response.text
+        response = application.get(
+            "/api/v1/status",
+            params={"status_key": status_key},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "done", response.text
+        filename = response.json()["filename"]
+        assert filename.startswith(f"TER_{provide(TestRestDeliverables.project_name)}"), response.text
+
+        # Generated file
+        response = application.get(
+            url,
+            params={"deliverable_type": DeliverableTypeEnum.TER.value, "asynchronous": True},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json().endswith(f"static/{filename}"), response.text
+
+    def test_get_asynchronous_status_events(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        response = application.post(
+            f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{TestRestDeliverables.project_version}"
+            f"/{TestRestDeliverables.project_campaign_occurrence}",
+            headers=logged,
+        )
+        response = application.get(
+            "/api/v1/status/events",
+            params={"status_key": response.json()},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: done" in response.text
+
+    def test_get_campaign_deliverable_version(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        base_url = (
+            f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{TestRestDeliverables.project_version}"
+            f"/{TestRestDeliverables.project_campaign_occurrence}"
+        )
+        links = {}
+        for deliverable_type in (DeliverableTypeEnum.TEST_PLAN, DeliverableTypeEnum.TER):
+            response = application.get(
+                f"{base_url}/deliverables",
+                params={"deliverable_type": deliverable_type.value},
+                headers=logged,
+            )
+            assert response.status_code == 200, response.text
+            links[deliverable_type] = response.json()
+        response = application.get(f"{base_url}/tickets/td-001", headers=logged)
+        assert response.status_code == 200, response.text
+        response = application.put(
+            f"{base_url}/tickets/td-001/scenarios/{response.json()[0]['scenario_tech_id']}/status",
+            params={"new_status": "done"},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        # Only the test exit report shows the scenario statuses
+        response = application.get(
+            f"{base_url}/deliverables",
+            params={"deliverable_type": DeliverableTypeEnum.TEST_PLAN.value},
+            headers=logged,
+        )
+        assert response.json() == links[DeliverableTypeEnum.TEST_PLAN], response.text
+        response = application.get(
+            f"{base_url}/deliverables",
+            params={"deliverable_type": DeliverableTypeEnum.TER.value},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() != links[DeliverableTypeEnum.TER], response.text
+
+    def test_get_campaign_evidence_pack(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        response = application.get(
+            f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{TestRestDeliverables.project_version}"
+            f"/{TestRestDeliverables.project_campaign_occurrence}/deliverables",
+            params={"deliverable_type": DeliverableTypeEnum.EVIDENCE_PACK.value},
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json().endswith(".zip"), response.text
+        with ZipFile(BASE_DIR / "static" / response.json().split("/static/")[-1]) as archive:
+            assert sorted(archive.namelist()) == ["evidence_td-001.docx", "evidence_td-002.docx"]
+
+    def test_get_campaign_deliverable_template(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+        tmp_path: Path,
+    ) -> None:
+        template = Document()
+        template.add_paragraph("Customer cover page")
+        template.save(tmp_path / f"{DeliverableTypeEnum.TEST_PLAN.value}.docx")
+        with patch.dict("app.utils.report_generator.config", {"DELIVERABLE_TEMPLATES": str(tmp_path)}):
+            response = application.get(
+                f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/"
+                f"{TestRestDeliverables.project_version}/{TestRestDeliverables.project_campaign_occurrence}/deliverables",
+                headers=logged,
+            )
+        assert response.status_code == 200, response.text
+        document = Document(BASE_DIR / "static" / response.json().split("/static/")[-1])
+        assert document.paragraphs[0].text == "Customer cover page"
+        # Header row and a row by ticket scenario
+        assert sorted(row.cells[0].text for row in document.tables[-1].rows[1:]) == ["test_1", "test_2"]
+
+    def test_get_campaign_deliverable_lost_generation(
+        self: "TestRestDeliverables",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """A request joining a generation whose worker died stops once the generation job has expired"""
+        version = TestRestDeliverables.project_version
+        occurrence = TestRestDeliverables.project_campaign_occurrence
+        deliverable_type = DeliverableTypeEnum.TER
+        key = deliverable_key(TestRestDeliverables.project_name, version, str(occurrence), deliverable_type)
+        file_version = deliverable_version(TestRestDeliverables.project_name, version, deliverable_type)
+        status_key, generate = rs_register_deliverable_job(
+            TestRestDeliverables.project_name,
+            version,
+            str(occurrence),
+            deliverable_type.value,
+            key,
+            file_version,
+        )
+        assert generate
+        redis_connection().pexpire(f"deliverable_job:{key}:{file_version}", 500)
+        with patch("app.routers.rest.project_campaigns.rs_retrieve_deliverable_file", return_value=None):
+            response = application.get(
+                f"/api/v1/projects/{TestRestDeliverables.project_name}/campaigns/{version}/{occurrence}/deliverables",
+                params={"deliverable_type": deliverable_type.value},
+                headers=logged,
+            )
+        assert response.status_code == 500, response.text
+        assert status_key in response.text, response.text
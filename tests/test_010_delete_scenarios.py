@@ -1,11 +1,13 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
 from typing import Any, Generator
 
 import dpath
 import pytest
 from starlette.testclient import TestClient
 
+from app.database.postgre.test_repository.scenarios_utils import db_get_scenarios_tech_ids
 from tests.utils.context_manager import Context
 from tests.utils.project_setting import (
     set_campaign_scenario_status,
@@ -347,3 +349,43 @@ class TestDeleteScenario:
             is not None
         ), response.text
         # Deleted scenario appear on existing campaign
+
+    def test_deleted_scenario_tech_ids(
+        self: "TestDeleteScenario",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        # Scenarios of several features resolved at once, deleted ones being not found unless asked for
+        scenario_keys = [
+            ("first_epic", "New Test feature", None, "test_1"),
+            ("first_epic", "Test feature", None, "test_2"),
+            ("first_epic", "Test feature", "\\test.feature", "test_1"),
+            ("second_epic", "Test feature", None, "unknown"),
+            ("first_epic", "New Test feature", None, "test_1"),
+        ]
+        tech_ids, not_found = asyncio.run(
+            db_get_scenarios_tech_ids(TestDeleteScenario.project_name, scenario_keys),
+        )
+        assert len(tech_ids) == 2, tech_ids
+        assert not_found == {"test_2", "unknown"}, not_found
+
+        with_deleted, not_found = asyncio.run(
+            db_get_scenarios_tech_ids(TestDeleteScenario.project_name, scenario_keys, remove_deleted=False),
+        )
+        assert len(with_deleted) == 3, with_deleted
+        assert set(tech_ids) < set(with_deleted), with_deleted
+        assert not_found == {"unknown"}, not_found
+
+        tech_ids, not_found = asyncio.run(
+            db_get_scenarios_tech_ids(
+                TestDeleteScenario.project_name,
+                [
+                    ("second_epic", "Test feature", None, "t_test_1"),
+                    ("second_epic", "Test feature", None, "s_test_1"),
+                    ("second_epic", "Test feature", "\\test_simple.feature", "t_test_1"),
+                ],
+            ),
+        )
+        assert len(tech_ids) == 2, tech_ids
+        assert not_found == {"t_test_1"}, not_found
+
+        assert asyncio.run(db_get_scenarios_tech_ids(TestDeleteScenario.project_name, [])) == ([], set())
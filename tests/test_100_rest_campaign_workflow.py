@@ -1,11 +1,57 @@
 # -*- Product under GNU GPL v3 -*-
 # -*- Author: E.Aivayan -*-
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
 from random import choice
+from time import sleep
 from typing import Any, Generator
+from unittest.mock import patch
+from zipfile import ZipFile
 
 import dpath
+import psycopg
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
 from starlette.testclient import TestClient
 
+from app.app_exception import MalformedCsvFile
+from app.conf import BASE_DIR, postgre_string
+from app.database.postgre.pg_campaigns_management import campaign_failing_scenarios, retrieve_campaign_id
+from app.database.postgre.postgre_updates import POSTGRE_UPDATES
+from app.database.redis.rs_chart_dataset import (
+    DATASET_TTL,
+    rs_append_dataset,
+    rs_dataset_exists,
+    rs_record_dataset,
+    rs_retrieve_dataset,
+)
+from app.database.redis.rs_data_version import (
+    rs_bump_data_version,
+    rs_bump_result_version,
+    rs_retrieve_result_version,
+)
+from app.database.redis.rs_test_result import (
+    RESULT_UPLOAD_PENDING,
+    mg_insert_test_result,
+    mg_insert_test_result_done,
+    mg_update_test_result_progress,
+    rs_forget_result_upload,
+    rs_record_result_upload,
+    rs_reserve_result_upload,
+)
+from app.database.utils.chart_dataset import DATASET_COLUMNS, dataset_key, previous_result_version, run_scopes
+from app.database.utils.output_strategy import ArrowOutput, ParquetOutput
+from app.database.utils.render_cache import warm_render_cache
+from app.database.utils.result_parsers import CucumberResult, JunitResult
+from app.database.utils.result_partition import partition_chunks
+from app.utils import process_pool
+from app.utils.process_pool import process_pool_executor, shutdown_process_pool
+from app.utils.redis import redis_connection
 from tests.utils.api_model import (
     log_in,
     log_out,
@@ -20,6 +66,8 @@ from tests.utils.project_setting import (
     set_project_versions,
 )
 
+RESULT_HEADERS = "epic_id,feature_name,scenario_id,status\n"
+
 
 # noinspection PyUnresolvedReferences
 class TestRestCampaignWorkflow:
@@ -385,6 +433,43 @@ class TestRestCampaignWorkflow:
             application,
         )
 
+    def test_failing_scenarios_linked_to_bug(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- the failing scenario linked to the bug is listed once, selected
+        - the linked scenario is still listed, selected, once it no longer fails"""
+        bug_id = TestRestCampaignWorkflow.context.get_context("bugs/bug_id")
+        scenario_tech_id = TestRestCampaignWorkflow.context.get_context("bugs/scenario_tech_id")
+
+        def listed(bug: int | None) -> list:
+            rows = campaign_failing_scenarios(TestRestCampaignWorkflow.project_name, "1.0", bug)
+            assert rows == sorted(
+                rows, key=lambda row: (row["occurrence"], row["ticket_reference"], row["scenario_id"])
+            ), rows
+            return [
+                row["selection"]
+                for row in rows
+                if row["scenario_tech_id"] == scenario_tech_id and row["ticket_reference"] == "ref-002"
+            ]
+
+        assert listed(bug_id) == ["selected"]
+        assert listed(None) == [""]
+        status_url = (
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}"
+            f"/campaigns/{TestRestCampaignWorkflow.project_version['current']}"
+            f"/{TestRestCampaignWorkflow.current_campaign_occurrence}/tickets/ref-002/scenarios/{scenario_tech_id}/status"
+        )
+        response = application.put(status_url, headers=logged, params={"new_status": "in progress"})
+        assert response.status_code == 200, response.text
+        try:
+            assert listed(bug_id) == ["selected"]
+            assert listed(None) == []
+        finally:
+            response = application.put(status_url, headers=logged, params={"new_status": "waiting fix"})
+            assert response.status_code == 200, response.text
+
     def test_complete_the_testing_day(
         self: "TestRestCampaignWorkflow",
         application: Generator[TestClient, Any, None],
@@ -486,3 +571,707 @@ class TestRestCampaignWorkflow:
         assert test_results[5][1] == simple_cast(
             TestRestCampaignWorkflow.context.get_context(f"scenarios_result/{test_results[5][0]}")
         ), TestRestCampaignWorkflow.context.get_context(f"scenarios_result/{test_results[5][0]}")
+
+    def test_test_manager_downsample_campaign_results(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        """- log in as admin
+        - retrieve campaign testing status by day keeping the most volatile scenario
+        - log out"""
+        header = log_in(
+            TestRestCampaignWorkflow.alfred,
+            application,
+        )
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+            headers={**header, "accept": "application/json"},
+            params={
+                "category": "scenarios",
+                "rendering": "map",
+                "version": "1.0",
+                "campaign_occurrence": TestRestCampaignWorkflow.current_campaign_occurrence,
+                "resolution": "day",
+                "top": 1,
+            },
+        )
+        assert response.status_code == 200, response.text
+        # Both snapshots are taken the same day so no scenario changes its status
+        assert response.json().get("element_id") == [-1], response.text
+        assert response.json().get("element_name") == ["3 other elements"], response.text
+
+        log_out(
+            header,
+            application,
+        )
+
+    def test_test_manager_stream_campaign_results(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        """- log in as admin
+        - stream campaign testing status as ndjson
+        - check streaming rejects downsampling
+        - log out"""
+        header = log_in(
+            TestRestCampaignWorkflow.alfred,
+            application,
+        )
+        params = {
+            "category": "scenarios",
+            "rendering": "map",
+            "version": "1.0",
+            "campaign_occurrence": TestRestCampaignWorkflow.current_campaign_occurrence,
+        }
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+            headers={**header, "accept": "application/x-ndjson"},
+            params=params,
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("application/x-ndjson"), response.headers
+        lines = response.text.splitlines()
+        assert lines, response.text
+        assert json.loads(lines[0]).keys() == {"run_date", "element_id", "element_status", "element_name"}, lines[0]
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+            headers={**header, "accept": "text/csv"},
+            params={**params, "stream": True, "resolution": "day"},
+        )
+        assert response.status_code == 400, response.text
+
+        log_out(
+            header,
+            application,
+        )
+
+    def test_test_manager_columnar_campaign_results(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        """- log in as admin
+        - export the campaign map and stacked results as parquet and arrow
+        - read the files back and compare them with the json results
+        - log out"""
+        header = log_in(
+            TestRestCampaignWorkflow.alfred,
+            application,
+        )
+        params = {
+            "category": "scenarios",
+            "version": "1.0",
+            "campaign_occurrence": TestRestCampaignWorkflow.current_campaign_occurrence,
+        }
+        readers = {
+            "application/vnd.apache.parquet": pq.read_table,
+            "application/vnd.apache.arrow.stream": lambda path: pa.ipc.open_stream(pa.OSFile(str(path))).read_all(),
+        }
+
+        for rendering, extra_params in (
+            ("map", {}),
+            ("map", {"resolution": "day"}),
+            ("stacked", {}),
+        ):
+            response = application.get(
+                f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+                headers={**header, "accept": "application/json"},
+                params={**params, **extra_params, "rendering": rendering},
+            )
+            assert response.status_code == 200, response.text
+            expected = response.json()
+            assert expected["run_date"], response.text
+            for accept, read in readers.items():
+                response = application.get(
+                    f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+                    headers={**header, "accept": accept},
+                    params={**params, **extra_params, "rendering": rendering},
+                )
+                assert response.status_code == 200, response.text
+                table = read(BASE_DIR / "static" / response.json().split("/static/")[-1])
+                assert set(table.column_names) == expected.keys(), table.schema
+                assert table.num_rows == len(expected["run_date"]), table
+                if rendering == "map":
+                    assert table.schema.field("element_status").type == pa.dictionary(pa.int8(), pa.string())
+                    assert table.schema.field("element_name").type == pa.dictionary(pa.int32(), pa.string())
+                received = table.to_pydict()
+                received["run_date"] = [run_date.isoformat() for run_date in received["run_date"]]
+                assert sorted(zip(*received.values())) == sorted(zip(*(expected[column] for column in received))), (
+                    accept,
+                    rendering,
+                )
+
+        # The cursor batches are read and the file written off the event loop
+        readers_threads = []
+
+        def batches() -> Generator[list, None, None]:
+            readers_threads.append(threading.get_ident())
+            yield [(datetime(2024, 1, 1), 1, "passed", "first")]
+
+        for output in (ParquetOutput, ArrowOutput):
+            filename = asyncio.run(output.render_batches(DATASET_COLUMNS["map"], batches()))
+            (BASE_DIR / "static" / filename).unlink()
+        assert len(readers_threads) == 2
+        assert threading.get_ident() not in readers_threads
+
+        log_out(
+            header,
+            application,
+        )
+
+    def test_test_manager_flaky_campaign_scenarios(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        """- log in as admin
+        - retrieve the campaign flaky scenarios
+        - check the flaky category has no map rendering
+        - log out"""
+        header = log_in(
+            TestRestCampaignWorkflow.alfred,
+            application,
+        )
+        params = {
+            "category": "flaky",
+            "rendering": "table",
+            "version": "1.0",
+            "campaign_occurrence": TestRestCampaignWorkflow.current_campaign_occurrence,
+        }
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+            headers={**header, "accept": "application/json"},
+            params=params,
+        )
+        assert response.status_code == 200, response.text
+        assert response.json().keys() == {
+            "run_date",
+            "element_id",
+            "element_name",
+            "runs",
+            "flips",
+            "flip_rate",
+            "last_failure",
+            "failure_streak",
+            "current_streak",
+        }, response.text
+        # Only the scenario waiting fix failed in the campaign
+        assert len(response.json()["element_id"]) == 1, response.text
+        assert response.json()["failure_streak"] == [1], response.text
+        assert response.json()["last_failure"][0] is not None, response.text
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults",
+            headers={**header, "accept": "application/json"},
+            params={**params, "rendering": "map"},
+        )
+        assert response.status_code == 400, response.text
+
+        log_out(
+            header,
+            application,
+        )
+
+    def test_test_manager_combined_campaign_results(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+    ) -> None:
+        """- log in as admin
+        - retrieve campaign stacked and map results of every category in one call
+        - log out"""
+        header = log_in(
+            TestRestCampaignWorkflow.alfred,
+            application,
+        )
+
+        response = application.get(
+            f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults/combined",
+            headers=header,
+            params={
+                "renderings": ["stacked", "map"],
+                "version": "1.0",
+                "campaign_occurrence": TestRestCampaignWorkflow.current_campaign_occurrence,
+            },
+        )
+        assert response.status_code == 200, response.text
+        assert response.json().keys() == {"epics", "features", "scenarios"}, response.text
+        for category in response.json().values():
+            assert category.keys() == {"stacked", "map"}, response.text
+            assert "run_date" in category["stacked"], response.text
+
+        log_out(
+            header,
+            application,
+        )
+
+    def test_test_manager_upload_results_once(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- post a run twice, the retry getting the status of the first upload
+        - post a run whose recording fails, then post it again"""
+        url = f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults"
+        content = RESULT_HEADERS + "first_epic,Test feature,test_1,passed\n"
+        # Run dates of the session, uploads being remembered by redis across databases
+        run_date = datetime.now().replace(microsecond=0)
+        data = {"version": TestRestCampaignWorkflow.project_version["next"], "result_date": run_date.isoformat()}
+        response = application.post(url, files={"file": ("run.csv", content)}, data=data, headers=logged)
+        assert response.status_code == 200, response.text
+        status_key = response.json()
+        response = application.post(url, files={"file": ("run.csv", content)}, data=data, headers=logged)
+        assert response.status_code == 200, response.text
+        assert response.json() == status_key, response.text
+
+        data["result_date"] = (run_date + timedelta(seconds=1)).isoformat()
+        with patch("app.routers.rest.project_test_results.pg_insert_result", side_effect=Exception("lost")):
+            response = application.post(url, files={"file": ("run.csv", content)}, data=data, headers=logged)
+        assert response.status_code == 200, response.text
+        status_key = response.json()
+        response = application.get("/api/v1/status", params={"status_key": status_key}, headers=logged)
+        assert response.json()["status"] == "done", response.text
+        assert "Import failed" in response.json()["message"], response.text
+        # The failed upload is processed again
+        response = application.post(url, files={"file": ("run.csv", content)}, data=data, headers=logged)
+        assert response.status_code == 200, response.text
+        assert response.json() != status_key, response.text
+        response = application.get("/api/v1/status", params={"status_key": response.json()}, headers=logged)
+        assert response.json()["status"] == "done", response.text
+        assert "Import failed" not in response.json()["message"], response.text
+
+    def test_test_manager_concurrent_upload_reservation(
+        self: "TestRestCampaignWorkflow",
+    ) -> None:
+        """- reserve a same upload concurrently: a single request processes it, the others join it"""
+        arguments = (TestRestCampaignWorkflow.project_name, TestRestCampaignWorkflow.project_version["next"], "hash")
+        with ThreadPoolExecutor(8) as executor:
+            reservations = list(executor.map(lambda _: rs_reserve_result_upload(*arguments), range(8)))
+        assert reservations.count(None) == 1, reservations
+        assert reservations.count(RESULT_UPLOAD_PENDING) == 7, reservations
+        rs_record_result_upload(*arguments, "status_key")
+        assert rs_reserve_result_upload(*arguments) == "status_key"
+        rs_forget_result_upload(*arguments)
+        assert rs_reserve_result_upload(*arguments) is None
+        rs_forget_result_upload(*arguments)
+
+    def test_test_manager_partitioned_ingest(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- post a run serially, then by epic and by feature partitions
+        - the three runs record the same scenario, feature and epic results"""
+        rows = [
+            "first_epic,Test feature,test_1,passed\n",
+            "second_epic,Test feature,t_test_1,skipped\n",
+            "first_epic,New Test feature,test_1,failed\n",
+        ]
+        # A minute after the runs of test_test_manager_upload_results_once
+        run_date = datetime.now().replace(microsecond=0) + timedelta(minutes=1)
+        run_dates = [run_date + timedelta(seconds=index) for index in range(3)]
+        for partition_by, result_date in zip((None, "epic", "feature"), run_dates):
+            data = {"version": TestRestCampaignWorkflow.project_version["next"], "result_date": result_date.isoformat()}
+            if partition_by is not None:
+                data["partition_by"] = partition_by
+            response = application.post(
+                f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults/bulk",
+                files=[
+                    ("files", ("first.csv", RESULT_HEADERS + "".join(rows[:2]))),
+                    ("files", ("second.csv", RESULT_HEADERS + rows[2])),
+                ],
+                data=data,
+                headers=logged,
+            )
+            assert response.status_code == 200, response.text
+            response = application.get("/api/v1/status", params={"status_key": response.json()}, headers=logged)
+            assert response.json()["status"] == "done", response.text
+            assert response.json()["written"] == 3, response.text
+
+        recorded = {}
+        with psycopg.connect(postgre_string) as connection:
+            for table, columns in (
+                ("scenario_results", "epic_id, feature_id, scenario_id, status"),
+                ("feature_results", "epic_id, feature_id, status"),
+                ("epic_results", "epic_id, status"),
+            ):
+                for result_date in run_dates:
+                    recorded[(table, result_date)] = connection.execute(
+                        f"select {columns} from {table} where run_date = %s order by {columns};",
+                        (result_date,),
+                    ).fetchall()
+        for table, count in (("scenario_results", 3), ("feature_results", 3), ("epic_results", 2)):
+            assert len(recorded[(table, run_dates[0])]) == count, recorded
+            assert recorded[(table, run_dates[1])] == recorded[(table, run_dates[0])], recorded
+            assert recorded[(table, run_dates[2])] == recorded[(table, run_dates[0])], recorded
+
+    def test_test_manager_bulk_results(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- post a run split in a zip archive of reports and a report
+        - post an unreadable archive, an archive without report and a run of an unknown version"""
+        url = f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults/bulk"
+        archive = BytesIO()
+        with ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("first.csv", RESULT_HEADERS + "first_epic,Test feature,test_1,passed\n")
+            zip_file.writestr("reports/second.csv", RESULT_HEADERS + "second_epic,Test feature,t_test_1,failed\n")
+            zip_file.writestr("notes.txt", "not a report")
+        # Two minutes after the runs of test_test_manager_upload_results_once
+        run_date = datetime.now().replace(microsecond=0) + timedelta(minutes=2)
+        data = {"version": TestRestCampaignWorkflow.project_version["next"], "result_date": run_date.isoformat()}
+        response = application.post(
+            url,
+            files=[
+                ("files", ("run.zip", archive.getvalue())),
+                ("files", ("third.csv", RESULT_HEADERS + "first_epic,New Test feature,test_1,skipped\n")),
+            ],
+            data=data,
+            headers=logged,
+        )
+        assert response.status_code == 200, response.text
+        response = application.get("/api/v1/status", params={"status_key": response.json()}, headers=logged)
+        assert response.json()["status"] == "done", response.text
+        assert response.json()["parsed"] == 3, response.text
+        assert response.json()["written"] == 3, response.text
+
+        archive = BytesIO()
+        with ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("notes.txt", "not a report")
+        data["result_date"] = (run_date + timedelta(seconds=1)).isoformat()
+        for content in (b"not an archive", archive.getvalue()):
+            response = application.post(url, files=[("files", ("run.zip", content))], data=data, headers=logged)
+            assert response.status_code == 400, response.text
+        response = application.post(
+            url,
+            files=[("files", ("run.csv", RESULT_HEADERS))],
+            data={**data, "version": "unknown"},
+            headers=logged,
+        )
+        assert response.status_code == 404, response.text
+
+    def test_result_parsers(
+        self: "TestRestCampaignWorkflow",
+    ) -> None:
+        """- read the rows of a JUnit XML and a Cucumber JSON report
+        - refuse the reports not having the expected root"""
+        with open("tests/resources/results_junit.xml", "rb") as report:
+            JunitResult.check(report, "results_junit.xml")
+            report.seek(0)
+            assert list(JunitResult.rows(report)) == [
+                {"epic_id": "first_epic", "feature_name": "Test feature", "scenario_id": "test_1", "status": "passed"},
+                {
+                    "epic_id": "first_epic",
+                    "feature_name": "New Test feature",
+                    "scenario_id": "test_1",
+                    "status": "failed",
+                },
+                {
+                    "epic_id": "second_epic",
+                    "feature_name": "Test feature",
+                    "scenario_id": "t_test_1",
+                    "status": "skipped",
+                },
+                {"epic_id": None, "feature_name": "Unknown feature", "scenario_id": "unknown", "status": "failed"},
+            ]
+        with open("tests/resources/results_cucumber.json", "rb") as report:
+            CucumberResult.check(report, "results_cucumber.json")
+            report.seek(0)
+            assert list(CucumberResult.rows(report)) == [
+                {"epic_id": "first_epic", "feature_name": "Test feature", "scenario_id": "test_1", "status": "passed"},
+                {
+                    "epic_id": "first_epic",
+                    "feature_name": "New Test feature",
+                    "scenario_id": "test_1",
+                    "status": "failed",
+                },
+                {
+                    "epic_id": "second_epic",
+                    "feature_name": "Test feature",
+                    "scenario_id": "t_test_1",
+                    "status": "skipped",
+                },
+            ]
+        for parser, content in (
+            (JunitResult, b"<testcase name='test_1'/>"),
+            (JunitResult, b"not xml"),
+            (CucumberResult, b'{"name": "Test feature"}'),
+            (CucumberResult, b"not json"),
+        ):
+            with pytest.raises(MalformedCsvFile):
+                parser.check(BytesIO(content), "report")
+
+    def test_test_manager_bulk_reports(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- post a run reported as JUnit XML and Cucumber JSON, the unknown testcase being parsed only"""
+        # Three minutes after the runs of test_test_manager_upload_results_once
+        run_date = datetime.now().replace(microsecond=0) + timedelta(minutes=3)
+        with (
+            open("tests/resources/results_junit.xml", "rb") as junit,
+            open("tests/resources/results_cucumber.json", "rb") as cucumber,
+        ):
+            response = application.post(
+                f"api/v1/projects/{TestRestCampaignWorkflow.project_name}/testResults/bulk",
+                files=[("files", ("results_junit.xml", junit)), ("files", ("results_cucumber.json", cucumber))],
+                data={"version": TestRestCampaignWorkflow.project_version["next"], "result_date": run_date.isoformat()},
+                headers=logged,
+            )
+        assert response.status_code == 200, response.text
+        response = application.get("/api/v1/status", params={"status_key": response.json()}, headers=logged)
+        assert response.json()["status"] == "done", response.text
+        assert response.json()["parsed"] == 7, response.text
+        assert response.json()["written"] == 6, response.text
+        assert response.json()["unresolved"] == 1, response.text
+
+    def test_process_pool_shutdown(
+        self: "TestRestCampaignWorkflow",
+    ) -> None:
+        """- the worker processes are started once, stopped on shutdown and started again on the next task"""
+        executor = process_pool_executor()
+        assert process_pool_executor() is executor
+        assert executor.submit(sum, [1, 2]).result() == 3
+        shutdown_process_pool()
+        assert process_pool.process_pool is None
+        with pytest.raises(RuntimeError):
+            executor.submit(sum, [1, 2])
+        shutdown_process_pool()
+        assert process_pool_executor() is not executor
+        shutdown_process_pool()
+
+    def test_partition_chunks(
+        self: "TestRestCampaignWorkflow",
+    ) -> None:
+        """- the rows are yielded by chunks of the chunk size, grouped by partition within a chunk"""
+        rows = [
+            {"epic_id": epic, "feature_name": feature, "scenario_id": scenario, "status": "passed"}
+            for epic, feature, scenario in (
+                ("a", "f", "1"),
+                ("b", "f", "2"),
+                ("a", "g", "3"),
+                ("a", "f", "4"),
+                ("b", "f", "5"),
+            )
+        ]
+        chunks = [[result[2] for result in chunk] for chunk in partition_chunks(rows, "epic", 3)]
+        assert chunks == [["1", "3", "2"], ["4", "5"]], chunks
+        chunks = [[result[2] for result in chunk] for chunk in partition_chunks(rows, "feature", 10)]
+        assert chunks == [["1", "4", "2", "5", "3"]], chunks
+
+    def test_test_manager_dataset_cache_versions(
+        self: "TestRestCampaignWorkflow",
+    ) -> None:
+        """- cache a dataset once per data version
+        - move it to the next data version with a later run
+        - drop it on a run not coming after the cached ones"""
+        keys = [
+            dataset_key(TestRestCampaignWorkflow.project_name, "1.0", None, "scenarios", "stacked", data_version)
+            for data_version in ("0.1", "0.2", "0.3")
+        ]
+        first_run = {"run_date": [datetime(2024, 3, 1)], "passed": [1], "skipped": [0], "failed": [0]}
+        second_run = {"run_date": [datetime(2024, 3, 2)], "passed": [0], "skipped": [0], "failed": [1]}
+        assert rs_record_dataset(keys[0], first_run)
+        assert not rs_record_dataset(keys[0], second_run)
+        with ThreadPoolExecutor(4) as executor:
+            moves = list(executor.map(lambda _: rs_append_dataset(keys[0], keys[1], second_run), range(4)))
+        assert moves.count(True) == 1, moves
+        assert rs_retrieve_dataset(keys[0]) is None
+        assert rs_retrieve_dataset(keys[1])["failed"] == [0, 1]
+        assert 0 < redis_connection().ttl(keys[1]) <= DATASET_TTL
+        assert not rs_append_dataset(keys[1], keys[2], second_run)
+        assert rs_retrieve_dataset(keys[1]) is None
+        assert rs_retrieve_dataset(keys[2]) is None
+
+    def test_test_manager_dataset_result_version(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- gather the version stacked dataset
+        - keep it on writes other than runs and test repository ones
+        - move the scope to a newer result version on a run"""
+        project_name = TestRestCampaignWorkflow.project_name
+        response = application.get(
+            f"api/v1/projects/{project_name}/testResults",
+            headers={**logged, "accept": "application/json"},
+            params={"category": "scenarios", "rendering": "stacked", "version": "1.0"},
+        )
+        assert response.status_code == 200, response.text
+        result_version = rs_retrieve_result_version(project_name, "1.0")
+        key = dataset_key(project_name, "1.0", None, "scenarios", "stacked", result_version)
+        assert rs_retrieve_dataset(key) is not None
+
+        # Board writes: tickets, bugs, campaign scenario statuses
+        rs_bump_data_version(project_name, "1.0")
+        rs_bump_data_version(project_name, "1.0", "status")
+        assert rs_retrieve_result_version(project_name, "1.0") == result_version
+        assert rs_retrieve_dataset(key) is not None
+
+        occurrence = TestRestCampaignWorkflow.current_campaign_occurrence
+        campaign_version = rs_retrieve_result_version(project_name, "1.0", occurrence)
+        project_version = rs_retrieve_result_version(project_name)
+        new_version, new_campaign_version = rs_bump_result_version(project_name, [("1.0", None), ("1.0", occurrence)])
+        assert previous_result_version(new_version) == result_version
+        assert previous_result_version(new_campaign_version) == campaign_version
+        assert rs_retrieve_result_version(project_name, "1.0") == new_version
+        # A partial run leaves the project scope
+        assert rs_retrieve_result_version(project_name) == project_version
+
+    def test_test_manager_warm_json_dataset(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- request the campaign flaky scenarios as json
+        - record a run, flaky datasets being gathered again instead of appended
+        - warm the render cache and check the dataset is cached at the new result version"""
+        project_name = TestRestCampaignWorkflow.project_name
+        occurrence = str(TestRestCampaignWorkflow.current_campaign_occurrence)
+        response = application.get(
+            f"api/v1/projects/{project_name}/testResults",
+            headers={**logged, "accept": "application/json"},
+            params={"category": "flaky", "rendering": "table", "version": "1.0", "campaign_occurrence": occurrence},
+        )
+        assert response.status_code == 200, response.text
+        rs_bump_result_version(project_name, run_scopes("1.0", occurrence, False))
+        key = dataset_key(
+            project_name,
+            "1.0",
+            occurrence,
+            "flaky",
+            "table",
+            rs_retrieve_result_version(project_name, "1.0", occurrence),
+        )
+        assert not rs_dataset_exists(key)
+        campaign = asyncio.run(retrieve_campaign_id(project_name, "1.0", occurrence))
+        asyncio.run(warm_render_cache(project_name, "1.0", campaign.campaign_id, False))
+        assert rs_dataset_exists(key)
+
+    def test_test_manager_result_events(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- stream the events of a result processing publishing its progress
+        - check the progress counters reach the stream until it is done"""
+        status_key = mg_insert_test_result(TestRestCampaignWorkflow.project_name, "1.0", 1, False)
+
+        def process() -> None:
+            # Published once the stream is subscribed
+            sleep(1)
+            mg_update_test_result_progress(status_key, parsed=10, resolved=8)
+            mg_update_test_result_progress(status_key, written=8)
+            mg_insert_test_result_done(status_key)
+
+        with ThreadPoolExecutor(1) as executor:
+            executor.submit(process)
+            response = application.get("/api/v1/status/events", params={"status_key": status_key}, headers=logged)
+        assert response.status_code == 200, response.text
+        events = [
+            (event.split("\n")[0], json.loads(event.split("\ndata: ")[1]))
+            for event in response.text.split("\n\n")
+            if event.startswith("event:")
+        ]
+        assert [
+            (name, state["parsed"], state["resolved"], state["unresolved"], state["written"]) for name, state in events
+        ] == [
+            ("event: importing", 0, 0, 0, 0),
+            ("event: importing", 10, 8, 2, 0),
+            ("event: importing", 10, 8, 2, 8),
+            ("event: done", 10, 8, 2, 8),
+        ], response.text
+        assert events[-1][1]["throughput"] > 0, response.text
+
+    def test_test_manager_lost_result_events(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        """- end the stream with an error once the processing state expired
+        - end the stream with an error once the processing has not been updated for long"""
+        expired_key = mg_insert_test_result(TestRestCampaignWorkflow.project_name, "1.0", 1, False)
+        stalled_key = mg_insert_test_result(TestRestCampaignWorkflow.project_name, "1.0", 1, False)
+        with (
+            patch("app.database.redis.rs_test_result.KEEPALIVE_TIMEOUT", 1),
+            patch("app.database.redis.rs_test_result.PROCESSING_STALLED_TIMEOUT", 1),
+            ThreadPoolExecutor(1) as executor,
+        ):
+            executor.submit(lambda: sleep(0.5) or redis_connection().delete(expired_key))
+            response = application.get("/api/v1/status/events", params={"status_key": expired_key}, headers=logged)
+            assert response.status_code == 200, response.text
+            assert response.text.endswith("event: error\ndata: {}\n\n"), response.text
+
+            response = application.get("/api/v1/status/events", params={"status_key": stalled_key}, headers=logged)
+            assert response.status_code == 200, response.text
+            assert response.text.startswith("event: importing"), response.text
+            assert response.text.endswith("event: error\ndata: {}\n\n"), response.text
+        redis_connection().delete(stalled_key)
+
+    def test_result_storage_migration(
+        self: "TestRestCampaignWorkflow",
+        application: Generator[TestClient, Any, None],
+        logged: Generator[dict[str, str], Any, None],
+    ) -> None:
+        # Results stored before the migration under the project alias, as the url project name, or its name
+        set_project("migration results", application, logged)
+        set_project_versions("migration results", ["1.0.0"], application, logged)
+        set_project_repository("migration results", "tests/resources/repository_as_csv.csv", application, logged)
+        set_project_campaign("migration results", "1.0.0", [], application, logged)
+        updates = {update["description"]: update["request"] for update in POSTGRE_UPDATES}
+        with psycopg.connect(postgre_string) as connection:
+            # The former tables and the migrated ones are created in a scratch schema, dropped by the rollback
+            connection.execute("create schema migration_test; set local search_path to migration_test, public;")
+            for table in ("scenario", "feature", "epic"):
+                connection.execute(updates[f"Create table test_{table}_results"])
+            campaign_id, epic_id, feature_id, scenario_id = connection.execute(
+                "select cp.id, ep.id, ft.id, sc.id from campaigns as cp"
+                " join epics as ep on ep.project_id = cp.project_id"
+                " join features as ft on ft.epic_id = ep.id"
+                " join scenarios as sc on sc.feature_id = ft.id"
+                " where cp.project_id = 'migration results' limit 1;"
+            ).fetchone()
+            # Statuses were stored as reported
+            for project_id, status in (("migrationresults", "Passed"), ("Migration Results", " FAILED")):
+                connection.execute(
+                    "insert into test_scenario_results (run_date, project_id, version, campaign_id, epic_id,"
+                    " feature_id, scenario_id, status) values (now(), %s, '1.0.0', %s, %s, %s, %s, %s);",
+                    (project_id, campaign_id, epic_id, feature_id, scenario_id, status),
+                )
+            for version, status in (("removed version", "passed"), ("1.0.0", "failed")):
+                connection.execute(
+                    "insert into test_epic_results (run_date, project_id, version, campaign_id, epic_id, status)"
+                    " values (now(), 'migrationresults', %s, %s, %s, %s);",
+                    (version, campaign_id, epic_id, status),
+                )
+            connection.execute(
+                updates[
+                    "Store scenario results with status code and project, version ids."
+                    " View test_scenario_results keeps the former columns"
+                ]
+            )
+            assert connection.execute(
+                "select status from migration_test.test_scenario_results order by status;"
+            ).fetchall() == [("failed",), ("passed",)]
+            # The epic result of a removed version cannot be migrated: it is kept apart and reported
+            warnings = []
+            connection.add_notice_handler(lambda diagnostic: warnings.append(diagnostic.message_primary))
+            connection.execute(
+                updates[
+                    "Store epic results with status code and project, version ids."
+                    " View test_epic_results keeps the former columns"
+                ]
+            )
+            assert connection.execute("select version, status from migration_test.test_epic_results;").fetchall() == [
+                ("1.0.0", "failed")
+            ]
+            assert connection.execute(
+                "select version, status from migration_test.unmigrated_epic_results;"
+            ).fetchall() == [("removed version", "passed")]
+            assert warnings == [
+                "test_epic_results rows without project or version are kept in unmigrated_epic_results"
+            ], warnings
+            connection.rollback()
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+from bokeh.models import HoverTool
+
+from app.database.utils.output_strategy import MapHtml
+from app.database.utils.status_matrix import NO_STATUS, STATUS_CODES, StatusMatrix
+
+MONDAY = datetime(2024, 1, 1, 8)
+MONDAY_EVENING = datetime(2024, 1, 1, 20)
+TUESDAY = datetime(2024, 1, 2, 8)
+
+
+class TestStatusMatrix:
+    # Element 2 has two results on monday morning, element 3 has no result on monday evening
+    dataset = {
+        "run_date": [MONDAY, MONDAY, MONDAY, MONDAY, MONDAY_EVENING, MONDAY_EVENING, TUESDAY, TUESDAY, TUESDAY],
+        "element_id": [3, 1, 2, 2, 1, 2, 1, 2, 3],
+        "element_status": ["passed", "passed", "failed", "passed", "skipped", "unknown", "failed", "passed", "passed"],
+        "element_name": ["third", "first", "second", "second", "first", "second", "first", "second", "third"],
+    }
+
+    def test_from_dataset(self: "TestStatusMatrix") -> None:
+        matrix = StatusMatrix.from_dataset(self.dataset)
+        assert matrix.run_dates.tolist() == [MONDAY, MONDAY_EVENING, TUESDAY]
+        assert matrix.element_ids.tolist() == [1, 2, 3]
+        assert matrix.element_names.tolist() == ["first", "second", "third"]
+        assert matrix.statuses.dtype == np.int8
+        # Failed wins over passed, an unknown status is skipped
+        assert matrix.statuses.tolist() == [
+            [STATUS_CODES["passed"], STATUS_CODES["skipped"], STATUS_CODES["failed"]],
+            [STATUS_CODES["failed"], STATUS_CODES["skipped"], STATUS_CODES["passed"]],
+            [STATUS_CODES["passed"], NO_STATUS, STATUS_CODES["passed"]],
+        ]
+
+    def test_worse_status(self: "TestStatusMatrix") -> None:
+        for statuses, expected in (
+            (["skipped", "passed"], "passed"),
+            (["passed", "skipped"], "passed"),
+            (["passed", "failed"], "failed"),
+            (["failed", "skipped"], "failed"),
+            (["skipped", "skipped"], "skipped"),
+        ):
+            matrix = StatusMatrix.from_dataset(
+                {
+                    "run_date": [MONDAY, MONDAY],
+                    "element_id": [1, 1],
+                    "element_status": statuses,
+                    "element_name": ["first", "first"],
+                }
+            )
+            assert matrix.to_dataset()["element_status"] == [expected], statuses
+
+    def test_to_dataset(self: "TestStatusMatrix") -> None:
+        assert StatusMatrix.from_dataset(self.dataset).to_dataset() == {
+            "run_date": [MONDAY, MONDAY, MONDAY, MONDAY_EVENING, MONDAY_EVENING, TUESDAY, TUESDAY, TUESDAY],
+            "element_id": [1, 2, 3, 1, 2, 1, 2, 3],
+            "element_status": ["passed", "failed", "passed", "skipped", "skipped", "failed", "passed", "passed"],
+            "element_name": ["first", "second", "third", "first", "second", "first", "second", "third"],
+        }
+
+    def test_bucket(self: "TestStatusMatrix") -> None:
+        matrix = StatusMatrix.from_dataset(self.dataset)
+        day = matrix.bucket("day")
+        assert day.run_dates.tolist() == [datetime(2024, 1, 1), datetime(2024, 1, 2)]
+        assert day.statuses.tolist() == [[1, 2], [2, 1], [1, 1]]
+        week = matrix.bucket("week")
+        assert week.run_dates.tolist() == [datetime(2024, 1, 1)]
+        assert week.statuses.tolist() == [[2], [2], [1]]
+        assert matrix.bucket("run") is matrix
+
+    def test_top(self: "TestStatusMatrix") -> None:
+        matrix = StatusMatrix.from_dataset(self.dataset)
+        assert matrix.volatility().tolist() == [2, 2, 0]
+        top = matrix.top(1, 0)
+        assert top.element_ids.tolist() == [0, 1]
+        assert top.element_names.tolist() == ["2 other elements", "first"]
+        assert top.statuses.tolist() == [[2, 0, 1], [1, 0, 2]]
+
+    def test_map_rendering(self: "TestStatusMatrix") -> None:
+        with patch("app.database.utils.output_strategy.save") as save:
+            asyncio.run(MapHtml.render(self.dataset))
+        figure = save.call_args.args[0]
+        # Labels are sent once, ordered by name, the cells only carry their indexes
+        formatters = figure.select_one(HoverTool).formatters
+        assert formatters["@element_name"].args["labels"] == ["first", "second", "third"]
+        assert formatters["@run_date"].args["labels"] == [
+            "2024-01-01T08:00:00",
+            "2024-01-01T20:00:00",
+            "2024-01-02T08:00:00",
+        ]
+        assert formatters["@element_status"].args["labels"] == ["skipped", "passed", "failed"]
+        data = figure.renderers[0].data_source.data
+        assert data["run_date"].tolist() == [0, 0, 0, 1, 1, 2, 2, 2]
+        assert data["element_name"].tolist() == [0, 1, 2, 0, 1, 0, 1, 2]
+        assert data["element_status"].tolist() == [1, 2, 1, 0, 0, 2, 1, 1]